@@ -0,0 +1,38 @@
+"""
+Compare the NumPy BWT construction with the pure Python one.
+
+Usage: python -m benchmarks.bwt [path]
+"""
+import sys
+import time
+
+from bwt_compressor.bwt import _apply_bwt_python, apply_bwt
+
+
+def _measure(func, text, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else 'resources/martin_eden.txt'
+    with open(path, 'rb') as f:
+        text = f.read()
+
+    python_time, python_bwt = _measure(_apply_bwt_python, text)
+    numpy_time, numpy_bwt = _measure(apply_bwt, text)
+    assert numpy_bwt == python_bwt
+
+    mb = len(text) / 10**6
+    print(f'input: {path} ({len(text)} bytes)')
+    print(f'python: {python_time:.3f}s ({mb / python_time:.2f} MB/s)')
+    print(f'numpy:  {numpy_time:.3f}s ({mb / numpy_time:.2f} MB/s)')
+    print(f'speedup: {python_time / numpy_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Deterministic inputs of any size for the benchmarks. The same name, size
+and seed always give the same bytes.
+"""
+import json
+
+import numpy as np
+
+
+def generate_random(size, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def generate_low_entropy(size, seed=0):
+    # A few symbols with geometrically decreasing frequencies
+    symbols = np.random.default_rng(seed).geometric(0.5, size) - 1
+    return (ord('a') + np.minimum(symbols, 15)).astype(np.uint8).tobytes()
+
+
+def generate_runs(size, seed=0):
+    rng = np.random.default_rng(seed)
+    # The mean run length is 64, which is enough for at least `size` chars
+    runs_num = size // 32 + 1
+    chars = rng.integers(0, 256, runs_num, dtype=np.uint8)
+    lengths = rng.geometric(1 / 64, runs_num)
+    return np.repeat(chars, lengths)[:size].tobytes()
+
+
+def generate_dna(size, seed=0):
+    """
+    Random nucleotides in which about half of the segments are mutated
+    copies of the earlier ones, like the repeats of a genome.
+    """
+    rng = np.random.default_rng(seed)
+    text = rng.integers(0, 4, size, dtype=np.uint8)
+    segment_size = 1000
+    for start in range(segment_size, size, 2 * segment_size):
+        end = min(start + segment_size, size)
+        source = int(rng.integers(0, start - segment_size + 1))
+        text[start:end] = text[source:source + end - start]
+        mutations = rng.random(end - start) < 0.01
+        text[start:end][mutations] = rng.integers(0, 4, int(mutations.sum()))
+    return np.frombuffer(b'ACGT', dtype=np.uint8)[text].tobytes()
+
+
+_LEVELS = ['DEBUG', 'INFO', 'INFO', 'INFO', 'WARNING', 'ERROR']
+_MESSAGES = [
+    'request handled', 'cache miss', 'connection opened', 'connection closed',
+    'retrying request', 'user logged in', 'payment declined', 'timeout exceeded',
+]
+_PATHS = ['/api/users', '/api/orders', '/api/items', '/health', '/login']
+
+
+def generate_json_logs(size, seed=0):
+    rng = np.random.default_rng(seed)
+    lines = []
+    total_size = 0
+    timestamp = 1_700_000_000_000
+    while total_size < size:
+        timestamp += int(rng.integers(0, 2000))
+        line = json.dumps({
+            'ts': timestamp,
+            'level': _LEVELS[rng.integers(len(_LEVELS))],
+            'msg': _MESSAGES[rng.integers(len(_MESSAGES))],
+            'path': _PATHS[rng.integers(len(_PATHS))],
+            'user_id': int(rng.integers(1, 5000)),
+            'latency_ms': round(float(rng.exponential(40)), 2),
+        }) + '\n'
+        lines.append(line)
+        total_size += len(line)
+    return ''.join(lines).encode()[:size]
+
+
+def generate_martin_eden(size, seed=0):
+    """
+    The text of `resources/martin_eden.txt` repeated up to `size`.
+    """
+    with open('resources/martin_eden.txt', 'rb') as f:
+        text = f.read()
+    return (text * (size // len(text) + 1))[:size]
+
+
+CORPORA = {
+    'random': generate_random,
+    'low-entropy': generate_low_entropy,
+    'runs': generate_runs,
+    'dna': generate_dna,
+    'json-logs': generate_json_logs,
+    'martin-eden': generate_martin_eden,
+}
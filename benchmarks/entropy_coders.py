@@ -0,0 +1,81 @@
+"""
+Compare the speed and the compression ratio of the entropy coders
+on the output of the second stage for the whole input as a single block.
+
+Usage: python -m benchmarks.entropy_coders [path] [stage]
+"""
+import functools
+import sys
+import time
+
+from bwt_compressor.block import _STAGE_CODECS, _STAGE_INTEGER_CODINGS
+from bwt_compressor.bwt import apply_bwt
+from bwt_compressor.canonical_huffman import (
+    canonical_huffman_decode,
+    canonical_huffman_encode
+)
+from bwt_compressor.huffman import huffman_decode, huffman_encode
+from bwt_compressor.integers_encoding import (
+    encode_integers_array,
+    encode_integers_as_buckets
+)
+from bwt_compressor.range_coder import range_decode, range_encode
+
+
+CODERS = [
+    ('adaptive-huffman', huffman_encode, huffman_decode),
+    (
+        'huffman (1 table)',
+        functools.partial(canonical_huffman_encode, tables_num=1),
+        canonical_huffman_decode
+    ),
+    ('huffman', canonical_huffman_encode, canonical_huffman_decode),
+    ('range', range_encode, range_decode),
+    (
+        'range-order1',
+        functools.partial(range_encode, order=1),
+        range_decode
+    ),
+]
+
+
+def _measure(func, data):
+    start = time.perf_counter()
+    result = func(data)
+    return time.perf_counter() - start, result
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else 'resources/martin_eden.txt'
+    stage = sys.argv[2] if len(sys.argv) > 2 else 'mtf'
+    with open(path, 'rb') as f:
+        text = f.read()
+
+    bwt, _ = apply_bwt(text)
+    stage_encode, _ = _STAGE_CODECS[stage]
+    # The extra bits of the buckets are stored as is
+    if _STAGE_INTEGER_CODINGS[stage] == 'bytes':
+        data, extra_bits = encode_integers_array(stage_encode(bwt)), b''
+    else:
+        data, extra_bits = encode_integers_as_buckets(stage_encode(bwt))
+    mb = len(data) / 10**6
+    print(
+        f'input: {path} ({len(text)} bytes), {stage} code: {len(data)} bytes '
+        f'+ {len(extra_bits)} bytes of extra bits'
+    )
+
+    for name, encode, decode in CODERS:
+        encode_time, code = _measure(encode, data)
+        decode_time, decoded_data = _measure(decode, code)
+        assert decoded_data == data
+        size = len(code) + len(extra_bits)
+        print(
+            f'{name:20} {size:8} bytes  '
+            f'ratio: {len(text) / size:.3f}  '
+            f'encode: {mb / encode_time:6.2f} MB/s  '
+            f'decode: {mb / decode_time:6.2f} MB/s'
+        )
+
+
+if __name__ == '__main__':
+    main()
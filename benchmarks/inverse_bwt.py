@@ -0,0 +1,39 @@
+"""
+Measure how the number of restart points affects the speed of
+the inverse BWT of a single block.
+
+Usage: python -m benchmarks.inverse_bwt [path]
+"""
+import sys
+import time
+
+from bwt_compressor.bwt import apply_bwt, restore_text_from_bwt
+
+
+RESTART_POINTS = [1, 16, 64, 256, 1024]
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else 'resources/martin_eden.txt'
+    with open(path, 'rb') as f:
+        text = f.read()
+    mb = len(text) / 10**6
+    print(f'input: {path} ({len(text)} bytes)')
+
+    baseline = None
+    for restart_points in RESTART_POINTS:
+        bwt, restart_rows = apply_bwt(text, restart_points)
+        start = time.perf_counter()
+        restored_text = restore_text_from_bwt(bwt, restart_rows)
+        elapsed = time.perf_counter() - start
+        assert restored_text == text
+
+        baseline = baseline or elapsed
+        print(
+            f'restart points: {restart_points:5}  {elapsed:.3f}s  '
+            f'({mb / elapsed:.2f} MB/s, {baseline / elapsed:.1f}x)'
+        )
+
+
+if __name__ == '__main__':
+    main()
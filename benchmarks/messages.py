@@ -0,0 +1,114 @@
+"""
+Measure how many small messages per second `compress_many` and
+`decompress_many` code, compared to calling `compress` and `decompress`
+for every message.
+
+The messages are consecutive pieces of a synthetic corpus, so they
+are alike like the messages of a service.
+
+Usage: python -m benchmarks.messages [-c CORPUS] [-s SIZE ...] [-n N] [-j N]
+    [-r N] [--restart-points K]
+"""
+import argparse
+import time
+
+from benchmarks.corpora import CORPORA
+from bwt_compressor.compressor import (
+    compress,
+    compress_many,
+    decompress,
+    decompress_many
+)
+
+
+DEFAULT_SIZES = [64, 256, 1024, 4096]
+
+
+def measure_messages(messages, workers, restart_points, repeat=1):
+    """
+    Yield the name and the messages per second of every way of coding
+    the messages, the best of `repeat` runs, and the ratio of
+    the compressed ones.
+    """
+    seconds, compressed_messages = _measure(repeat, lambda: [
+        compress(message, restart_points=restart_points) for message in messages
+    ])
+    yield 'compress', len(messages) / seconds
+    seconds, _ = _measure(repeat, lambda: [
+        decompress(compressed_message) for compressed_message in compressed_messages
+    ])
+    yield 'decompress', len(messages) / seconds
+
+    seconds, batch_compressed_messages = _measure(repeat, lambda: list(
+        compress_many(messages, workers=workers, restart_points=restart_points)
+    ))
+    yield 'compress_many', len(messages) / seconds
+    assert batch_compressed_messages == compressed_messages
+    seconds, texts = _measure(repeat, lambda: list(
+        decompress_many(compressed_messages, workers=workers)
+    ))
+    yield 'decompress_many', len(messages) / seconds
+    assert texts == messages
+
+    size = sum(len(message) for message in messages)
+    yield 'ratio', size / sum(len(message) for message in compressed_messages)
+
+
+def _measure(repeat, func):
+    """
+    Return the best time of `repeat` calls of `func` and its result.
+    """
+    best_seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+    return best_seconds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.messages')
+    parser.add_argument(
+        '-c', '--corpus', choices=list(CORPORA), default='json-logs',
+        help='corpus the messages are cut from (default: json-logs)'
+    )
+    parser.add_argument(
+        '-s', '--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+        metavar='SIZE', help='message sizes in bytes (default: 64 256 1024 4096)'
+    )
+    parser.add_argument(
+        '-n', '--messages', type=int, default=2000, metavar='N',
+        help='number of messages of every size (default: 2000)'
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1, metavar='N',
+        help='number of worker processes of the batch functions (default: 1)'
+    )
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=1, metavar='N',
+        help='number of runs of every way of coding, the best of which '
+        'is taken (default: 1)'
+    )
+    parser.add_argument(
+        '--restart-points', type=int, default=1, metavar='K',
+        help='restart points per message, at most one per 4 KB (default: 1)'
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        text = CORPORA[args.corpus](size * args.messages)
+        messages = [text[i:i + size] for i in range(0, len(text), size)]
+        results = dict(measure_messages(
+            messages, args.jobs, args.restart_points, args.repeat
+        ))
+        print(
+            f'{size:5} B:  ' + '  '.join(
+                f'{name} {results[name]:7.0f}/s' for name in [
+                    'compress', 'compress_many', 'decompress', 'decompress_many'
+                ]
+            ) + f'  ratio {results["ratio"]:.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Measure the throughput and the peak RSS of every stage of the compressor
+and of the stdlib compressors on the synthetic corpora of several sizes.
+
+The throughput is always in MB of the original input per second, so the
+stages are comparable. The results are written to a JSON file, and if
+a baseline from an earlier run is given, the run fails when a stage
+is slower than the baseline by more than the threshold.
+
+Usage: python -m benchmarks.suite [-c CORPUS ...] [-s SIZE ...] [-r N]
+    [-o PATH] [--baseline PATH] [--threshold FRACTION]
+
+For example, `python -m benchmarks.suite -s 1KB 1MB 100MB -c martin-eden`.
+"""
+import argparse
+import bz2
+import json
+import lzma
+import os
+import platform
+import resource
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from benchmarks.corpora import CORPORA
+from bwt_compressor.block import _ENTROPY_CODECS, DEFAULT_ENTROPY_CODER
+from bwt_compressor.bwt import apply_bwt, restore_text_from_bwt
+from bwt_compressor.compressor import compress, decompress
+from bwt_compressor.dc import dc_decode, dc_encode
+from bwt_compressor.integers_encoding import (
+    decode_integers_from_buckets,
+    encode_integers_as_buckets
+)
+from bwt_compressor.mtf import mtf_rle0_decode, mtf_rle0_encode
+
+
+DEFAULT_SIZES = ['1KB', '64KB', '1MB']
+DEFAULT_THRESHOLD = 0.25
+
+_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+_STDLIB_CODECS = {
+    'bz2': (bz2.compress, bz2.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+    'zlib': (lambda data: zlib.compress(data, 9), zlib.decompress),
+}
+
+
+def parse_size(size):
+    number = size.rstrip('BKMG')
+    return int(float(number) * _UNITS[size[len(number):] or 'B'])
+
+
+def run_corpus(text, entropy_coder=DEFAULT_ENTROPY_CODER, repeat=1):
+    """
+    Yield the name, the seconds, the peak RSS in bytes and the ratio
+    (for the whole compressors) of every stage, each of which is fed
+    the output of the previous ones and run `repeat` times.
+    """
+    entropy_encode, entropy_decode = _ENTROPY_CODECS[entropy_coder]
+
+    seconds, rss, (bwt, restart_rows) = _measure(repeat, apply_bwt, text)
+    yield 'bwt', seconds, rss, None
+    seconds, rss, _ = _measure(repeat, restore_text_from_bwt, bwt, restart_rows)
+    yield 'inverse_bwt', seconds, rss, None
+
+    seconds, rss, mtf = _measure(repeat, mtf_rle0_encode, bwt)
+    yield 'mtf_encode', seconds, rss, None
+    seconds, rss, _ = _measure(repeat, mtf_rle0_decode, mtf)
+    yield 'mtf_decode', seconds, rss, None
+    del mtf
+
+    seconds, rss, dc = _measure(repeat, dc_encode, bwt)
+    yield 'dc_encode', seconds, rss, None
+    seconds, rss, _ = _measure(repeat, dc_decode, dc)
+    yield 'dc_decode', seconds, rss, None
+    del bwt
+
+    seconds, rss, (buckets, extra_bits) = _measure(
+        repeat, encode_integers_as_buckets, dc
+    )
+    yield 'integers_encode', seconds, rss, None
+    del dc
+    seconds, rss, _ = _measure(
+        repeat, decode_integers_from_buckets, buckets, extra_bits
+    )
+    yield 'integers_decode', seconds, rss, None
+
+    seconds, rss, code = _measure(repeat, entropy_encode, buckets)
+    yield f'{entropy_coder}_encode', seconds, rss, None
+    seconds, rss, _ = _measure(repeat, entropy_decode, code)
+    yield f'{entropy_coder}_decode', seconds, rss, None
+    del buckets, extra_bits, code
+
+    codecs = {
+        'compress': (compress, decompress),
+        **{f'{name}_compress': codec for name, codec in _STDLIB_CODECS.items()}
+    }
+    for name, (encode, decode) in codecs.items():
+        seconds, rss, compressed_text = _measure(repeat, encode, text)
+        yield name, seconds, rss, len(text) / len(compressed_text)
+        seconds, rss, decompressed_text = _measure(repeat, decode, compressed_text)
+        assert decompressed_text == text
+        yield name.replace('compress', 'decompress'), seconds, rss, None
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    Return the messages about the stages of `results` that are slower than
+    the same stages of the same inputs in `baseline` by more than
+    the `threshold` fraction.
+    """
+    baseline_speeds = {
+        (r['corpus'], r['size'], r['stage']): r['mb_per_s'] for r in baseline
+    }
+    messages = []
+    for result in results:
+        key = (result['corpus'], result['size'], result['stage'])
+        baseline_speed = baseline_speeds.get(key)
+        if baseline_speed and result['mb_per_s'] < baseline_speed * (1 - threshold):
+            messages.append(
+                '{} {} {}: {:.2f} MB/s, baseline {:.2f} MB/s'.format(
+                    *key, result['mb_per_s'], baseline_speed
+                )
+            )
+    return messages
+
+
+def _measure(repeat, func, *args):
+    """
+    Return the best time of `repeat` runs, the peak RSS and the result.
+    """
+    seconds = float('inf')
+    _reset_peak_rss()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = min(seconds, time.perf_counter() - start)
+    return seconds, _get_peak_rss(), result
+
+
+def _reset_peak_rss():
+    # Linux resets the peak RSS reported in /proc/self/status on request,
+    # elsewhere it's the peak of the whole run
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _get_peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # It's in bytes on macOS and in kilobytes elsewhere
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def _get_environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+parser = argparse.ArgumentParser(
+    prog='python -m benchmarks.suite',
+    description='Benchmark the stages of the compressor on synthetic corpora.'
+)
+parser.add_argument(
+    '-c', '--corpora', nargs='+', choices=list(CORPORA), default=list(CORPORA),
+    metavar='CORPUS', help=f'corpora to run: {", ".join(CORPORA)} (default: all)'
+)
+parser.add_argument(
+    '-s', '--sizes', nargs='+', default=DEFAULT_SIZES, metavar='SIZE',
+    help=f'input sizes like 1KB or 100MB (default: {" ".join(DEFAULT_SIZES)})'
+)
+parser.add_argument(
+    '-e', '--entropy-coder', choices=list(_ENTROPY_CODECS),
+    default=DEFAULT_ENTROPY_CODER,
+    help=f'entropy coder to measure (default: {DEFAULT_ENTROPY_CODER})'
+)
+parser.add_argument(
+    '-r', '--repeat', type=int, default=1, metavar='N',
+    help='number of runs of every stage, the best of which is taken (default: 1)'
+)
+parser.add_argument(
+    '-o', '--output', default='benchmark_results.json', metavar='PATH',
+    help='path of the JSON results (default: benchmark_results.json)'
+)
+parser.add_argument(
+    '--baseline', metavar='PATH',
+    help='JSON results of an earlier run to compare the speed with'
+)
+parser.add_argument(
+    '--threshold', type=float, default=DEFAULT_THRESHOLD, metavar='FRACTION',
+    help='slowdown compared with the baseline that fails the run '
+    f'(default: {DEFAULT_THRESHOLD})'
+)
+
+
+def main():
+    args = parser.parse_args()
+    results = []
+    for size_name in args.sizes:
+        size = parse_size(size_name)
+        for corpus in args.corpora:
+            text = CORPORA[corpus](size)
+            for stage, seconds, rss, ratio in run_corpus(
+                text, args.entropy_coder, args.repeat
+            ):
+                mb_per_s = size / 10**6 / max(seconds, 1e-9)
+                results.append({
+                    'corpus': corpus, 'size': size_name, 'stage': stage,
+                    'seconds': seconds, 'mb_per_s': mb_per_s,
+                    'peak_rss': rss, 'ratio': ratio,
+                })
+                ratio_text = f'  ratio: {ratio:6.3f}' if ratio else ''
+                print(
+                    f'{corpus:12} {size_name:>6} {stage:28} '
+                    f'{mb_per_s:9.2f} MB/s  peak RSS: {rss / 2**20:8.1f} MiB'
+                    f'{ratio_text}',
+                    flush=True
+                )
+
+    with open(args.output, 'w') as f:
+        json.dump({'environment': _get_environment(), 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print('regressions:', *regressions, sep='\n', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
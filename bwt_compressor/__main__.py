@@ -1,30 +1,287 @@
 import argparse
+import cProfile
+import json
+import os
 import sys
+import tracemalloc
 
-from bwt_compressor.compressor import compress, decompress
+from bwt_compressor.block import (
+    AUTO_STAGE,
+    DEFAULT_ENTROPY_CODER,
+    DEFAULT_RESTART_POINTS,
+    DEFAULT_STAGE,
+    ENTROPY_CODERS,
+    STAGES
+)
+from bwt_compressor.cache import BlockCache
+from bwt_compressor.compressor import (
+    compress_file,
+    decompress_file,
+    decompress_file_range,
+    decompress_range,
+    iter_compress,
+    iter_decompress,
+    list_blocks,
+    map_file
+)
+from bwt_compressor.container import DEFAULT_BLOCK_SIZE
+from bwt_compressor.search import count, search
+from bwt_compressor.stats import Stats
 
 
 parser = argparse.ArgumentParser(
     prog='python -m bwt_compressor',
-    description='The program reads data from stdin, '
+    description='The program reads data from stdin or the input files, '
     'compresses/decompresses it using the BWT-based compressor '
-    'and writes the result to the stdout.'
+    'and writes the result to the stdout or the output files block by block.'
 )
+SUFFIX = '.bwt'
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(size):
+    number = size.upper().rstrip('B').rstrip('KMG')
+    unit = size.upper().rstrip('B')[len(number):]
+    try:
+        return int(float(number) * _UNITS[unit])
+    except (KeyError, ValueError):
+        raise argparse.ArgumentTypeError(f'invalid size: {size!r}')
+
+
+def parse_range(text):
+    start, separator, length = text.partition(':')
+    if not separator:
+        raise argparse.ArgumentTypeError(f'invalid range: {text!r}')
+    return parse_size(start), parse_size(length)
+
+
 parser.add_argument('-d', action='store_true', help='decompress mode')
+parser.add_argument(
+    '-i', '--input', nargs='+', metavar='PATH',
+    help='files to read instead of stdin, which are memory-mapped; '
+    f'without -o, the output of PATH goes to PATH{SUFFIX} or, '
+    f'on decompression, to PATH without the {SUFFIX} suffix'
+)
+parser.add_argument(
+    '-o', '--output', metavar='PATH',
+    help='file to write instead of stdout, only for a single input'
+)
+parser.add_argument(
+    '-l', '--list', action='store_true',
+    help='list the compressed size, the stage and the entropy coder '
+    'of every block of the input'
+)
+parser.add_argument(
+    '-g', '--grep', metavar='PATTERN',
+    help='write the lines of the compressed input that contain PATTERN, '
+    'which is searched for in the blocks without decompressing them; '
+    'only the blocks of the lines found are decompressed'
+)
+parser.add_argument(
+    '-c', '--count', action='store_true',
+    help='with -g, write the number of the occurrences of PATTERN instead'
+)
+parser.add_argument(
+    '--byte-offset', action='store_true',
+    help='with -g, prefix every line with its offset in the data'
+)
+parser.add_argument(
+    '--range', type=parse_range, metavar='START:LENGTH',
+    help='with -d, write only LENGTH bytes of the data from the START offset '
+    '(like 10M:4K), decompressing only the blocks that overlap them'
+)
+parser.add_argument(
+    '--index', action='store_true',
+    help='end the compressed stream with the index of the blocks, '
+    'which lets --range find them without reading the other ones'
+)
+parser.add_argument(
+    '-b', '--block-size', type=int, default=DEFAULT_BLOCK_SIZE, metavar='BYTES',
+    help=f'size of the compressed blocks (default: {DEFAULT_BLOCK_SIZE})'
+)
+parser.add_argument(
+    '-j', '--jobs', type=int, default=1, metavar='N',
+    help='number of worker processes, 0 means one per CPU (default: 1)'
+)
+parser.add_argument(
+    '--max-memory', type=parse_size, metavar='SIZE',
+    help='memory budget of the compression like 200M or 1G, within which '
+    'the block size and the number of workers are reduced if needed'
+)
+parser.add_argument(
+    '--cache-dir', metavar='PATH',
+    help='keep the compressed and the decompressed blocks in the PATH directory '
+    'and reuse them for the identical blocks of this and the later runs'
+)
+parser.add_argument(
+    '--restart-points', type=int, default=DEFAULT_RESTART_POINTS, metavar='K',
+    help='number of points per block from which the text is restored '
+    'simultaneously on decompression, at most one per 4 KB of the block '
+    f'(default: {DEFAULT_RESTART_POINTS})'
+)
+parser.add_argument(
+    '-s', '--stage', choices=STAGES + [AUTO_STAGE], default=DEFAULT_STAGE,
+    help='stage applied after the BWT: mtf is faster, dc compresses better, '
+    f'auto chooses one per block (default: {DEFAULT_STAGE})'
+)
+parser.add_argument(
+    '-e', '--entropy-coder', choices=ENTROPY_CODERS,
+    default=DEFAULT_ENTROPY_CODER,
+    help='entropy coder applied after the stage: static huffman is the fastest, '
+    'adaptive-huffman is about 10 times slower, range and range-order1 are '
+    'adaptive range coding with the order-0 and order-1 models, about as slow '
+    'as adaptive-huffman; range compresses a bit better than huffman, '
+    'range-order1 only when a coded byte depends on the previous one '
+    f'(default: {DEFAULT_ENTROPY_CODER})'
+)
+parser.add_argument(
+    '--stats', action='store_true',
+    help='write the time, the sizes and the codings of the blocks and of '
+    'every stage to stderr as JSON'
+)
+parser.add_argument(
+    '--profile', metavar='PATH',
+    help='write the cProfile stats to PATH and the tracemalloc snapshot '
+    'of the end of the run to PATH.tracemalloc'
+)
 args = parser.parse_args()
+if args.output and args.input and len(args.input) > 1:
+    parser.error('-o/--output requires a single input')
+if args.range and not args.d:
+    parser.error('--range requires -d')
+if (args.count or args.byte_offset) and not args.grep:
+    parser.error('-c/--count and --byte-offset require -g/--grep')
+stats = Stats() if args.stats else None
+cache = BlockCache(directory=args.cache_dir) if args.cache_dir else None
+# Whether -g found the pattern, without which the exit status is 1 like grep's
+matched = False
+
+
+def list_input(src):
+    for i, (size, stage, entropy_coder) in enumerate(list_blocks(src)):
+        yield f'{i}\t{size}\t{stage}\t{entropy_coder}\n'.encode()
+
+
+def grep_input(compressed_data, name=None):
+    """
+    Yield the output of -g for the compressed input, prefixed with its name
+    like grep does for several files.
+    """
+    global matched
+    pattern = os.fsencode(args.grep)
+    prefix = b'' if name is None else os.fsencode(name) + b':'
+    if args.count:
+        occurrences = count(compressed_data, pattern, workers=args.jobs)
+        matched = matched or occurrences > 0
+        yield prefix + b'%d\n' % occurrences
+        return
+    for offset, line in search(compressed_data, pattern, workers=args.jobs):
+        matched = True
+        yield prefix + (b'%d:' % offset if args.byte_offset else b'') + line + b'\n'
+
+
+def get_output_path(input_path):
+    if not args.d:
+        return input_path + SUFFIX
+    if input_path.endswith(SUFFIX) and len(input_path) > len(SUFFIX):
+        return input_path[:-len(SUFFIX)]
+    return input_path + '.out'
+
+
+def write_range(text):
+    if args.output:
+        with open(args.output, 'wb') as dst:
+            dst.write(text)
+    else:
+        write_chunks([text])
+
+
+def process_files():
+    for path in args.input:
+        if args.grep:
+            with open(path, 'rb') as src, map_file(src) as data:
+                write_chunks(grep_input(data, path if len(args.input) > 1 else None))
+        elif args.list:
+            with open(path, 'rb') as src:
+                write_chunks(list_input(src))
+        elif args.range:
+            write_range(
+                decompress_file_range(
+                    path, *args.range, workers=args.jobs, stats=stats, cache=cache
+                )
+            )
+        elif args.d:
+            decompress_file(
+                path, args.output or get_output_path(path), workers=args.jobs,
+                stats=stats, cache=cache
+            )
+        else:
+            compress_file(
+                path, args.output or get_output_path(path),
+                block_size=args.block_size, workers=args.jobs,
+                restart_points=args.restart_points, stage=args.stage,
+                entropy_coder=args.entropy_coder, stats=stats,
+                max_memory=args.max_memory, index=args.index, cache=cache
+            )
+
+
+def process_stdin():
+    if args.grep:
+        write_chunks(grep_input(sys.stdin.buffer.read()))
+        return
+    if args.range:
+        write_range(decompress_range(
+            sys.stdin.buffer.read(), *args.range, workers=args.jobs, stats=stats,
+            cache=cache
+        ))
+        return
+    if args.list:
+        chunks = list_input(sys.stdin.buffer)
+    elif args.d:
+        chunks = iter_decompress(
+            sys.stdin.buffer, workers=args.jobs, stats=stats, cache=cache
+        )
+    else:
+        chunks = iter_compress(
+            sys.stdin.buffer, block_size=args.block_size, workers=args.jobs,
+            restart_points=args.restart_points, stage=args.stage,
+            entropy_coder=args.entropy_coder, stats=stats,
+            max_memory=args.max_memory, index=args.index, cache=cache
+        )
+    if args.output:
+        with open(args.output, 'wb') as dst:
+            for chunk in chunks:
+                dst.write(chunk)
+    else:
+        write_chunks(chunks)
 
 
-if args.d:
-    compressed_text = sys.stdin.buffer.read()
-    # import cProfile
-    # cProfile.run('decompress(compressed_text)')
-    print(decompress(compressed_text))
-else:
-    text = sys.stdin.read()
-    # import cProfile
-    # cProfile.run('compress(text)')
-    sys.stdout.buffer.write(compress(text))
+def write_chunks(chunks):
+    for chunk in chunks:
+        sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
 
 
+if args.profile:
+    # The peak allocation of every stage is added to the stats when tracing
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
 
+try:
+    if args.input:
+        process_files()
+    else:
+        process_stdin()
+except (ValueError, OSError) as e:
+    parser.exit(1, f'{parser.prog}: error: {e}\n')
 
+if args.profile:
+    profiler.disable()
+    profiler.dump_stats(args.profile)
+    tracemalloc.take_snapshot().dump(f'{args.profile}.tracemalloc')
+    tracemalloc.stop()
+if stats is not None:
+    print(json.dumps(stats.to_dict(), indent=2), file=sys.stderr)
+if args.grep and not matched:
+    sys.exit(1)
@@ -0,0 +1,310 @@
+"""
+The asyncio interface of the compressor for event loop based services.
+
+Every block is coded in an executor, a process pool shared by the calls
+by default or any `concurrent.futures` executor given, so the event loop
+keeps serving other tasks while large data is coded. The stages hold
+the GIL most of the time, so with a thread pool the event loop gets
+delayed by tens of milliseconds. At most `max_pending` blocks of a call are
+in flight at a time: a call whose blocks aren't coded yet stops reading
+its input, so the memory stays bounded, and the calls that share an executor
+share its workers fairly instead of queueing all their blocks at once.
+
+The output is the same as that of the functions of `compressor`.
+"""
+import asyncio
+import collections
+import functools
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bwt_compressor.block import (
+    DEFAULT_ENTROPY_CODER,
+    DEFAULT_RESTART_POINTS,
+    DEFAULT_STAGE,
+    check_entropy_coder,
+    check_stage,
+    decode_block,
+    decode_legacy_block,
+    encode_block
+)
+from bwt_compressor.container import (
+    DEFAULT_BLOCK_SIZE,
+    END_MARKER,
+    FRAME_LENGTH_SIZE,
+    HEADER_SIZE,
+    check_block_size,
+    frame_block,
+    is_legacy,
+    parse_frame_length,
+    parse_header,
+    split_frames,
+    write_header
+)
+from bwt_compressor.parallel import resolve_workers
+from bwt_compressor.stats import call_with_stats
+
+
+DEFAULT_MAX_PENDING = 2
+
+# The size of the chunks in which an input is read to its end
+_READ_SIZE = 64 * 1024
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+async def compress(
+    data, block_size=DEFAULT_BLOCK_SIZE, restart_points=DEFAULT_RESTART_POINTS,
+    stage=DEFAULT_STAGE, entropy_coder=DEFAULT_ENTROPY_CODER, executor=None,
+    max_pending=DEFAULT_MAX_PENDING, stats=None
+):
+    """
+    Compress any bytes-like object like `compressor.compress` coding
+    the blocks in `executor`.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    data = memoryview(data).cast('B')
+    blocks = (data[i:i + block_size] for i in range(0, len(data), block_size))
+    return b''.join([
+        chunk async for chunk in _compress_blocks(
+            blocks, block_size, restart_points, stage, entropy_coder, executor,
+            max_pending, stats
+        )
+    ])
+
+
+async def decompress(
+    compressed_data, executor=None, max_pending=DEFAULT_MAX_PENDING, stats=None
+):
+    if is_legacy(compressed_data):
+        func, payloads = decode_legacy_block, [compressed_data]
+    else:
+        func = decode_block
+        _, payloads = split_frames(compressed_data)
+    return b''.join([
+        text async for text in _map_blocks(
+            func, payloads, executor, max_pending, stats
+        )
+    ])
+
+
+async def iter_compress(
+    src, block_size=DEFAULT_BLOCK_SIZE, restart_points=DEFAULT_RESTART_POINTS,
+    stage=DEFAULT_STAGE, entropy_coder=DEFAULT_ENTROPY_CODER, executor=None,
+    max_pending=DEFAULT_MAX_PENDING, stats=None
+):
+    """
+    Read `src`, an `asyncio.StreamReader` or an async iterable of bytes-like
+    chunks, in blocks of `block_size` and yield the compressed stream
+    piece by piece as soon as every block is compressed.
+    """
+    blocks = _AsyncReader(src).iter_blocks(block_size)
+    async for chunk in _compress_blocks(
+        blocks, block_size, restart_points, stage, entropy_coder, executor,
+        max_pending, stats
+    ):
+        yield chunk
+
+
+async def iter_decompress(
+    src, executor=None, max_pending=DEFAULT_MAX_PENDING, stats=None
+):
+    """
+    Read the compressed stream from `src`, an `asyncio.StreamReader` or
+    an async iterable of bytes-like chunks, and yield the data of every
+    block as soon as it's decompressed.
+    """
+    reader = _AsyncReader(src)
+    head = await reader.read(HEADER_SIZE)
+    if is_legacy(head):
+        func, payloads = decode_legacy_block, [head + await reader.read()]
+    else:
+        if len(head) != HEADER_SIZE:
+            raise ValueError('Unexpected end of the compressed stream')
+        parse_header(head)
+        func, payloads = decode_block, reader.iter_frames()
+    async for text in _map_blocks(func, payloads, executor, max_pending, stats):
+        yield text
+
+
+async def compress_stream(
+    src, dst, block_size=DEFAULT_BLOCK_SIZE, restart_points=DEFAULT_RESTART_POINTS,
+    stage=DEFAULT_STAGE, entropy_coder=DEFAULT_ENTROPY_CODER, executor=None,
+    max_pending=DEFAULT_MAX_PENDING, stats=None
+):
+    """
+    Compress the data read from `src` like `iter_compress` and write it
+    to `dst`, an `asyncio.StreamWriter` or any object with a `write` method,
+    waiting for it to drain after every piece.
+    """
+    chunks = iter_compress(
+        src, block_size, restart_points, stage, entropy_coder, executor,
+        max_pending, stats
+    )
+    await _write_chunks(chunks, dst)
+
+
+async def decompress_stream(
+    src, dst, executor=None, max_pending=DEFAULT_MAX_PENDING, stats=None
+):
+    """
+    Decompress the data read from `src` like `iter_decompress` and write it
+    to `dst` like `compress_stream`.
+    """
+    await _write_chunks(iter_decompress(src, executor, max_pending, stats), dst)
+
+
+def get_default_executor():
+    """
+    Return the process pool with a worker per CPU that codes the blocks
+    of the calls without an executor, creating it on the first call.
+    """
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ProcessPoolExecutor(resolve_workers(0))
+        return _default_executor
+
+
+async def _compress_blocks(
+    blocks, block_size, restart_points, stage, entropy_coder, executor,
+    max_pending, stats
+):
+    check_block_size(block_size)
+    check_stage(stage)
+    check_entropy_coder(entropy_coder)
+    yield write_header(block_size)
+    encode = functools.partial(
+        encode_block, restart_points=restart_points, stage=stage,
+        entropy_coder=entropy_coder
+    )
+    async for payload in _map_blocks(encode, blocks, executor, max_pending, stats):
+        yield frame_block(payload)
+    yield END_MARKER
+
+
+async def _map_blocks(func, blocks, executor, max_pending, stats):
+    """
+    Apply `func` to every block of the iterable or async iterable `blocks`
+    in `executor` and yield the results in order, with at most `max_pending`
+    blocks submitted at a time. The stats are collected like in
+    `compressor._map_blocks`.
+    """
+    if max_pending < 1:
+        raise ValueError(
+            f'Number of pending blocks must be positive, got {max_pending}'
+        )
+    loop = asyncio.get_running_loop()
+    if executor is None:
+        executor = get_default_executor()
+    if stats is not None:
+        func = functools.partial(call_with_stats, func)
+    # The views of the data can't be pickled for other processes
+    copy_blocks = isinstance(executor, ProcessPoolExecutor)
+    pending = collections.deque()
+    start = time.perf_counter()
+    try:
+        async for block in _iterate(blocks):
+            if len(pending) == max_pending:
+                yield await _collect(pending.popleft(), stats, start)
+                start = time.perf_counter()
+            if copy_blocks:
+                block = bytes(block)
+            pending.append(loop.run_in_executor(executor, func, block))
+        while pending:
+            yield await _collect(pending.popleft(), stats, start)
+            start = time.perf_counter()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def _collect(future, stats, start):
+    result = await future
+    if stats is None:
+        return result
+    result, block_stats = result
+    stats.merge(block_stats)
+    stats.seconds += time.perf_counter() - start
+    return result
+
+
+async def _iterate(iterable):
+    if hasattr(iterable, '__aiter__'):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+async def _write_chunks(chunks, dst):
+    async for chunk in chunks:
+        dst.write(chunk)
+        if hasattr(dst, 'drain'):
+            await dst.drain()
+
+
+class _AsyncReader:
+    """
+    Reads the sizes requested from an `asyncio.StreamReader` or
+    an async iterable of bytes-like chunks.
+    """
+    def __init__(self, src):
+        if hasattr(src, 'read'):
+            self.stream = src
+            self.chunks = None
+        else:
+            self.stream = None
+            self.chunks = src.__aiter__()
+        self.buffer = bytearray()
+
+    async def read(self, size=-1):
+        """
+        Read `size` bytes, fewer only at the end of the input,
+        or all the rest if `size` is negative.
+        """
+        while size < 0 or len(self.buffer) < size:
+            chunk = await self._read_chunk(
+                _READ_SIZE if size < 0 else size - len(self.buffer)
+            )
+            if not chunk:
+                break
+            self.buffer += chunk
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    async def iter_blocks(self, block_size):
+        while True:
+            block = await self.read(block_size)
+            if not block:
+                return
+            yield block
+
+    async def iter_frames(self):
+        while True:
+            length = parse_frame_length(await self._read_exactly(FRAME_LENGTH_SIZE))
+            if length == 0:
+                return
+            yield await self._read_exactly(length)
+
+    async def _read_exactly(self, size):
+        data = await self.read(size)
+        if len(data) != size:
+            raise ValueError('Unexpected end of the compressed stream')
+        return data
+
+    async def _read_chunk(self, size):
+        if self.stream is not None:
+            return await self.stream.read(size)
+        # An empty chunk of an iterable doesn't mean its end
+        async for chunk in self.chunks:
+            if chunk:
+                return chunk
+        return b''
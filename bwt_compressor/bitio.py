@@ -0,0 +1,249 @@
+"""
+Bit-level input and output shared by the entropy coders.
+
+The bits are written and read most significant first through an integer
+accumulator of at most 64 bits, so the memory used is about the size of
+the code rather than a byte per bit.
+"""
+import numpy as np
+
+
+# The longest value written to or read from the accumulator at once,
+# which keeps it within 64 bits
+MAX_LENGTH = 32
+
+# The number of codes packed at once by `BitWriter.write_codes`,
+# which bounds the memory used by the temporary arrays
+_CODES_CHUNK_SIZE = 1 << 16
+
+
+class BitWriter:
+    """
+    Writes bits to a bytearray preallocated for `capacity` bytes,
+    which grows if more bytes are written.
+    """
+    def __init__(self, capacity=0):
+        self.buffer = bytearray(capacity)
+        self.size = 0
+        self.accumulator = 0
+        self.bits_num = 0
+
+    @property
+    def bits_written(self):
+        return 8 * self.size + self.bits_num
+
+    def write(self, value, length):
+        """
+        Write the `length` lowest bits of `value`, which has no higher bits.
+        """
+        while length > MAX_LENGTH:
+            length -= MAX_LENGTH
+            self.write(value >> length, MAX_LENGTH)
+            value &= (1 << length) - 1
+        self.accumulator = (self.accumulator << length) | value
+        self.bits_num += length
+        if self.bits_num >= MAX_LENGTH:
+            bytes_num = self.bits_num >> 3
+            self.bits_num &= 7
+            self._put((self.accumulator >> self.bits_num).to_bytes(bytes_num, 'big'))
+            self.accumulator &= (1 << self.bits_num) - 1
+
+    def write_codes(self, codes, lengths):
+        """
+        Write the NumPy arrays of `codes` of the `lengths` up to 64 bits
+        one after another with vectorized operations.
+        """
+        for start in range(0, len(codes), _CODES_CHUNK_SIZE):
+            end = start + _CODES_CHUNK_SIZE
+            # The pending bits go first as one more code
+            chunk_codes = np.concatenate([
+                np.array([self.accumulator], dtype=np.uint64),
+                codes[start:end].astype(np.uint64)
+            ])
+            chunk_lengths = np.concatenate([
+                np.array([self.bits_num], dtype=np.int64),
+                lengths[start:end].astype(np.int64)
+            ])
+            data, bits_num = _pack_codes(chunk_codes, chunk_lengths)
+            full_bytes_num = bits_num >> 3
+            self.bits_num = bits_num & 7
+            self._put(data[:full_bytes_num])
+            self.accumulator = (
+                data[full_bytes_num] >> (8 - self.bits_num) if self.bits_num else 0
+            )
+
+    def getvalue(self):
+        """
+        Return the written bytes, the last of which is padded with zero bits.
+        """
+        padding_length = -self.bits_num % 8
+        tail = (self.accumulator << padding_length).to_bytes(
+            (self.bits_num + padding_length) // 8, 'big'
+        )
+        return bytes(memoryview(self.buffer)[:self.size]) + tail
+
+    def _put(self, data):
+        end = self.size + len(data)
+        if end > len(self.buffer):
+            capacity = max(end, 2 * len(self.buffer))
+            self.buffer.extend(bytes(capacity - len(self.buffer)))
+        self.buffer[self.size:end] = data
+        self.size = end
+
+
+class BitReader:
+    """
+    Reads bits from any bytes-like object, refilling the accumulator with
+    as many bytes as fit when it runs out of bits. The bits past the end
+    of the data read as zeros.
+    """
+    def __init__(self, data):
+        self.data = memoryview(data).cast('B')
+        self.pos = 0
+        self.accumulator = 0
+        self.bits_num = 0
+
+    @property
+    def bits_read(self):
+        return 8 * self.pos - self.bits_num
+
+    def peek(self, length):
+        """
+        Return the next `length` bits without consuming them.
+        """
+        if self.bits_num < length:
+            self._refill()
+        return (self.accumulator >> (self.bits_num - length)) & ((1 << length) - 1)
+
+    def skip(self, length):
+        """
+        Consume `length` bits, which must have been peeked.
+        """
+        assert length <= self.bits_num
+        self.bits_num -= length
+
+    def read(self, length):
+        value = self.peek(length)
+        self.bits_num -= length
+        return value
+
+    def iter_windows(self, length):
+        """
+        Yield the next `length` bits without consuming them and receive
+        the number of the bits to consume before the next window.
+
+        It's a faster alternative to `peek` and `skip` for the decoding
+        loops, which keeps the state in local variables. The reader
+        mustn't be used otherwise until the generator is closed.
+        """
+        mask = (1 << length) - 1
+        data = self.data
+        accumulator = self.accumulator
+        bits_num = self.bits_num
+        pos = self.pos
+        try:
+            while True:
+                if bits_num < length:
+                    bytes_num = (64 - bits_num) >> 3
+                    chunk = data[pos:pos + bytes_num]
+                    pos += bytes_num
+                    accumulator = (
+                        (accumulator & ((1 << bits_num) - 1)) << (8 * bytes_num) |
+                        int.from_bytes(chunk, 'big') << (8 * (bytes_num - len(chunk)))
+                    )
+                    bits_num += 8 * bytes_num
+                bits_num -= yield (accumulator >> (bits_num - length)) & mask
+        finally:
+            self.accumulator = accumulator
+            self.bits_num = bits_num
+            self.pos = pos
+
+    def read_codes(self, lengths):
+        """
+        Read the codes of the NumPy array of `lengths` up to 63 bits one
+        after another with vectorized operations, the counterpart
+        of `BitWriter.write_codes`. Return them as a uint64 array.
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        start = self.bits_read
+        ends = np.cumsum(lengths)
+        bits_num = int(ends[-1]) if len(ends) else 0
+
+        # The 64 bits from the start of every code are taken from the word
+        # of its start and the next word, which the padding always provides
+        first_byte = start >> 3
+        chunk = np.frombuffer(
+            self.data[first_byte:-(-(start + bits_num) // 8)],
+            dtype=np.uint8
+        )
+        padded_chunk = np.zeros(-(-len(chunk) // 8) * 8 + 16, dtype=np.uint8)
+        padded_chunk[:len(chunk)] = chunk
+        words = padded_chunk.view('>u8').astype(np.uint64)
+        del padded_chunk
+
+        starts = ends - lengths + (start & 7)
+        del ends
+        word_ids = starts >> 6
+        shifts = (starts & 63).astype(np.uint64)
+        del starts
+        windows = words[word_ids] << shifts
+        # Shifting by 64 is undefined, so it's done in two steps
+        windows |= (words[word_ids + 1] >> np.uint64(1)) >> (np.uint64(63) - shifts)
+        del word_ids, shifts
+        codes = (windows >> np.uint64(1)) >> (63 - lengths).astype(np.uint64)
+
+        self._seek(start + bits_num)
+        return codes
+
+    def _seek(self, bit_pos):
+        self.pos = bit_pos >> 3
+        self.accumulator = 0
+        self.bits_num = 0
+        if bit_pos & 7:
+            self.read(bit_pos & 7)
+
+    def _refill(self):
+        bytes_num = (64 - self.bits_num) >> 3
+        chunk = self.data[self.pos:self.pos + bytes_num]
+        self.pos += bytes_num
+        # Drop the consumed bits to keep the accumulator within 64 bits
+        self.accumulator = (
+            (self.accumulator & ((1 << self.bits_num) - 1)) << (8 * bytes_num) |
+            int.from_bytes(chunk, 'big') << (8 * (bytes_num - len(chunk)))
+        )
+        self.bits_num += 8 * bytes_num
+
+
+def _pack_codes(codes, lengths):
+    """
+    Pack the `codes` of the `lengths` one after another most significant
+    bit first. Return the bytes padded with zero bits and the number of bits.
+    """
+    if len(codes) == 0:
+        return b'', 0
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    bits_num = int(ends[-1])
+    del ends
+    words = np.zeros(bits_num // 64 + 1, dtype=np.uint64)
+
+    # The code goes to the end of the word of its start or,
+    # if it doesn't fit, to the word's end and the next word's start
+    word_ids = starts >> 6
+    shifts = 64 - (starts & 63) - lengths
+    del starts
+    fits = shifts >= 0
+    heads = np.where(
+        fits,
+        codes << np.maximum(shifts, 0).astype(np.uint64),
+        codes >> np.maximum(-shifts, 0).astype(np.uint64)
+    )
+    # The codes don't overlap, so adding them is the same as or-ing
+    word_starts = np.flatnonzero(np.diff(word_ids, prepend=-1))
+    words[word_ids[word_starts]] = np.bitwise_or.reduceat(heads, word_starts)
+    del heads
+    tails = ~fits
+    words[word_ids[tails] + 1] |= (
+        codes[tails] << (64 + shifts[tails]).astype(np.uint64)
+    )
+    return words.astype('>u8').tobytes()[:-(-bits_num // 8)], bits_num
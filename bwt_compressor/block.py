@@ -0,0 +1,383 @@
+"""
+Compression of a single block.
+
+A compressed block starts with a header: the second stage applied to
+the BWT (1 byte), the coding of its integers (1 byte), the entropy coder
+(1 byte), the number of the restart rows (4 bytes) and the restart rows
+themselves (4 bytes each, see `bwt.apply_bwt`), the first of which is
+the primary index. A block has a restart row per `MIN_SEGMENT_LENGTH`
+bytes at most, so a small block has only the primary index, and its
+header is compact instead: a byte of the codings with the high bit set
+(the stage in bits 4-6, the integer coding in bit 3 and the entropy coder
+in bits 0-2) and the primary index as a varint, 7 bits per byte, least
+significant first, with the high bit set in all the bytes but the last.
+The rest of the block is the BWT coded with the second
+stage, distance coding or MTF + RLE0, and the entropy coder: adaptive
+or static Huffman coding or range coding.
+
+The integers of the second stage are either written as bytes, which are
+entropy coded, or split into buckets and extra bits (see
+`integers_encoding.encode_integers_as_buckets`). Then the size
+of the entropy coded buckets (4 bytes) goes first, and the extra bits
+follow them as is. Distance coding uses the buckets, since its distances
+are often too large for a byte.
+"""
+import functools
+import struct
+import time
+
+import numpy as np
+
+from bwt_compressor.bwt import (
+    apply_bwt,
+    apply_bwt_many,
+    restore_text_from_bwt,
+    restore_texts_from_bwts
+)
+from bwt_compressor.canonical_huffman import (
+    canonical_huffman_encode,
+    canonical_huffman_decode
+)
+from bwt_compressor.common import TERMINATOR_SYMBOL
+from bwt_compressor.dc import dc_encode, dc_decode
+from bwt_compressor.integers_encoding import (
+    decode_integers_array,
+    decode_integers_from_buckets,
+    encode_integers_array,
+    encode_integers_as_buckets
+)
+from bwt_compressor.huffman import huffman_encode, huffman_decode
+from bwt_compressor.mtf import mtf_rle0_encode, mtf_rle0_decode
+from bwt_compressor.range_coder import range_encode, range_decode
+from bwt_compressor.stats import measure
+
+
+# The version of the block format, which is a part of the cache keys of
+# the blocks, so it's bumped on every change of the format
+BLOCK_FORMAT_VERSION = 2
+
+DEFAULT_RESTART_POINTS = 64
+
+# Every restart row takes 4 bytes of the header, which outweighs the faster
+# restoring of a small block, so a block has at most one per this many bytes
+MIN_SEGMENT_LENGTH = 4 * 1024
+
+# The second stages by their ids in the block header
+STAGES = ['dc', 'mtf']
+AUTO_STAGE = 'auto'
+DEFAULT_STAGE = 'mtf'
+
+_STAGE_CODECS = {
+    'dc': (dc_encode, dc_decode),
+    'mtf': (mtf_rle0_encode, mtf_rle0_decode),
+}
+
+# The codings of the integers of the stages by their ids in the block header
+INTEGER_CODINGS = ['bytes', 'buckets']
+
+_STAGE_INTEGER_CODINGS = {
+    'dc': 'buckets',
+    'mtf': 'bytes',
+}
+
+# The entropy coders by their ids in the block header
+ENTROPY_CODERS = ['adaptive-huffman', 'huffman', 'range', 'range-order1']
+DEFAULT_ENTROPY_CODER = 'huffman'
+
+_ENTROPY_CODECS = {
+    'adaptive-huffman': (huffman_encode, huffman_decode),
+    'huffman': (canonical_huffman_encode, canonical_huffman_decode),
+    'range': (range_encode, range_decode),
+    'range-order1': (functools.partial(range_encode, order=1), range_decode),
+}
+
+# The auto stage is chosen by coding this many chars from the middle
+# of the BWT with every stage
+_AUTO_SAMPLE_SIZE = 64 * 1024
+
+_CODING = struct.Struct('>BBB')
+_UINT32 = struct.Struct('>I')
+
+# The high bit of the first byte of the compact header, which is never set
+# in the stage id of the full one
+_COMPACT_HEADER_FLAG = 0x80
+
+
+def encode_block(
+    data, restart_points=DEFAULT_RESTART_POINTS, stage=DEFAULT_STAGE,
+    entropy_coder=DEFAULT_ENTROPY_CODER, stats=None
+):
+    """
+    Compress a block of any bytes-like object. `stage` is one of `STAGES`
+    or `AUTO_STAGE` to choose the one that codes a sample of the block best,
+    `entropy_coder` is one of `ENTROPY_CODERS`. The stages are reported
+    into `stats` if it's given (see `stats.Stats`).
+    """
+    check_stage(stage)
+    check_entropy_coder(entropy_coder)
+    bwt, restart_rows = measure(
+        stats, 'bwt', apply_bwt, data, restart_points, MIN_SEGMENT_LENGTH
+    )
+    return _encode_bwt(
+        memoryview(data).nbytes, bwt, restart_rows, stage, entropy_coder, stats
+    )
+
+
+def encode_blocks(
+    blocks, restart_points=DEFAULT_RESTART_POINTS, stage=DEFAULT_STAGE,
+    entropy_coder=DEFAULT_ENTROPY_CODER, stats=None
+):
+    """
+    Compress every block of the list `blocks` like `encode_block`, applying
+    the BWT to all of them at once (see `bwt.apply_bwt_many`), which is
+    faster for many small blocks.
+    """
+    check_stage(stage)
+    check_entropy_coder(entropy_coder)
+    start = time.perf_counter()
+    bwts = apply_bwt_many(blocks, restart_points, MIN_SEGMENT_LENGTH)
+    if stats is not None:
+        size = sum(len(bwt) for bwt, _ in bwts)
+        stats.add_stage(
+            'bwt', time.perf_counter() - start, size, size, calls=len(blocks)
+        )
+    return [
+        _encode_bwt(
+            memoryview(block).nbytes, bwt, restart_rows, stage, entropy_coder, stats
+        )
+        for block, (bwt, restart_rows) in zip(blocks, bwts)
+    ]
+
+
+def decode_block(payload, stats=None):
+    bwt, restart_rows = decode_block_bwt(payload, stats)
+    data = measure(stats, 'inverse_bwt', restore_text_from_bwt, bwt, restart_rows)
+    if stats is not None:
+        stats.add_block(len(payload), len(data), get_block_coding(payload))
+    return data
+
+
+def decode_blocks(payloads, stats=None):
+    """
+    Decompress every block of the list `payloads` like `decode_block`,
+    restoring the texts of the small blocks at once
+    (see `bwt.restore_texts_from_bwts`).
+    """
+    bwts = [decode_block_bwt(payload, stats) for payload in payloads]
+    start = time.perf_counter()
+    texts = restore_texts_from_bwts(
+        [bwt for bwt, _ in bwts], [restart_rows for _, restart_rows in bwts]
+    )
+    if stats is not None:
+        size = sum(len(text) for text in texts)
+        stats.add_stage(
+            'inverse_bwt', time.perf_counter() - start, size, size,
+            calls=len(payloads)
+        )
+        for payload, text in zip(payloads, texts):
+            stats.add_block(len(payload), len(text), get_block_coding(payload))
+    return texts
+
+
+def decode_block_bwt(payload, stats=None):
+    """
+    Decode the block only as far as its BWT and return it
+    and the restart rows (see `bwt.apply_bwt`).
+    """
+    (
+        stage, integer_coding, entropy_coder, restart_rows, header_size
+    ) = _decode_header(payload)
+    bwt = _decode_body(
+        memoryview(payload)[header_size:], stage, integer_coding, entropy_coder,
+        stats
+    )
+    return bwt, restart_rows
+
+
+def get_block_coding(payload):
+    """
+    Return the second stage and the entropy coder the block is coded with.
+    """
+    stage, _, entropy_coder, _, _ = _decode_header(payload)
+    return stage, entropy_coder
+
+
+def check_stage(stage):
+    if stage not in STAGES and stage != AUTO_STAGE:
+        raise ValueError(
+            f'Stage must be one of {", ".join(STAGES + [AUTO_STAGE])}, '
+            f'got {stage!r}'
+        )
+
+
+def check_entropy_coder(entropy_coder):
+    if entropy_coder not in ENTROPY_CODERS:
+        raise ValueError(
+            f'Entropy coder must be one of {", ".join(ENTROPY_CODERS)}, '
+            f'got {entropy_coder!r}'
+        )
+
+
+def decode_legacy_block(data, stats=None):
+    """
+    Decode the whole input compressed by the legacy format,
+    which is the block body without the header. The legacy BWT includes
+    the terminator symbol, which the text never contains.
+    """
+    bwt = bytearray(_decode_body(data, 'dc', 'bytes', 'adaptive-huffman', stats))
+    primary_index = bwt.index(ord(TERMINATOR_SYMBOL))
+    del bwt[primary_index]
+    text = measure(
+        stats, 'inverse_bwt', restore_text_from_bwt, bwt, [primary_index]
+    )
+    if stats is not None:
+        stats.add_block(len(data), len(text), ('dc', 'adaptive-huffman'))
+    return text
+
+
+def _encode_bwt(data_size, bwt, restart_rows, stage, entropy_coder, stats):
+    if stage == AUTO_STAGE:
+        stage = measure(stats, 'choose_stage', _choose_stage, bwt)
+    integer_coding = _STAGE_INTEGER_CODINGS[stage]
+    header = _encode_header(stage, integer_coding, entropy_coder, restart_rows)
+    payload = header + _encode_body(bwt, stage, integer_coding, entropy_coder, stats)
+    if stats is not None:
+        stats.add_block(data_size, len(payload), (stage, entropy_coder))
+    return payload
+
+
+def _encode_header(stage, integer_coding, entropy_coder, restart_rows):
+    stage_id = STAGES.index(stage)
+    integer_coding_id = INTEGER_CODINGS.index(integer_coding)
+    entropy_coder_id = ENTROPY_CODERS.index(entropy_coder)
+    if len(restart_rows) == 1:
+        return bytes([
+            _COMPACT_HEADER_FLAG | stage_id << 4 | integer_coding_id << 3 |
+            entropy_coder_id
+        ]) + _encode_varint(restart_rows[0])
+    coding = _CODING.pack(stage_id, integer_coding_id, entropy_coder_id)
+    return coding + b''.join(
+        _UINT32.pack(i) for i in [len(restart_rows)] + restart_rows
+    )
+
+
+def _decode_header(payload):
+    if len(payload) == 0:
+        raise ValueError('Unexpected end of the block')
+    if payload[0] & _COMPACT_HEADER_FLAG:
+        coding = payload[0]
+        stage_id, integer_coding_id, entropy_coder_id = (
+            coding >> 4 & 7, coding >> 3 & 1, coding & 7
+        )
+        primary_index, header_size = _decode_varint(payload, 1)
+        restart_rows = [primary_index]
+    else:
+        stage_id, integer_coding_id, entropy_coder_id = _CODING.unpack_from(payload)
+        restart_rows_num, = _UINT32.unpack_from(payload, _CODING.size)
+        restart_rows = [
+            _UINT32.unpack_from(payload, _CODING.size + _UINT32.size * (i + 1))[0]
+            for i in range(restart_rows_num)
+        ]
+        header_size = _CODING.size + _UINT32.size * (restart_rows_num + 1)
+    if stage_id >= len(STAGES):
+        raise ValueError(f'Unknown block stage: {stage_id}')
+    if integer_coding_id >= len(INTEGER_CODINGS):
+        raise ValueError(f'Unknown block integer coding: {integer_coding_id}')
+    if entropy_coder_id >= len(ENTROPY_CODERS):
+        raise ValueError(f'Unknown block entropy coder: {entropy_coder_id}')
+    return (
+        STAGES[stage_id], INTEGER_CODINGS[integer_coding_id],
+        ENTROPY_CODERS[entropy_coder_id], restart_rows, header_size
+    )
+
+
+def _encode_varint(value):
+    varint = bytearray()
+    while value >= 0x80:
+        varint.append(value & 0x7f | 0x80)
+        value >>= 7
+    varint.append(value)
+    return bytes(varint)
+
+
+def _decode_varint(data, offset):
+    """
+    Return the varint at `offset` of `data` and the offset after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError('Unexpected end of the block')
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, offset
+
+
+def _encode_body(bwt, stage, integer_coding, entropy_coder, stats=None):
+    stage_encode, _ = _STAGE_CODECS[stage]
+    entropy_encode, _ = _ENTROPY_CODECS[entropy_coder]
+    code = measure(stats, f'{stage}_encode', stage_encode, bwt)
+    if integer_coding == 'bytes':
+        bytes_ = measure(stats, 'integers_encode', encode_integers_array, code)
+        return measure(stats, f'{entropy_coder}_encode', entropy_encode, bytes_)
+    buckets, extra_bits = measure(
+        stats, 'integers_encode', encode_integers_as_buckets, code
+    )
+    del code
+    buckets_code = measure(stats, f'{entropy_coder}_encode', entropy_encode, buckets)
+    return _UINT32.pack(len(buckets_code)) + buckets_code + extra_bits
+
+
+def _decode_body(body, stage, integer_coding, entropy_coder, stats=None):
+    _, stage_decode = _STAGE_CODECS[stage]
+    _, entropy_decode = _ENTROPY_CODECS[entropy_coder]
+    if integer_coding == 'bytes':
+        bytes_ = measure(stats, f'{entropy_coder}_decode', entropy_decode, body)
+        code = measure(stats, 'integers_decode', decode_integers_array, bytes_)
+    else:
+        body = memoryview(body)
+        buckets_code_size, = _UINT32.unpack_from(body)
+        buckets_code_end = _UINT32.size + buckets_code_size
+        buckets = measure(
+            stats, f'{entropy_coder}_decode', entropy_decode,
+            body[_UINT32.size:buckets_code_end]
+        )
+        code = measure(
+            stats, 'integers_decode', decode_integers_from_buckets,
+            buckets, body[buckets_code_end:]
+        )
+    bwt = measure(stats, f'{stage}_decode', stage_decode, code)
+    return bwt
+
+
+def _choose_stage(bwt):
+    """
+    Return the stage whose code of a sample of the BWT has the smallest
+    estimated size. MTF is faster, so it wins the ties.
+    """
+    sample_start = max(len(bwt) - _AUTO_SAMPLE_SIZE, 0) // 2
+    sample = memoryview(bwt)[sample_start:sample_start + _AUTO_SAMPLE_SIZE]
+    return min(
+        ['mtf', 'dc'],
+        key=lambda stage: _estimate_code_size(
+            _STAGE_CODECS[stage][0](sample), _STAGE_INTEGER_CODINGS[stage]
+        )
+    )
+
+
+def _estimate_code_size(code, integer_coding):
+    """
+    Estimate the size in bits of the Huffman code of the integers
+    by the entropy of their bytes or buckets plus the extra bits.
+    """
+    if integer_coding == 'bytes':
+        bytes_, extra_bits = encode_integers_array(code), b''
+    else:
+        bytes_, extra_bits = encode_integers_as_buckets(code)
+    counts = np.bincount(np.frombuffer(bytes_, dtype=np.uint8))
+    counts = counts[counts > 0]
+    return -float(np.sum(counts * np.log2(counts / len(bytes_)))) + 8 * len(extra_bits)
@@ -1,17 +1,210 @@
-import itertools
+"""
+The BWT and its inverse.
+
+The suffix arrays and the permutations are NumPy arrays of int32 or,
+for the blocks of 2^31 bytes and more, of int64 (see `get_index_dtype`).
+For a block of n bytes with 4-byte indices, `apply_bwt` takes at most
+about 6n bytes of memory on top of the data: the suffix array (4n),
+the BWT (n) and its bytes (n), and `restore_text_from_bwt` about 8n:
+the BWT (n), the LF mapping (4n), the last column (n), the text (n)
+and its bytes (n). With 8-byte indices, it's 4n more.
+"""
 import warnings
 
+import numpy as np
 from pydivsufsort import divsufsort
 
-from bwt_compressor.common import (
-    ALPHABET_SIZE,
-    TERMINATOR_SYMBOL
-)
+from bwt_compressor.common import ALPHABET_SIZE
+
+
+# The number of bytes processed at once by the chunked loops,
+# which bounds the memory used by the temporary arrays
+_CHUNK_SIZE = 1 << 20
+
+# The texts of this size and more are sorted alone by `apply_bwt_many`
+_MAX_JOINED_TEXT_SIZE = 1024
+
+# The BWTs of this size and more are restored alone
+# by `restore_texts_from_bwts`
+_MAX_JOINED_BWT_SIZE = 8 * 1024
+
+# Below this number of walks NumPy calls cost more than a Python loop
+_MIN_VECTORIZED_WALKS = 16
 
 
-def apply_bwt(text):
-    assert TERMINATOR_SYMBOL not in text
+def apply_bwt(data, restart_points=1, min_segment_length=1):
+    """
+    Apply the BWT to any bytes-like object.
+
+    The BWT matrix is built for the data followed by a virtual terminator
+    symbol that is less than any byte. The terminator is left out of
+    the returned BWT, and its position in the last column of the matrix,
+    the primary index, is returned instead as the first of the restart rows.
+
+    The restart rows are the rows of the BWT matrix that start with
+    `restart_points` evenly spaced suffixes of the data (the first one is
+    the whole data). They let `restore_text_from_bwt` restore the segments
+    of the data between them independently. There are no more of them than
+    segments of `min_segment_length` bytes fit the data, and at least one.
+    """
+    assert restart_points > 0
+
+    data = _as_byte_array(data)
+    if len(data) == 0:
+        return b'', []
+    return _build_bwt(
+        data, _sort_suffixes(data),
+        clamp_restart_points(len(data), restart_points, min_segment_length)
+    )
+
+
+def apply_bwt_many(texts, restart_points=1, min_segment_length=1):
+    """
+    Apply the BWT to every bytes-like object of the list `texts` like
+    `apply_bwt`, sorting the suffixes of all of them at once, which saves
+    the fixed cost of a suffix sort per text for many small ones.
+
+    The texts are joined with a terminator less than any byte after each,
+    so the order of the suffixes of a text is the same as in the text alone:
+    of two suffixes of one text, the shorter one reaches its terminator
+    before they differ at the latest. The bytes are shifted up by one
+    for the terminator, so the joined text is sorted as 2-byte symbols,
+    which takes longer per byte, so the long texts are sorted alone.
+    """
+    assert restart_points > 0
+
+    texts = [_as_byte_array(text) for text in texts]
+    results = [None] * len(texts)
+    short_ids = [
+        i for i, text in enumerate(texts) if len(text) < _MAX_JOINED_TEXT_SIZE
+    ]
+    for i, result in zip(
+        short_ids, _apply_bwt_joined(
+            [texts[i] for i in short_ids], restart_points, min_segment_length
+        )
+    ):
+        results[i] = result
+    for i, text in enumerate(texts):
+        if results[i] is None:
+            results[i] = apply_bwt(text, restart_points, min_segment_length)
+    return results
+
+
+def _apply_bwt_joined(texts, restart_points, min_segment_length):
+    if not texts:
+        return []
+    lengths = np.array([len(text) for text in texts], dtype=np.int64)
+    # The terminators are at the ends of the texts
+    ends = np.cumsum(lengths + 1) - 1
+    is_text = np.ones(ends[-1] + 1, dtype=bool)
+    is_text[ends] = False
+    joined = np.zeros(len(is_text), dtype=np.uint16)
+    joined[is_text] = np.concatenate(texts)
+    joined[is_text] += 1
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        suffixes = divsufsort(joined)
+    del joined
+    suffixes = suffixes[is_text[suffixes]]
+
+    # Group the suffixes by their texts keeping their order in every text
+    text_ids = np.repeat(np.arange(len(texts)), lengths + 1)
+    suffixes = suffixes[np.argsort(text_ids[suffixes], kind='stable')]
+    del text_ids
+    starts = ends - lengths
+    suffixes -= np.repeat(starts, lengths).astype(suffixes.dtype)
+
+    results = []
+    # The first suffix of every text without the terminators before it
+    for text, start in zip(texts, starts - np.arange(len(texts))):
+        if len(text) == 0:
+            results.append((b'', []))
+            continue
+        text_suffixes = suffixes[start:start + len(text)].astype(
+            get_index_dtype(len(text))
+        )
+        results.append(_build_bwt(
+            text, text_suffixes,
+            clamp_restart_points(len(text), restart_points, min_segment_length)
+        ))
+    return results
+
+
+def _build_bwt(data, suffix_array, restart_points):
+    """
+    Build the BWT and the restart rows of the data from its suffix array,
+    which is modified in place.
+    """
+    text_length = len(data)
+    # The first row is the terminator suffix preceded by the last byte,
+    # other rows are preceded by the byte before the sorted suffix.
+    # The row of the whole data is preceded by the terminator.
+    # The suffixes are turned into the positions of the preceding bytes
+    # in place, and the whole data gets the last byte, which is the byte
+    # of the first row, so it's moved there.
+    preceding_positions = suffix_array
+    preceding_positions -= 1
+    primary_index = int(np.argmin(preceding_positions)) + 1
+    bwt = np.empty(text_length, dtype=np.uint8)
+    for start in range(0, text_length, _CHUNK_SIZE):
+        end = start + _CHUNK_SIZE
+        np.take(data, preceding_positions[start:end], out=bwt[start:end], mode='wrap')
+    bwt[1:primary_index] = bwt[:primary_index - 1]
+    bwt[0] = data[-1]
+
+    restart_rows = _find_restart_rows(preceding_positions, restart_points)
+    del preceding_positions
+    assert restart_rows[0] == primary_index
+    return bwt.tobytes(), restart_rows
+
+
+def get_index_dtype(length):
+    """
+    Return the dtype of the indices of an array of `length` items.
+    """
+    return np.int32 if length < 2**31 else np.int64
+
+
+def _find_restart_rows(preceding_positions, restart_points):
+    """
+    Find the rows of the suffixes at the restart points by the positions
+    of the bytes preceding the sorted suffixes.
+    """
+    segment_length = get_segment_length(len(preceding_positions), restart_points)
+    restart_rows = np.empty(
+        get_segment_length(len(preceding_positions), segment_length), dtype=np.int64
+    )
+    for start in range(0, len(preceding_positions), _CHUNK_SIZE):
+        suffixes = preceding_positions[start:start + _CHUNK_SIZE] + 1
+        sorted_positions = np.flatnonzero(suffixes % segment_length == 0)
+        # The first row of the BWT matrix is the terminator suffix
+        restart_rows[suffixes[sorted_positions] // segment_length] = (
+            start + sorted_positions + 1
+        )
+    return restart_rows.tolist()
+
+
+def clamp_restart_points(text_length, restart_points, min_segment_length):
+    """
+    Return the number of the restart points of the text that leaves
+    the segments between them at least `min_segment_length` long.
+    """
+    return max(min(restart_points, text_length // min_segment_length), 1)
+
 
+def get_segment_length(text_length, restart_points):
+    """
+    Return the distance between the restart points. The number of
+    the restart points that fit the text is `ceil(text_length / segment_length)`,
+    which may be less than the requested number.
+    """
+    return -(-text_length // restart_points)
+
+
+def _apply_bwt_python(text):
+    """
+    Reference implementation that builds the BWT byte by byte.
+    """
     suffix_array = _build_suffix_array(text)
 
     bwt = [None] * len(text)
@@ -19,17 +212,34 @@ def apply_bwt(text):
         if suffix_start_index != 0:
             bwt[sorted_position] = text[suffix_start_index - 1]
         else:
-            bwt[sorted_position] = TERMINATOR_SYMBOL
+            primary_index = sorted_position + 1
 
-    first_char = text[-1] if len(text) > 0 else TERMINATOR_SYMBOL
+    if len(text) == 0:
+        return b'', []
 
-    return first_char + ''.join(bwt)
+    bwt = [text[-1]] + bwt
+    del bwt[primary_index]
+    return bytes(bwt), [primary_index]
 
 
-def _build_suffix_array(text):
+def _sort_suffixes(data):
+    # divsufsort reads bytes and writable buffers in place,
+    # other read-only buffers have to be copied
+    if not isinstance(data, bytes) and not _is_writable(data):
+        data = bytes(data)
     with warnings.catch_warnings():
         warnings.simplefilter('ignore')
-        sorted_ranks = divsufsort(text)
+        return divsufsort(data)
+
+
+def _is_writable(data):
+    return isinstance(data, np.ndarray) and data.flags.writeable
+
+
+def _build_suffix_array(text):
+    if len(text) == 0:
+        return np.zeros(0, dtype=np.int32)
+    sorted_ranks = _sort_suffixes(text)
     return _compute_inverse_permutation(sorted_ranks)
 
 
@@ -41,44 +251,194 @@ def _build_suffix_array_naive(text):
     return _compute_inverse_permutation(sorted_ranks)
 
 
-def restore_text_from_bwt(bwt):
-    sorting_permutation_inverse = _compute_sorting_permutation_inverse(bwt)
-    text = [None] * (len(bwt) - 1)
-    cur_pos = bwt.find(TERMINATOR_SYMBOL)
-    for i in range(len(text)):
-        cur_pos = sorting_permutation_inverse[cur_pos]
-        text[i] = bwt[cur_pos]
-    return ''.join(text)
+def restore_text_from_bwt(bwt, restart_rows):
+    """
+    Restore the text by following the BWT matrix rows from every restart row
+    (see `apply_bwt`). With many restart rows the walks are done
+    simultaneously, one NumPy step for all of them.
+    """
+    bwt = _as_byte_array(bwt)
+    text_length = len(bwt)
+    if text_length == 0:
+        return b''
+
+    primary_index = restart_rows[0]
+    next_rows = _compute_next_rows(bwt, primary_index)
+    # The last column of the BWT matrix including the terminator,
+    # its value doesn't matter since the walks never read it
+    last_column = np.insert(bwt, primary_index, 0)
+    segment_length = get_segment_length(text_length, len(restart_rows))
+    assert get_segment_length(text_length, segment_length) == len(restart_rows)
+
+    if len(restart_rows) < _MIN_VECTORIZED_WALKS:
+        walk_rows = _walk_rows_python
+    else:
+        walk_rows = _walk_rows_vectorized
+    text = walk_rows(last_column, next_rows, restart_rows, segment_length)
+    del next_rows, last_column
+    return text[:text_length].tobytes()
+
+
+def restore_texts_from_bwts(bwts, restart_rows_list):
+    """
+    Restore the text of every BWT of the list `bwts` with its restart rows
+    like `restore_text_from_bwt`. The short BWTs with only the primary index
+    are restored all at once, one NumPy step for all of their walks, which
+    saves the fixed cost of the NumPy calls per BWT for many small ones.
+    """
+    bwts = [_as_byte_array(bwt) for bwt in bwts]
+    results = [None] * len(bwts)
+    short_ids = [
+        i for i, (bwt, restart_rows) in enumerate(zip(bwts, restart_rows_list))
+        if 0 < len(bwt) < _MAX_JOINED_BWT_SIZE and len(restart_rows) == 1
+    ]
+    for i, text in zip(short_ids, _restore_texts_joined(
+        [bwts[i] for i in short_ids],
+        [restart_rows_list[i][0] for i in short_ids]
+    )):
+        results[i] = text
+    for i, (bwt, restart_rows) in enumerate(zip(bwts, restart_rows_list)):
+        if results[i] is None:
+            results[i] = restore_text_from_bwt(bwt, restart_rows)
+    return results
+
+
+def _restore_texts_joined(bwts, primary_indices):
+    """
+    Walk the BWT matrices of all the BWTs as one: the rows of every matrix
+    (including its terminator row) follow the rows of the previous ones,
+    and the walk of every text starts at its primary index.
+    """
+    if not bwts:
+        return []
+    lengths = np.array([len(bwt) for bwt in bwts], dtype=np.intp)
+    primary_indices = np.array(primary_indices, dtype=np.intp)
+    bwt_starts = np.cumsum(lengths) - lengths
+    row_starts = bwt_starts + np.arange(len(bwts))
+    joined = np.concatenate(bwts)
+    text_ids = np.repeat(np.arange(len(bwts)), lengths)
+
+    # The rows of the bytes of every BWT skip its terminator row
+    positions = np.arange(len(joined)) - np.repeat(bwt_starts, lengths)
+    rows = positions + (positions >= primary_indices[text_ids])
+    del positions
+    last_column = np.zeros(len(joined) + len(bwts), dtype=np.uint8)
+    last_column[row_starts[text_ids] + rows] = joined
+
+    # The stable sort of the bytes of every BWT gives its next rows
+    order = np.argsort(text_ids * ALPHABET_SIZE + joined, kind='stable')
+    del joined
+    next_rows = np.empty(len(last_column), dtype=np.intp)
+    next_rows[row_starts] = row_starts + primary_indices
+    next_rows[np.arange(len(order)) + text_ids + 1] = (
+        row_starts[text_ids] + rows[order]
+    )
+    del order, rows, text_ids
+
+    # The shorter walks wrap around harmlessly, their extra bytes are cut off
+    texts = np.empty((len(bwts), int(lengths.max())), dtype=np.uint8)
+    walk_rows = row_starts + primary_indices
+    for i in range(texts.shape[1]):
+        walk_rows = next_rows[walk_rows]
+        texts[:, i] = last_column[walk_rows]
+    return [text[:length].tobytes() for text, length in zip(texts, lengths.tolist())]
+
+
+def _compute_next_rows(bwt, primary_index):
+    """
+    Compute the inverse of the sorting permutation of the last column of
+    the BWT matrix, that is the row of the next suffix for every row.
+    """
+    next_rows = np.empty(len(bwt) + 1, dtype=get_index_dtype(len(bwt) + 1))
+    next_rows[0] = primary_index
+    _compute_sorting_permutation_inverse(bwt, out=next_rows[1:])
+    # The terminator is the least symbol, the rows after it are shifted
+    for start in range(1, len(next_rows), _CHUNK_SIZE):
+        rows = next_rows[start:start + _CHUNK_SIZE]
+        rows += rows >= primary_index
+    return next_rows
+
+
+def _walk_rows_python(last_column, next_rows, restart_rows, segment_length):
+    text_length = len(last_column) - 1
+    next_rows = next_rows.tolist()
+    last_column = last_column.tobytes()
+    text = bytearray(text_length)
+    for segment_start, row in zip(
+        range(0, text_length, segment_length), restart_rows
+    ):
+        for i in range(segment_start, min(segment_start + segment_length, text_length)):
+            row = next_rows[row]
+            text[i] = last_column[row]
+    return np.frombuffer(text, dtype=np.uint8)
+
+
+def _walk_rows_vectorized(last_column, next_rows, restart_rows, segment_length):
+    # The last segment may be shorter, its walk wraps around harmlessly
+    # and the extra bytes are cut off by the caller.
+    segments = np.empty((len(restart_rows), segment_length), dtype=np.uint8)
+    # NumPy indexes by intp much faster than by the compact indices
+    rows = np.array(restart_rows, dtype=np.intp)
+    for i in range(segment_length):
+        rows = next_rows[rows].astype(np.intp)
+        segments[:, i] = last_column[rows]
+    return segments.reshape(-1)
 
 
-def _compute_sorting_permutation_inverse(text):
-    sorting_permutation = _compute_sorting_permutation(text)
-    return _compute_inverse_permutation(sorting_permutation)
+def _as_byte_array(data):
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def _compute_sorting_permutation_inverse(data, out=None):
+    """
+    Compute the order of the stable sort of the bytes, which is
+    the inverse of the sorting permutation, into the compact `out` array.
+
+    The data is sorted in chunks, so only the order of a chunk takes
+    8 bytes per index, and the sorted chunks are merged by placing
+    every byte after the same bytes of the previous chunks.
+    """
+    data = _as_byte_array(data)
+    if out is None:
+        out = np.empty(len(data), dtype=get_index_dtype(len(data)))
+    # The next place of every byte value in the order
+    next_places = _get_chars_start_positions(_get_chars_counters(data))
+    for start in range(0, len(data), _CHUNK_SIZE):
+        chunk = data[start:start + _CHUNK_SIZE]
+        chunk_order = np.argsort(chunk, kind='stable')
+        chunk_counters = _get_chars_counters(chunk)
+        sorted_chunk = chunk[chunk_order]
+        places = np.arange(len(chunk), dtype=np.int64)
+        places += (next_places - _get_chars_start_positions(chunk_counters))[sorted_chunk]
+        del sorted_chunk
+        chunk_order += start
+        out[places] = chunk_order
+        next_places += chunk_counters
+    return out
 
 
-def _compute_sorting_permutation(text):
-    counters = _get_chars_counters(text)
-    start_positions = _get_chars_start_positions(counters)
-    sorting_permutation = [None] * len(text)
-    for i, c in enumerate(text):
-        sorting_permutation[i] = start_positions[ord(c)]
-        start_positions[ord(c)] += 1
-    return sorting_permutation
+def _compute_sorting_permutation(data):
+    return _compute_inverse_permutation(_compute_sorting_permutation_inverse(data))
 
 
-def _get_chars_counters(text):
-    counters = [0] * ALPHABET_SIZE
-    for c in text:
-        counters[ord(c)] += 1
+def _get_chars_counters(data):
+    # bincount converts the bytes to intp, so it's done in chunks
+    data = _as_byte_array(data)
+    counters = np.zeros(ALPHABET_SIZE, dtype=np.int64)
+    for start in range(0, len(data), _CHUNK_SIZE):
+        counters += np.bincount(data[start:start + _CHUNK_SIZE], minlength=ALPHABET_SIZE)
     return counters
 
 
 def _get_chars_start_positions(counters):
-    return list(itertools.accumulate([0] + counters))[:-1]
+    start_positions = np.zeros_like(counters)
+    np.cumsum(counters[:-1], out=start_positions[1:])
+    return start_positions
 
 
 def _compute_inverse_permutation(permutation):
-    inverse_permutation = [None] * len(permutation)
-    for i, j in enumerate(permutation):
-        inverse_permutation[j] = i
-    return inverse_permutation
\ No newline at end of file
+    permutation = np.asarray(permutation)
+    index_dtype = get_index_dtype(len(permutation))
+    inverse_permutation = np.empty(len(permutation), dtype=index_dtype)
+    inverse_permutation[permutation] = np.arange(len(permutation), dtype=index_dtype)
+    return inverse_permutation
@@ -0,0 +1,462 @@
+"""
+The file object interface of the compressor, like `bz2.BZ2File`
+and `bz2.open`.
+
+Written data is compressed block by block as soon as a block is full,
+so only one block is held in memory. Read data is decompressed lazily
+block by block, and the next block is decoded by a background thread while
+the current one is read. Seeking decodes only the block of the new position:
+with the index of the blocks it's found at once, otherwise the frames
+of the blocks before it are skipped without decoding them.
+"""
+import bisect
+import builtins
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from bwt_compressor.block import (
+    DEFAULT_ENTROPY_CODER,
+    DEFAULT_RESTART_POINTS,
+    DEFAULT_STAGE,
+    check_entropy_coder,
+    check_stage,
+    decode_block,
+    decode_legacy_block,
+    encode_block
+)
+from bwt_compressor.container import (
+    DEFAULT_BLOCK_SIZE,
+    END_MARKER,
+    HEADER_SIZE,
+    check_block_size,
+    frame_block,
+    is_legacy,
+    parse_header,
+    read_frame,
+    read_fully,
+    read_stream_index,
+    write_header,
+    write_index
+)
+
+
+_MODE_READ = 'r'
+_MODE_WRITE = 'w'
+_MODE_CLOSED = None
+
+
+class BWTFile(io.BufferedIOBase):
+    """
+    A file object that compresses the data written to it or decompresses
+    the data read from it.
+
+    `filename` is a path or a binary file object. `mode` is 'r' for reading
+    or 'w' or 'x' for writing, optionally with 'b'. There's no append mode
+    (see `open`). The other arguments
+    are those of `compressor.compress` and apply to writing; with `index`
+    the stream ends with the index of the blocks, which makes seeking in it
+    faster. Partial blocks aren't written until the file is closed,
+    so `flush` only flushes the underlying file.
+    """
+    def __init__(
+        self, filename, mode='r', *, block_size=DEFAULT_BLOCK_SIZE,
+        restart_points=DEFAULT_RESTART_POINTS, stage=DEFAULT_STAGE,
+        entropy_coder=DEFAULT_ENTROPY_CODER, index=False, read_ahead=True
+    ):
+        self._fp = None
+        self._close_fp = False
+        self._mode = _MODE_CLOSED
+        if mode in ('r', 'rb'):
+            file_mode = 'rb'
+        elif mode in ('w', 'wb', 'x', 'xb'):
+            file_mode = mode[0] + 'b'
+            check_block_size(block_size)
+            check_stage(stage)
+            check_entropy_coder(entropy_coder)
+        else:
+            raise ValueError(f'Invalid mode: {mode!r}')
+
+        if isinstance(filename, (str, bytes, os.PathLike)):
+            self._fp = builtins.open(filename, file_mode)
+            self._close_fp = True
+        elif hasattr(filename, 'read') or hasattr(filename, 'write'):
+            self._fp = filename
+            self._close_fp = False
+        else:
+            raise TypeError('filename must be a str, bytes, file or PathLike object')
+
+        try:
+            if file_mode == 'rb':
+                self._init_reading(read_ahead)
+            else:
+                self._init_writing(
+                    block_size, restart_points, stage, entropy_coder, index
+                )
+        except BaseException:
+            if self._close_fp:
+                self._fp.close()
+            raise
+        self._mode = _MODE_READ if file_mode == 'rb' else _MODE_WRITE
+
+    def _init_writing(self, block_size, restart_points, stage, entropy_coder, index):
+        self._block_size = block_size
+        self._encode_options = {
+            'restart_points': restart_points, 'stage': stage,
+            'entropy_coder': entropy_coder,
+        }
+        self._index = index
+        self._buffer = bytearray()
+        self._pos = 0
+        # The offsets of the written blocks in the data and in the stream
+        self._entries = []
+        self._data_offset = 0
+        header = write_header(block_size)
+        self._fp.write(header)
+        self._frame_offset = len(header)
+
+    def _init_reading(self, read_ahead):
+        self._start = self._fp.tell() if self._fp.seekable() else None
+        head = read_fully(self._fp, HEADER_SIZE)
+        self._executor = ThreadPoolExecutor(1) if read_ahead else None
+        # The current block, its offset in the data and the position in it
+        self._block = b''
+        self._block_start = 0
+        self._block_pos = 0
+        # The offset of the next block in the data and, if its frame is
+        # already read, its payload and the future of its decoding, if any;
+        # otherwise its frame starts at the position of the file
+        self._next_start = 0
+        self._pending = None
+        self._frames_end = False
+        self._entries = None
+        self._size = None
+        if is_legacy(head):
+            self._block = decode_legacy_block(head + self._fp.read())
+            self._next_start = self._size = len(self._block)
+            self._frames_end = True
+            return
+        if len(head) != HEADER_SIZE:
+            raise ValueError('Unexpected end of the compressed stream')
+        self._block_size = parse_header(head)
+        if self._start is not None:
+            index = read_stream_index(self._fp, self._start)
+            if index is not None:
+                self._entries, self._size = index
+            self._fp.seek(self._start + HEADER_SIZE)
+
+    @property
+    def closed(self):
+        return self._mode == _MODE_CLOSED
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._mode == _MODE_WRITE:
+                if self._buffer:
+                    self._write_block(self._buffer)
+                self._fp.write(END_MARKER)
+                if self._index:
+                    self._fp.write(write_index(self._entries, self._data_offset))
+            elif self._executor is not None:
+                self._drop_pending()
+                self._executor.shutdown()
+        finally:
+            try:
+                if self._close_fp:
+                    self._fp.close()
+            finally:
+                self._mode = _MODE_CLOSED
+                self._fp = None
+                self._buffer = self._block = None
+
+    def fileno(self):
+        self._check_not_closed()
+        return self._fp.fileno()
+
+    def readable(self):
+        self._check_not_closed()
+        return self._mode == _MODE_READ
+
+    def writable(self):
+        self._check_not_closed()
+        return self._mode == _MODE_WRITE
+
+    def seekable(self):
+        return self.readable() and self._fp.seekable()
+
+    def tell(self):
+        self._check_not_closed()
+        if self._mode == _MODE_WRITE:
+            return self._pos
+        return self._block_start + self._block_pos
+
+    def write(self, data):
+        """
+        Compress the bytes-like `data` and return its size. The full blocks
+        are compressed and written immediately, the rest is buffered.
+        """
+        self._check_can(_MODE_WRITE)
+        data = memoryview(data).cast('B')
+        size = len(data)
+        self._pos += size
+        if self._buffer:
+            taken = self._block_size - len(self._buffer)
+            self._buffer += data[:taken]
+            data = data[taken:]
+            if len(self._buffer) < self._block_size:
+                return size
+            self._write_block(self._buffer)
+            self._buffer = bytearray()
+        # The full blocks of the data aren't copied to the buffer
+        while len(data) >= self._block_size:
+            self._write_block(data[:self._block_size])
+            data = data[self._block_size:]
+        self._buffer += data
+        return size
+
+    def flush(self):
+        self._check_not_closed()
+        if self._mode == _MODE_WRITE:
+            self._fp.flush()
+
+    def read(self, size=-1):
+        """
+        Read up to `size` bytes, fewer only at the end of the data,
+        or all the rest if `size` is negative or None.
+        """
+        self._check_can(_MODE_READ)
+        if size is None or size < 0:
+            size = sys.maxsize
+        chunks = []
+        while size > 0 and self._fill_block():
+            chunk = self._block[self._block_pos:self._block_pos + size]
+            self._block_pos += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def read1(self, size=-1):
+        """
+        Read up to `size` bytes decompressing at most one block.
+        """
+        self._check_can(_MODE_READ)
+        if size is None or size < 0:
+            size = sys.maxsize
+        if size == 0 or not self._fill_block():
+            return b''
+        chunk = self._block[self._block_pos:self._block_pos + size]
+        self._block_pos += len(chunk)
+        return chunk
+
+    def readinto(self, b):
+        with memoryview(b) as view, view.cast('B') as byte_view:
+            data = self.read(len(byte_view))
+            byte_view[:len(data)] = data
+        return len(data)
+
+    def peek(self, size=0):
+        """
+        Return the buffered data without advancing the position,
+        at least one byte unless at the end of the data.
+        """
+        self._check_can(_MODE_READ)
+        if not self._fill_block():
+            return b''
+        return self._block[self._block_pos:]
+
+    def readline(self, size=-1):
+        self._check_can(_MODE_READ)
+        if size is None or size < 0:
+            size = sys.maxsize
+        chunks = []
+        while size > 0 and self._fill_block():
+            end = self._block.find(b'\n', self._block_pos)
+            end = len(self._block) if end == -1 else end + 1
+            chunk = self._block[self._block_pos:min(end, self._block_pos + size)]
+            self._block_pos += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+            if chunk.endswith(b'\n'):
+                break
+        return b''.join(chunks)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """
+        Change the position in the data, which is clamped to the end of it,
+        and return it. Seeking backward in a stream without the index
+        rereads it from the start, skipping the frames before the position.
+        """
+        self._check_can(_MODE_READ)
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.tell() + offset
+        elif whence == io.SEEK_END:
+            position = self._get_size() + offset
+        else:
+            raise ValueError(f'Invalid whence: {whence}')
+        if position < 0:
+            raise ValueError(f'Negative seek position {position}')
+
+        if not self._block_start <= position <= self._block_start + len(self._block):
+            if self._entries is not None:
+                self._load_indexed_block(position)
+            else:
+                if position < self._block_start:
+                    self._rewind()
+                self._skip_blocks(position)
+        self._block_pos = min(position - self._block_start, len(self._block))
+        return self.tell()
+
+    def _write_block(self, block):
+        frame = frame_block(encode_block(block, **self._encode_options))
+        self._fp.write(frame)
+        self._entries.append((self._data_offset, self._frame_offset))
+        self._data_offset += len(block)
+        self._frame_offset += len(frame)
+
+    def _fill_block(self):
+        """
+        Make the current block have data after the position unless
+        the data ends, which is when False is returned.
+        """
+        while self._block_pos == len(self._block):
+            if not self._load_next_block():
+                return False
+        return True
+
+    def _load_next_block(self):
+        """
+        Make the next block the current one and start decoding the one after
+        it. Return False if there are no more blocks.
+        """
+        if self._pending is None:
+            payload = self._read_frame()
+            if payload is None:
+                return False
+            self._pending = payload, None
+        payload, future = self._pending
+        self._pending = None
+        self._block = decode_block(payload) if future is None else future.result()
+        self._block_start = self._next_start
+        self._block_pos = 0
+        self._next_start += len(self._block)
+        if self._executor is not None:
+            payload = self._read_frame()
+            if payload is not None:
+                self._pending = payload, self._executor.submit(decode_block, payload)
+        return True
+
+    def _read_frame(self):
+        if self._frames_end:
+            return None
+        payload = read_frame(self._fp)
+        self._frames_end = payload is None
+        return payload
+
+    def _drop_pending(self):
+        if self._pending is not None and self._pending[1] is not None:
+            self._pending[1].cancel()
+        self._pending = None
+
+    def _load_indexed_block(self, position):
+        """
+        Make the block of `position` the current one, finding it by the index.
+        """
+        i = bisect.bisect_right([start for start, _ in self._entries], position) - 1
+        if i < 0:
+            self._rewind()
+            return
+        self._drop_pending()
+        data_offset, frame_offset = self._entries[i]
+        self._fp.seek(self._start + frame_offset)
+        self._frames_end = False
+        self._next_start = data_offset
+        self._load_next_block()
+
+    def _rewind(self):
+        if self._start is None:
+            raise io.UnsupportedOperation('Seeking backward in a non-seekable file')
+        self._drop_pending()
+        self._fp.seek(self._start + HEADER_SIZE)
+        self._frames_end = False
+        self._block = b''
+        self._block_start = self._block_pos = self._next_start = 0
+
+    def _skip_blocks(self, position):
+        """
+        Make the block of `position` or the last one the current one,
+        skipping the frames of the blocks before it without decoding them.
+        All the blocks but the last one are of the block size, so the last
+        skipped one is decoded only if the data ends before `position`.
+        """
+        skipped_payload = None
+        while self._pending is not None or not self._frames_end:
+            if self._pending is None:
+                payload = self._read_frame()
+                if payload is None:
+                    break
+                self._pending = payload, None
+            if position < self._next_start + self._block_size:
+                self._load_next_block()
+                return
+            skipped_payload = self._pending[0]
+            self._drop_pending()
+            self._next_start += self._block_size
+        if skipped_payload is not None:
+            # The data ends in the last skipped block
+            self._next_start -= self._block_size
+            self._pending = skipped_payload, None
+            self._load_next_block()
+
+    def _get_size(self):
+        if self._size is None:
+            position = self.tell()
+            self._skip_blocks(sys.maxsize)
+            self._size = self._block_start + len(self._block)
+            self.seek(position)
+        return self._size
+
+    def _check_not_closed(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+
+    def _check_can(self, mode):
+        self._check_not_closed()
+        if self._mode != mode:
+            raise io.UnsupportedOperation(
+                'File not open for ' + ('reading' if mode == _MODE_READ else 'writing')
+            )
+
+
+def open(
+    filename, mode='rb', *, block_size=DEFAULT_BLOCK_SIZE,
+    restart_points=DEFAULT_RESTART_POINTS, stage=DEFAULT_STAGE,
+    entropy_coder=DEFAULT_ENTROPY_CODER, index=False, encoding=None,
+    errors=None, newline=None
+):
+    """
+    Open a compressed file in binary or text mode like `bz2.open`.
+    `mode` is 'r', 'w' or 'x' with 'b' (the default) or 't' for text, which
+    wraps the `BWTFile` in `io.TextIOWrapper` with `encoding` (the locale
+    encoding by default), `errors` and `newline`.
+
+    Unlike `bz2.open`, there's no append mode 'a': the readers stop at
+    the end of the first stream, and its index is at the end of the file.
+    """
+    if 't' in mode:
+        if 'b' in mode:
+            raise ValueError(f'Invalid mode: {mode!r}')
+    elif encoding is not None or errors is not None or newline is not None:
+        raise ValueError('Arguments of the text mode are given in the binary mode')
+    binary_file = BWTFile(
+        filename, mode.replace('t', ''), block_size=block_size,
+        restart_points=restart_points, stage=stage, entropy_coder=entropy_coder,
+        index=index
+    )
+    if 't' in mode:
+        return io.TextIOWrapper(binary_file, encoding, errors, newline)
+    return binary_file
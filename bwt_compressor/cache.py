@@ -0,0 +1,150 @@
+"""
+The content-addressed cache of the coded blocks.
+
+A block is keyed by the BLAKE2b hash of its content and of the parameters
+of its coding, so the compressor reuses the payload of a block it has
+already compressed, and the decompressor reuses the data of a payload it
+has already decompressed, without running any stage. The entries are kept
+in memory within a byte budget, the least recently used ones evicted first,
+and optionally in a directory, where they're kept across the runs.
+
+A file of the directory holds the BLAKE2b hash of the value followed by
+the value. A file that can't be read or whose value doesn't match the hash
+is a miss, and it's removed, so the value is written again.
+"""
+import collections
+import contextlib
+import hashlib
+import os
+import tempfile
+import threading
+
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+# The size of the keys, with which a collision is practically impossible
+_DIGEST_SIZE = 16
+
+
+class BlockCache:
+    """
+    The cache of up to `max_bytes` of the values in memory and of all
+    of them in `directory` if it's given.
+    """
+    def __init__(self, max_bytes=DEFAULT_CACHE_SIZE, directory=None):
+        if max_bytes < 0:
+            raise ValueError(f'Cache size must be non-negative, got {max_bytes}')
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key, stats=None):
+        """
+        Return the value of `key` or None and count the hit or the miss
+        in the cache and in `stats`.
+        """
+        with self._lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+        if value is None and self.directory is not None:
+            value = self._read(key)
+            if value is not None:
+                self._remember(key, value, stats)
+        self._count('hits' if value is not None else 'misses', stats)
+        return value
+
+    def put(self, key, value, stats=None):
+        value = bytes(value)
+        self._remember(key, value, stats)
+        if self.directory is not None:
+            self._write(key, value)
+
+    def to_dict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.size,
+        }
+
+    def _remember(self, key, value, stats):
+        if len(value) > self.max_bytes:
+            return
+        evictions = 0
+        with self._lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            while self.size + len(value) > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                evictions += 1
+            self.entries[key] = value
+            self.size += len(value)
+        self._count('evictions', stats, evictions)
+
+    def _count(self, name, stats, number=1):
+        if not number:
+            return
+        with self._lock:
+            setattr(self, name, getattr(self, name) + number)
+        if stats is not None:
+            stats.cache[name] += number
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def _read(self, key):
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError:
+            entry = b''
+        value = entry[_DIGEST_SIZE:]
+        if entry[:_DIGEST_SIZE] == _hash_value(value):
+            return value
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+        return None
+
+    def _write(self, key, value):
+        path = self._get_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Renaming a complete file keeps the readers from partial ones
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_hash_value(value))
+                f.write(value)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def make_key(kind, data):
+    """
+    Return the key of the bytes-like `data` coded with the `kind` string,
+    which names the direction and the parameters of the coding.
+    """
+    digest = hashlib.blake2b(kind.encode(), digest_size=_DIGEST_SIZE)
+    digest.update(b'\0')
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def _hash_value(value):
+    return hashlib.blake2b(value, digest_size=_DIGEST_SIZE).digest()
@@ -0,0 +1,339 @@
+"""
+Static canonical Huffman coding of bytes with optional multiple tables,
+as in bzip2: the data is split into groups of `GROUP_SIZE` symbols and
+every group is coded with the table that codes it best.
+
+The code starts with the number of tables (3 bits), the bit length
+of the number of symbols (6 bits) and the number itself, which spend
+a couple of bytes of a small block rather than five. Then the code
+lengths follow as in bzip2: the bitmap of
+the 16-symbol ranges with the symbols that occur (16 bits), the bitmap
+of the symbols of every such range (16 bits each), and for every table
+the length of the first symbol that occurs (4 bits) and the differences
+of the lengths of the next ones, each a '10' per increment or a '11' per
+decrement followed by a '0'. Every table has a code for every symbol that
+occurs. If there is more than one table, the table selectors of
+the groups follow, packed in as few bits as needed, and the header is
+padded to a byte. The rest is the bitstream of the codes, most
+significant bit first. Since the codes are canonical, they are restored
+from the lengths.
+"""
+import heapq
+
+import numpy as np
+
+from bwt_compressor.bitio import BitReader, BitWriter
+from bwt_compressor.common import ALPHABET_SIZE
+
+
+GROUP_SIZE = 50
+MAX_TABLES_NUM = 6
+MAX_CODE_LENGTH = 15
+
+# The decoder looks up this many bits at once and only the codes that
+# are longer fall back to the table of the maximum code length
+PRIMARY_TABLE_BITS = 12
+
+# The number of symbols coded at once, which bounds the memory used
+# by the temporary arrays
+_SYMBOLS_CHUNK_SIZE = 1024 * GROUP_SIZE
+
+# The tables are refined by reassigning the groups this many times
+_TABLES_ITERATIONS_NUM = 4
+
+_TABLES_NUM_BITS = 3
+_SYMBOLS_NUM_LENGTH_BITS = 6
+
+# The ranges of the symbols in the bitmap of the symbols that occur
+_RANGE_SIZE = 16
+_LENGTH_BITS = 4
+
+# The bits of the differences between the code lengths by the differences
+# shifted to be non-negative: a '10' per increment or a '11' per decrement
+# followed by a '0'
+_DELTA_CODES = np.array([
+    int(('10' if delta > 0 else '11') * abs(delta) + '0', 2)
+    for delta in range(1 - MAX_CODE_LENGTH, MAX_CODE_LENGTH)
+], dtype=np.uint64)
+_DELTA_LENGTHS = 2 * np.abs(np.arange(1 - MAX_CODE_LENGTH, MAX_CODE_LENGTH)) + 1
+
+# The full decoding table of the codes that all fit the primary table,
+# which is looked up only for corrupted codes, is shared by all of them
+_EMPTY_FULL_TABLE = [0] * (1 << MAX_CODE_LENGTH)
+
+
+def canonical_huffman_encode(data, tables_num=None):
+    """
+    Code any bytes-like `data` with `tables_num` Huffman tables. By default
+    the more symbols there are, the more tables are used, as in bzip2,
+    and a few thousand symbols and fewer are coded with a single table.
+    """
+    if tables_num is None:
+        tables_num = _choose_tables_num(len(data))
+    if not 1 <= tables_num <= MAX_TABLES_NUM:
+        raise ValueError(
+            f'Number of tables must be between 1 and {MAX_TABLES_NUM}, '
+            f'got {tables_num}'
+        )
+    symbols = np.frombuffer(data, dtype=np.uint8)
+    groups_num = -(-len(symbols) // GROUP_SIZE)
+    tables_num = max(min(tables_num, groups_num), 1)
+    lengths, selectors = _build_tables(symbols, tables_num)
+    codes = np.stack([_compute_canonical_codes(l) for l in lengths])
+
+    header_writer = BitWriter()
+    header_writer.write(tables_num, _TABLES_NUM_BITS)
+    header_writer.write(len(symbols).bit_length(), _SYMBOLS_NUM_LENGTH_BITS)
+    header_writer.write(len(symbols), len(symbols).bit_length())
+    _write_lengths(header_writer, lengths)
+    if tables_num > 1:
+        header_writer.write_codes(
+            selectors, np.full(len(selectors), (tables_num - 1).bit_length())
+        )
+    header = header_writer.getvalue()
+
+    # The code is usually about half the size of the data
+    writer = BitWriter(len(symbols) // 2)
+    for start in range(0, len(symbols), _SYMBOLS_CHUNK_SIZE):
+        chunk = symbols[start:start + _SYMBOLS_CHUNK_SIZE]
+        chunk_groups = slice(
+            start // GROUP_SIZE, (start + _SYMBOLS_CHUNK_SIZE) // GROUP_SIZE
+        )
+        chunk_tables = np.repeat(selectors[chunk_groups], GROUP_SIZE)[:len(chunk)]
+        writer.write_codes(
+            codes[chunk_tables, chunk], lengths[chunk_tables, chunk]
+        )
+    return header + writer.getvalue()
+
+
+def canonical_huffman_decode(code):
+    code = memoryview(code).cast('B')
+    header_reader = BitReader(code)
+    tables_num = header_reader.read(_TABLES_NUM_BITS)
+    if not 1 <= tables_num <= MAX_TABLES_NUM:
+        raise ValueError(f'Invalid number of Huffman tables: {tables_num}')
+    symbols_num = header_reader.read(header_reader.read(_SYMBOLS_NUM_LENGTH_BITS))
+    tables = [
+        _build_decoding_tables(lengths)
+        for lengths in _read_lengths(header_reader, tables_num)
+    ]
+
+    groups_num = -(-symbols_num // GROUP_SIZE)
+    if tables_num > 1:
+        selectors = header_reader.read_codes(
+            np.full(groups_num, (tables_num - 1).bit_length())
+        ).tolist()
+        if max(selectors, default=0) >= tables_num:
+            raise ValueError('Invalid Huffman table selector')
+    else:
+        selectors = [0] * groups_num
+    offset = -(-header_reader.bits_read // 8)
+
+    windows = BitReader(code[offset:]).iter_windows(MAX_CODE_LENGTH)
+    window = next(windows)
+    data = bytearray(symbols_num)
+    primary_shift = MAX_CODE_LENGTH - PRIMARY_TABLE_BITS
+    for group, table_id in enumerate(selectors):
+        primary_table, full_table = tables[table_id]
+        for i in range(
+            group * GROUP_SIZE, min((group + 1) * GROUP_SIZE, symbols_num)
+        ):
+            entry = primary_table[window >> primary_shift]
+            if entry == 0:
+                entry = full_table[window]
+            # An entry is the symbol and the length of its code
+            data[i] = entry >> 4
+            window = windows.send(entry & 0xf)
+    windows.close()
+
+    return bytes(data)
+
+
+def _choose_tables_num(symbols_num):
+    # Below a few thousand symbols another table costs more than it saves
+    for tables_num, max_symbols_num in enumerate(
+        [2400, 4800, 9600, 19200, 38400], 1
+    ):
+        if symbols_num < max_symbols_num:
+            return tables_num
+    return MAX_TABLES_NUM
+
+
+def _build_tables(symbols, tables_num):
+    """
+    Return the code lengths of the tables and the table of every group.
+    """
+    groups_num = -(-len(symbols) // GROUP_SIZE)
+    if tables_num == 1:
+        counts = np.bincount(symbols, minlength=ALPHABET_SIZE)
+        return (
+            _compute_code_lengths(counts)[np.newaxis],
+            np.zeros(groups_num, dtype=np.uint8)
+        )
+
+    group_ids = np.arange(len(symbols)) // GROUP_SIZE
+    group_counts = np.bincount(
+        group_ids * ALPHABET_SIZE + symbols,
+        minlength=groups_num * ALPHABET_SIZE
+    ).reshape(groups_num, ALPHABET_SIZE)
+    del group_ids
+    # Every table must be able to code all the symbols of the data
+    occurs = group_counts.any(axis=0)
+
+    # Start with the tables of the consecutive ranges of the groups
+    selectors = (np.arange(groups_num) * tables_num // groups_num).astype(np.uint8)
+    for _ in range(_TABLES_ITERATIONS_NUM):
+        lengths = np.stack([
+            _compute_code_lengths(
+                group_counts[selectors == table_id].sum(axis=0) + occurs
+            )
+            for table_id in range(tables_num)
+        ])
+        costs = group_counts @ lengths.T.astype(np.int64)
+        new_selectors = costs.argmin(axis=1).astype(np.uint8)
+        # The same selectors would give the same tables again
+        if np.array_equal(new_selectors, selectors):
+            break
+        selectors = new_selectors
+    return lengths, selectors
+
+
+def _compute_code_lengths(counts):
+    """
+    Compute the Huffman code lengths of the symbols with the `counts`
+    limited by `MAX_CODE_LENGTH`. If the limit is exceeded, the counts
+    are flattened as in bzip2, and the code is built again.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    while True:
+        lengths = _compute_unlimited_code_lengths(counts)
+        if lengths.max(initial=0) <= MAX_CODE_LENGTH:
+            return lengths
+        counts = np.where(counts > 0, counts // 2 + 1, 0)
+
+
+def _compute_unlimited_code_lengths(counts):
+    lengths = np.zeros(len(counts), dtype=np.uint8)
+    symbols = np.flatnonzero(counts).tolist()
+    if len(symbols) == 1:
+        lengths[symbols[0]] = 1
+        return lengths
+
+    # Nodes are the leafs followed by the internal ones in the order
+    # of their creation, which is enough to find the depth of the leafs
+    heap = list(zip(counts[symbols].tolist(), range(len(symbols))))
+    heapq.heapify(heap)
+    parents = [0] * (2 * len(symbols) - 1)
+    next_node = len(symbols)
+    while len(heap) > 1:
+        count1, node1 = heapq.heappop(heap)
+        count2, node2 = heapq.heappop(heap)
+        parents[node1] = parents[node2] = next_node
+        heapq.heappush(heap, (count1 + count2, next_node))
+        next_node += 1
+
+    depths = [0] * len(parents)
+    for node in range(len(parents) - 2, -1, -1):
+        depths[node] = depths[parents[node]] + 1
+    lengths[symbols] = depths[:len(symbols)]
+    return lengths
+
+
+def _compute_canonical_codes(lengths):
+    """
+    Assign consecutive codes to the symbols in the order of their code
+    lengths and then their values. Every code followed by the zeros up to
+    `MAX_CODE_LENGTH` bits is the sum of the spans of the previous codes.
+    """
+    lengths = np.asarray(lengths, dtype=np.uint64)
+    symbols = np.lexsort((np.arange(len(lengths)), lengths))
+    symbols = symbols[lengths[symbols] > 0]
+    shifts = MAX_CODE_LENGTH - lengths[symbols]
+    spans = np.left_shift(np.uint64(1), shifts)
+    codes = np.zeros(len(lengths), dtype=np.uint64)
+    codes[symbols] = (np.cumsum(spans) - spans) >> shifts
+    return codes
+
+
+def _build_decoding_tables(lengths):
+    """
+    Build the lookup tables indexed by the next `PRIMARY_TABLE_BITS` and
+    `MAX_CODE_LENGTH` bits of the code. The entries of the primary table
+    for the prefixes of the longer codes are zeros.
+
+    In the order of the canonical codes every code is the one that follows
+    the previous code, so the entries of the codes fill the consecutive
+    spans of a table from its start, and the shorter codes go first.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    symbols = np.lexsort((np.arange(len(lengths)), lengths))
+    symbols = symbols[lengths[symbols] > 0]
+    lengths = lengths[symbols]
+    entries = symbols << 4 | lengths
+    is_primary = lengths <= PRIMARY_TABLE_BITS
+    primary_table = _fill_table(
+        entries[is_primary], lengths[is_primary], PRIMARY_TABLE_BITS
+    )
+    if is_primary.all():
+        return primary_table, _EMPTY_FULL_TABLE
+    return primary_table, _fill_table(entries, lengths, MAX_CODE_LENGTH)
+
+
+def _fill_table(entries, lengths, table_bits):
+    spans = np.left_shift(1, table_bits - lengths)
+    size = int(spans.sum())
+    if size > 1 << table_bits:
+        raise ValueError('Invalid Huffman code lengths')
+    table = np.zeros(1 << table_bits, dtype=np.int64)
+    table[:size] = np.repeat(entries, spans)
+    return table.tolist()
+
+
+def _write_lengths(writer, lengths):
+    """
+    Write the bitmaps of the symbols that occur and their code lengths
+    in every table of the `lengths` array.
+    """
+    occurs = lengths.any(axis=0).reshape(-1, _RANGE_SIZE)
+    range_occurs = occurs.any(axis=1)
+    bitmaps = np.concatenate([range_occurs, occurs[range_occurs].reshape(-1)])
+    writer.write_codes(bitmaps, np.ones(len(bitmaps), dtype=np.int64))
+    if not range_occurs.any():
+        return
+    for table_lengths in lengths[:, occurs.reshape(-1)].astype(np.int64):
+        writer.write(int(table_lengths[0]), _LENGTH_BITS)
+        deltas = np.diff(table_lengths) + MAX_CODE_LENGTH - 1
+        writer.write_codes(_DELTA_CODES[deltas], _DELTA_LENGTHS[deltas])
+
+
+def _read_lengths(reader, tables_num):
+    """
+    Read the code lengths of `tables_num` tables written by `_write_lengths`.
+    """
+    symbols = []
+    range_bitmap = reader.read(_RANGE_SIZE)
+    for range_start in range(0, ALPHABET_SIZE, _RANGE_SIZE):
+        range_bitmap <<= 1
+        if range_bitmap >> _RANGE_SIZE & 1:
+            bitmap = reader.read(_RANGE_SIZE)
+            symbols.extend(
+                range_start + i for i in range(_RANGE_SIZE)
+                if bitmap >> (_RANGE_SIZE - 1 - i) & 1
+            )
+
+    tables_lengths = np.zeros((tables_num, ALPHABET_SIZE), dtype=np.uint8)
+    if not symbols:
+        return tables_lengths
+    for table_lengths in tables_lengths:
+        length = reader.read(_LENGTH_BITS)
+        lengths = [length]
+        for _ in range(len(symbols) - 1):
+            while reader.read(1):
+                length += 1 - 2 * reader.read(1)
+                if not 1 <= length <= MAX_CODE_LENGTH:
+                    raise ValueError('Invalid Huffman code lengths')
+            lengths.append(length)
+        if lengths[0] == 0:
+            raise ValueError('Invalid Huffman code lengths')
+        table_lengths[symbols] = lengths
+    return tables_lengths
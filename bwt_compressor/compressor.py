@@ -1,33 +1,624 @@
+import bisect
+import collections
+import contextlib
+import functools
+import io
+import mmap
+import os
+import struct
+import time
+
 import numpy as np
 
-from bwt_compressor.integers_encoding import (
-    decode_integers_from_bytes,
-    encode_integers_as_bytes
+from bwt_compressor.block import (
+    BLOCK_FORMAT_VERSION,
+    DEFAULT_ENTROPY_CODER,
+    DEFAULT_RESTART_POINTS,
+    DEFAULT_STAGE,
+    check_entropy_coder,
+    check_stage,
+    decode_block,
+    decode_blocks,
+    decode_legacy_block,
+    encode_block,
+    encode_blocks,
+    get_block_coding
 )
-
-from bwt_compressor.bwt import apply_bwt, restore_text_from_bwt
-from bwt_compressor.dc import dc_encode, dc_decode
-from bwt_compressor.integers_encoding import (
-    encode_integers_as_bytes,
-    decode_integers_from_bytes
+from bwt_compressor.cache import make_key
+from bwt_compressor.container import (
+    DEFAULT_BLOCK_SIZE,
+    END_MARKER,
+    HEADER_SIZE,
+    MAGIC,
+    check_block_size,
+    frame_at,
+    frame_block,
+    is_legacy,
+    parse_header,
+    read_frames,
+    read_header,
+    read_fully,
+    read_index,
+    split_frames,
+    write_header,
+    write_index
 )
-from bwt_compressor.huffman import huffman_encode, huffman_decode
+from bwt_compressor.memory import choose_parameters, estimate_memory
+from bwt_compressor.parallel import map_blocks, resolve_workers
+from bwt_compressor.stats import call_with_stats
+
+
+# The number of the messages coded together by `compress_many`
+# and `decompress_many`
+DEFAULT_BATCH_SIZE = 256
+
+_BATCH_SIZE = struct.Struct('>I')
+
+
+def compress(
+    data, block_size=DEFAULT_BLOCK_SIZE, workers=1,
+    restart_points=DEFAULT_RESTART_POINTS, stage=DEFAULT_STAGE,
+    entropy_coder=DEFAULT_ENTROPY_CODER, stats=None, max_memory=None,
+    index=False, cache=None
+):
+    """
+    Compress any bytes-like object (bytes, bytearray, memoryview, mmap,
+    NumPy uint8 array) without copying it. For compatibility, a str is
+    compressed as UTF-8.
+
+    With `workers` other than 1 the blocks are compressed in parallel
+    by that many processes (0 means one per CPU). `restart_points` is
+    the number of points in every block from which the decompressor
+    restores the data simultaneously. `stage` is the second stage applied
+    to the BWT: 'mtf' (faster), 'dc' (better compression) or 'auto'
+    to choose one per block. `entropy_coder` is 'huffman' (static,
+    the fastest), 'adaptive-huffman' (about 10 times slower), 'range'
+    (adaptive range coding, about as slow, compresses a bit better than
+    'huffman') or 'range-order1' (range coding with the model keyed on
+    the previous byte, better only when the bytes depend on it).
+
+    If `stats` is a `stats.Stats` object, the time, the sizes and
+    the codings of the blocks and of every stage are added to it.
+    It's also accepted by the other functions of this module.
+
+    With `max_memory` in bytes, `block_size` and `workers` are the upper
+    bounds of the parameters chosen to keep the estimated peak memory of
+    the compression within it, not counting the input and the output.
+
+    With `index`, the stream ends with the index of the blocks,
+    with which `decompress_range` finds the blocks of a range at once.
+
+    With `cache`, a `cache.BlockCache`, the blocks compressed before with
+    the same parameters are taken from it instead of being compressed
+    again. The decompression functions take it too.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    block_size, workers = _choose_parameters(
+        max_memory, block_size, workers, stage, data, stats
+    )
+    blocks = _split_data(data, block_size)
+    return b''.join(
+        _compress_blocks(
+            blocks, block_size, workers, restart_points, stage, entropy_coder,
+            stats, index, cache
+        )
+    )
+
+
+def decompress(compressed_data, workers=1, stats=None, cache=None):
+    if is_legacy(compressed_data):
+        return b''.join(_decompress_legacy(compressed_data, stats))
+    return b''.join(
+        _decompress_blocks(io.BytesIO(compressed_data), workers, stats, cache)
+    )
+
+
+def decompress_range(
+    compressed_data, start, length, workers=1, stats=None, cache=None
+):
+    """
+    Return `length` bytes of the data from its `start` offset or fewer
+    at its end, decompressing only the blocks that overlap them. The blocks
+    are found by the index if the stream has one and by skipping
+    the frames otherwise.
+    """
+    if start < 0 or length < 0:
+        raise ValueError(f'Invalid range: start {start}, length {length}')
+    if is_legacy(compressed_data):
+        return decompress(compressed_data, stats=stats)[start:start + length]
+    data_offsets, payloads = find_blocks(compressed_data)
+    first = max(bisect.bisect_right(data_offsets, start) - 1, 0)
+    end = bisect.bisect_left(data_offsets, start + length) if length else first
+    text = b''.join(
+        _map_cached(decode_block, payloads[first:end], workers, stats, cache)
+    )
+    offset = start - data_offsets[first] if data_offsets else 0
+    return text[offset:offset + length]
+
+
+def decompress_text(compressed_data, encoding='utf-8', workers=1, stats=None):
+    """
+    Decompress the data and decode it as text, like `decompress` in
+    the versions that worked with str only.
+    """
+    return decompress(compressed_data, workers, stats).decode(encoding)
+
+
+def compress_many(
+    messages, block_size=DEFAULT_BLOCK_SIZE, workers=1,
+    restart_points=DEFAULT_RESTART_POINTS, stage=DEFAULT_STAGE,
+    entropy_coder=DEFAULT_ENTROPY_CODER, stats=None, batch_size=DEFAULT_BATCH_SIZE
+):
+    """
+    Compress every bytes-like object of the iterable `messages` to its own
+    stream, the same as `compress` returns, and yield the streams in order.
+
+    It's for many small messages, for which the fixed cost of a call
+    outweighs their coding. The messages are coded in batches of
+    `batch_size`: the BWT of all the blocks of a batch is done at once,
+    and with `workers` other than 1 every batch goes to a worker process.
+    """
+    check_block_size(block_size)
+    check_stage(stage)
+    check_entropy_coder(entropy_coder)
+    compress_batch = functools.partial(
+        _compress_batch, block_size=block_size, restart_points=restart_points,
+        stage=stage, entropy_coder=entropy_coder
+    )
+    for streams in _map_blocks(
+        compress_batch, _pack_batches(messages, batch_size), workers, stats
+    ):
+        yield from streams
+
+
+def decompress_many(
+    compressed_messages, workers=1, stats=None, batch_size=DEFAULT_BATCH_SIZE
+):
+    """
+    Decompress every stream of the iterable `compressed_messages`
+    and yield the data in order, in batches like `compress_many`:
+    the inverse BWT of all the small blocks of a batch is done at once.
+    """
+    for texts in _map_blocks(
+        _decompress_batch, _pack_batches(compressed_messages, batch_size),
+        workers, stats
+    ):
+        yield from texts
+
+
+def compress_stream(
+    src, dst, block_size=DEFAULT_BLOCK_SIZE, workers=1,
+    restart_points=DEFAULT_RESTART_POINTS, stage=DEFAULT_STAGE,
+    entropy_coder=DEFAULT_ENTROPY_CODER, stats=None, max_memory=None,
+    index=False, cache=None
+):
+    """
+    Compress the data read from the binary `src` file object and write
+    the result to the binary `dst` file object holding a bounded number of
+    blocks in memory.
+    """
+    for chunk in iter_compress(
+        src, block_size, workers, restart_points, stage, entropy_coder, stats,
+        max_memory, index, cache
+    ):
+        dst.write(chunk)
+
+
+def decompress_stream(src, dst, workers=1, stats=None, cache=None):
+    """
+    Decompress the data read from the binary `src` file object and write
+    the result to the binary `dst` file object block by block.
+    """
+    for data in iter_decompress(src, workers, stats, cache):
+        dst.write(data)
+
+
+def iter_compress(
+    src, block_size=DEFAULT_BLOCK_SIZE, workers=1,
+    restart_points=DEFAULT_RESTART_POINTS, stage=DEFAULT_STAGE,
+    entropy_coder=DEFAULT_ENTROPY_CODER, stats=None, max_memory=None,
+    index=False, cache=None
+):
+    """
+    Read the binary `src` file object in chunks of `block_size` and yield
+    the compressed stream piece by piece as soon as every block is compressed.
+    """
+    block_size, workers = _choose_parameters(
+        max_memory, block_size, workers, stage, None, stats
+    )
+    blocks = _read_blocks(src, block_size)
+    return _compress_blocks(
+        blocks, block_size, workers, restart_points, stage, entropy_coder, stats,
+        index, cache
+    )
+
+
+def iter_decompress(src, workers=1, stats=None, cache=None):
+    """
+    Read the compressed stream from the binary `src` file object and yield
+    the data of every block as soon as it's decompressed.
+    """
+    head = read_fully(src, len(MAGIC))
+    if is_legacy(head):
+        yield from _decompress_legacy(head + src.read(), stats)
+        return
+    yield from _decompress_blocks(_ChainedReader(head, src), workers, stats, cache)
+
+
+def compress_file(
+    src_path, dst_path, block_size=DEFAULT_BLOCK_SIZE, workers=1,
+    restart_points=DEFAULT_RESTART_POINTS, stage=DEFAULT_STAGE,
+    entropy_coder=DEFAULT_ENTROPY_CODER, stats=None, max_memory=None,
+    index=False, cache=None
+):
+    """
+    Compress the file at `src_path` to the file at `dst_path`.
+    The input is memory-mapped, and the blocks are views of the mapping,
+    so the input is never copied as a whole.
+    """
+    with open(src_path, 'rb') as src, map_file(src) as data:
+        block_size, workers = _choose_parameters(
+            max_memory, block_size, workers, stage, data, stats
+        )
+        with open(dst_path, 'wb') as dst:
+            blocks = _split_data(data, block_size)
+            for chunk in _compress_blocks(
+                blocks, block_size, workers, restart_points, stage,
+                entropy_coder, stats, index, cache
+            ):
+                dst.write(chunk)
+
+
+def decompress_file(src_path, dst_path, workers=1, stats=None, cache=None):
+    """
+    Decompress the file at `src_path` to the file at `dst_path`.
+    The input is memory-mapped. Since all the blocks but the last one
+    are of the block size, the output file is preallocated for all the
+    blocks, and every block is written at its offset.
+    """
+    with open(src_path, 'rb') as src, map_file(src) as data:
+        with open(dst_path, 'wb') as dst:
+            if is_legacy(data):
+                for text in _decompress_legacy(data, stats):
+                    dst.write(text)
+                return
+            block_size, payloads = split_frames(data)
+            fd = dst.fileno()
+            _preallocate(fd, len(payloads) * block_size)
+            offset = 0
+            for i, text in enumerate(
+                _map_cached(decode_block, payloads, workers, stats, cache)
+            ):
+                if i < len(payloads) - 1 and len(text) != block_size:
+                    raise ValueError('Unexpected size of a decompressed block')
+                _write_at(fd, text, offset)
+                offset += len(text)
+            del payloads
+            os.ftruncate(fd, offset)
+
+
+def decompress_file_range(
+    src_path, start, length, workers=1, stats=None, cache=None
+):
+    """
+    Return the range of the data compressed to the file at `src_path` like
+    `decompress_range`. The file is memory-mapped, so only the index
+    and the blocks of the range are read.
+    """
+    with open(src_path, 'rb') as src, map_file(src) as data:
+        return decompress_range(data, start, length, workers, stats, cache)
+
+
+def list_blocks(src):
+    """
+    Read the compressed stream from the binary `src` file object and yield
+    the compressed size, the second stage and the entropy coder
+    of every block.
+    """
+    head = read_fully(src, len(MAGIC))
+    if is_legacy(head):
+        yield len(head + src.read()), 'dc', 'adaptive-huffman'
+        return
+    src = _ChainedReader(head, src)
+    read_header(src)
+    for payload in read_frames(src):
+        yield (len(payload), *get_block_coding(payload))
+
+
+def _choose_parameters(max_memory, block_size, workers, stage, data, stats):
+    """
+    Return the block size and the number of workers for `max_memory`
+    or the given ones if it's None, and report them to `stats`.
+    """
+    check_block_size(block_size)
+    check_stage(stage)
+    workers = resolve_workers(workers)
+    if max_memory is not None:
+        block_size, workers = choose_parameters(
+            max_memory, block_size, workers, stage, data
+        )
+    if stats is not None:
+        stats.parameters.update({
+            'block_size': block_size,
+            'workers': workers,
+            'max_memory': max_memory,
+            'estimated_memory': estimate_memory(block_size, workers, stage),
+        })
+    return block_size, workers
+
+
+def _pack_batches(messages, batch_size):
+    """
+    Yield every `batch_size` messages as a single bytes-like block, which
+    is how they go to the workers: the number of the messages, their sizes
+    (4 bytes each) and the messages.
+    """
+    if batch_size < 1:
+        raise ValueError(f'Batch size must be positive, got {batch_size}')
+    batch = []
+    for message in messages:
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        batch.append(memoryview(message).cast('B'))
+        if len(batch) == batch_size:
+            yield _pack_batch(batch)
+            batch = []
+    if batch:
+        yield _pack_batch(batch)
+
+
+def _pack_batch(messages):
+    sizes = np.array([len(message) for message in messages], dtype='>u4')
+    return b''.join([_BATCH_SIZE.pack(len(messages)), sizes.tobytes(), *messages])
+
+
+def _unpack_batch(batch):
+    batch = memoryview(batch)
+    messages_num, = _BATCH_SIZE.unpack_from(batch)
+    offset = _BATCH_SIZE.size + 4 * messages_num
+    sizes = np.frombuffer(batch[_BATCH_SIZE.size:offset], dtype='>u4')
+    ends = (offset + np.cumsum(sizes, dtype=np.int64)).tolist()
+    return [batch[start:end] for start, end in zip([offset] + ends, ends)]
+
+
+def _compress_batch(
+    batch, block_size, restart_points, stage, entropy_coder, stats=None
+):
+    messages = _unpack_batch(batch)
+    blocks = [list(_split_data(message, block_size)) for message in messages]
+    payloads = iter(encode_blocks(
+        [block for message_blocks in blocks for block in message_blocks],
+        restart_points, stage, entropy_coder, stats
+    ))
+    header = write_header(block_size)
+    return [
+        b''.join([
+            header, *(frame_block(next(payloads)) for _ in message_blocks),
+            END_MARKER
+        ])
+        for message_blocks in blocks
+    ]
+
+
+def _decompress_batch(batch, stats=None):
+    messages = _unpack_batch(batch)
+    payloads = [
+        [] if is_legacy(message) else split_frames(message)[1]
+        for message in messages
+    ]
+    texts = iter(decode_blocks(
+        [payload for message_payloads in payloads for payload in message_payloads],
+        stats
+    ))
+    return [
+        decompress(message, stats=stats) if is_legacy(message) else
+        b''.join(next(texts) for _ in message_payloads)
+        for message, message_payloads in zip(messages, payloads)
+    ]
+
+
+def _compress_blocks(
+    blocks, block_size, workers, restart_points, stage, entropy_coder,
+    stats=None, index=False, cache=None
+):
+    check_block_size(block_size)
+    check_stage(stage)
+    check_entropy_coder(entropy_coder)
+    header = write_header(block_size)
+    yield header
+    encode = functools.partial(
+        encode_block, restart_points=restart_points, stage=stage,
+        entropy_coder=entropy_coder
+    )
+    # The sizes of the blocks read but not compressed yet
+    block_sizes = collections.deque()
+    entries = []
+    data_offset = 0
+    frame_offset = len(header)
+    kind = f'encode/{restart_points}/{stage}/{entropy_coder}'
+    for payload in _map_cached(
+        encode, _count_sizes(blocks, block_sizes), workers, stats, cache, kind
+    ):
+        frame = frame_block(payload)
+        entries.append((data_offset, frame_offset))
+        data_offset += block_sizes.popleft()
+        frame_offset += len(frame)
+        yield frame
+    yield END_MARKER
+    if index:
+        yield write_index(entries, data_offset)
+
+
+def _count_sizes(blocks, block_sizes):
+    for block in blocks:
+        block_sizes.append(len(block))
+        yield block
+
+
+def find_blocks(compressed_data):
+    """
+    Return the offsets of the blocks in the data and their payloads.
+    """
+    index = read_index(compressed_data)
+    if index is None:
+        block_size, payloads = split_frames(compressed_data)
+        return [i * block_size for i in range(len(payloads))], payloads
+    parse_header(memoryview(compressed_data)[:HEADER_SIZE])
+    entries, _ = index
+    return (
+        [data_offset for data_offset, _ in entries],
+        [frame_at(compressed_data, frame_offset) for _, frame_offset in entries]
+    )
+
+
+def _decompress_blocks(src, workers, stats=None, cache=None):
+    read_header(src)
+    yield from _map_cached(decode_block, read_frames(src), workers, stats, cache)
+
+
+def _decompress_legacy(compressed_data, stats):
+    yield from _map_blocks(decode_legacy_block, [compressed_data], 1, stats)
+
+
+def _map_blocks(func, blocks, workers, stats):
+    """
+    `parallel.map_blocks` that merges the stats of every block into `stats`
+    and adds the time spent on the blocks, but not by the consumer
+    of the results, unless `stats` is None.
+    """
+    if stats is None:
+        yield from map_blocks(func, blocks, workers)
+        return
+    func = functools.partial(call_with_stats, func)
+    start = time.perf_counter()
+    for result in map_blocks(func, blocks, workers):
+        # The blocks that needed no processing have no stats
+        if result is not None:
+            result, block_stats = result
+            stats.merge(block_stats)
+        stats.seconds += time.perf_counter() - start
+        yield result
+        start = time.perf_counter()
+
+
+def _map_cached(func, blocks, workers, stats, cache, kind='decode'):
+    """
+    `_map_blocks` that takes the results of the blocks found in `cache`
+    from it instead of processing them and puts the others there, unless
+    `cache` is None. `kind` names the processing in the keys, which also
+    include the block format version, so the entries of the blocks coded
+    in another format are never reused.
+    """
+    if cache is None:
+        yield from _map_blocks(func, blocks, workers, stats)
+        return
+    lookups = collections.deque()
+    for result in _map_blocks(
+        func, _look_up(blocks, cache, kind, lookups, stats), workers, stats
+    ):
+        key, block_size, cached_result = lookups.popleft()
+        if cached_result is None:
+            cache.put(key, result, stats)
+        else:
+            result = cached_result
+            if stats is not None:
+                stats.add_block(block_size, len(result))
+        yield result
+
+
+def _look_up(blocks, cache, kind, lookups, stats):
+    """
+    Yield the blocks that aren't in `cache` and None instead of the others,
+    adding the key, the size and the cached result of every block
+    to `lookups`.
+    """
+    kind = f'{kind}/{BLOCK_FORMAT_VERSION}'
+    for block in blocks:
+        key = make_key(kind, block)
+        cached_result = cache.get(key, stats)
+        lookups.append((key, len(block), cached_result))
+        yield block if cached_result is None else None
+
+
+@contextlib.contextmanager
+def map_file(f):
+    """
+    Map the whole file copy-on-write, which never changes the file but
+    makes the mapping writable, so the suffix sorter reads it in place
+    instead of copying it. An empty file, which can't be mapped,
+    is an empty bytes object.
+    """
+    if os.fstat(f.fileno()).st_size == 0:
+        yield b''
+        return
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if hasattr(data, 'madvise'):
+        data.madvise(mmap.MADV_SEQUENTIAL)
+    try:
+        yield data
+    finally:
+        try:
+            data.close()
+        except BufferError:
+            # The views of the mapping are still referenced by a traceback,
+            # so it's closed when they're freed
+            pass
+
+
+def _preallocate(fd, size):
+    if hasattr(os, 'posix_fallocate') and size > 0:
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            # Not every file system supports it
+            pass
+    os.ftruncate(fd, size)
+
+
+def _write_at(fd, data, offset):
+    data = memoryview(data)
+    while data:
+        if hasattr(os, 'pwrite'):
+            written = os.pwrite(fd, data, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, data)
+        data = data[written:]
+        offset += written
+
+
+def _split_data(data, block_size):
+    data = memoryview(data).cast('B')
+    for i in range(0, len(data), block_size):
+        yield data[i:i + block_size]
 
 
-def compress(text):
-    assert text.isascii()
+def _read_blocks(src, block_size):
+    while True:
+        block = read_fully(src, block_size)
+        if not block:
+            return
+        yield block
 
-    bwt = apply_bwt(text)
-    dc = dc_encode(bwt)
-    bytes_ = encode_integers_as_bytes(dc)
-    huffman_code = huffman_encode(bytes_)
-    return huffman_code
 
+class _ChainedReader:
+    """
+    A minimal reader that returns the already consumed `head` bytes
+    before reading from the underlying stream.
+    """
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
 
-def decompress(compressed_text):
-    dc_as_bytes = huffman_decode(compressed_text)
-    bytes_ndarray = np.frombuffer(dc_as_bytes, dtype=np.uint8)
-    dc = decode_integers_from_bytes(bytes_ndarray)
-    bwt = dc_decode(dc)
-    text = restore_text_from_bwt(bwt)
-    return text
\ No newline at end of file
+    def read(self, size=-1):
+        if not self.head:
+            return self.stream.read(size)
+        if size < 0:
+            data, self.head = self.head + self.stream.read(), b''
+            return data
+        data, self.head = self.head[:size], self.head[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
@@ -0,0 +1,234 @@
+"""
+The framed container format.
+
+A stream starts with a header (magic, format version and block size)
+followed by frames. Every frame is a 4-byte big-endian length and a payload
+holding one compressed block. A zero length marks the end of the stream.
+
+The end marker may be followed by an index, which maps the offset of every
+block in the data to the offset of its frame, so that a range of the data
+is decompressed without reading the other blocks. It ends with a trailer
+of the data size, the number of blocks and the index magic, so it's found
+from the end of the stream, and the readers of the frames never get to it.
+
+Data that doesn't start with the magic is the legacy format: the whole input
+compressed as a single block without any framing.
+"""
+import io
+import struct
+
+
+MAGIC = b'BWTC'
+FORMAT_VERSION = 1
+
+MIN_BLOCK_SIZE = 1
+MAX_BLOCK_SIZE = 64 * 1024 * 1024
+DEFAULT_BLOCK_SIZE = 900 * 1024
+
+_HEADER = struct.Struct('>4sBI')
+_FRAME_LENGTH = struct.Struct('>I')
+INDEX_MAGIC = b'BWTX'
+_INDEX_ENTRY = struct.Struct('>QQ')
+_INDEX_TRAILER = struct.Struct('>QI4s')
+
+HEADER_SIZE = _HEADER.size
+FRAME_LENGTH_SIZE = _FRAME_LENGTH.size
+END_MARKER = _FRAME_LENGTH.pack(0)
+
+
+def write_header(block_size):
+    check_block_size(block_size)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, block_size)
+
+
+def read_header(stream):
+    """
+    Read the stream header and return the block size.
+    """
+    return parse_header(_read_exactly(stream, HEADER_SIZE))
+
+
+def split_frames(data):
+    """
+    Return the block size and the payloads of all the frames of the whole
+    stream in a bytes-like `data` as views of it, which aren't copied.
+    """
+    data = memoryview(data).cast('B')
+    if len(data) < HEADER_SIZE:
+        raise ValueError('Unexpected end of the compressed stream')
+    block_size = parse_header(data[:HEADER_SIZE])
+    payloads = []
+    offset = HEADER_SIZE
+    while True:
+        if offset + _FRAME_LENGTH.size > len(data):
+            raise ValueError('Unexpected end of the compressed stream')
+        length, = _FRAME_LENGTH.unpack_from(data, offset)
+        offset += _FRAME_LENGTH.size
+        if length == 0:
+            return block_size, payloads
+        if offset + length > len(data):
+            raise ValueError('Unexpected end of the compressed stream')
+        payloads.append(data[offset:offset + length])
+        offset += length
+
+
+def parse_header(header):
+    """
+    Return the block size of the `HEADER_SIZE` bytes of the stream header.
+    """
+    magic, version, block_size = _HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('Not a framed BWT stream')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported format version: {version}')
+    check_block_size(block_size)
+    return block_size
+
+
+def check_block_size(block_size):
+    if not MIN_BLOCK_SIZE <= block_size <= MAX_BLOCK_SIZE:
+        raise ValueError(
+            f'Block size must be between {MIN_BLOCK_SIZE} '
+            f'and {MAX_BLOCK_SIZE}, got {block_size}'
+        )
+
+
+def is_legacy(data):
+    return bytes(data[:len(MAGIC)]) != MAGIC
+
+
+def frame_block(payload):
+    assert len(payload) > 0
+    return _FRAME_LENGTH.pack(len(payload)) + payload
+
+
+def read_frames(stream):
+    """
+    Yield the payloads of the frames one by one until the end marker.
+    """
+    while True:
+        payload = read_frame(stream)
+        if payload is None:
+            return
+        yield payload
+
+
+def read_frame(stream):
+    """
+    Read the next frame and return its payload or None for the end marker.
+    """
+    length = parse_frame_length(_read_exactly(stream, FRAME_LENGTH_SIZE))
+    if length == 0:
+        return None
+    return _read_exactly(stream, length)
+
+
+def parse_frame_length(data):
+    """
+    Return the payload length of the `FRAME_LENGTH_SIZE` bytes
+    of a frame start, which is 0 for the end marker.
+    """
+    return _FRAME_LENGTH.unpack(data)[0]
+
+
+def frame_at(data, offset):
+    """
+    Return the payload of the frame at `offset` of the bytes-like `data`
+    as a view of it.
+    """
+    data = memoryview(data).cast('B')
+    if offset + FRAME_LENGTH_SIZE > len(data):
+        raise ValueError('Unexpected end of the compressed stream')
+    length = parse_frame_length(data[offset:offset + FRAME_LENGTH_SIZE])
+    offset += FRAME_LENGTH_SIZE
+    if length == 0 or offset + length > len(data):
+        raise ValueError('Invalid frame offset in the index')
+    return data[offset:offset + length]
+
+
+def write_index(entries, data_size):
+    """
+    Return the index of the (data offset, frame offset) `entries`
+    of the blocks of `data_size` bytes, which follows the end marker.
+    """
+    return b''.join(
+        [_INDEX_ENTRY.pack(*entry) for entry in entries] +
+        [_INDEX_TRAILER.pack(data_size, len(entries), INDEX_MAGIC)]
+    )
+
+
+def read_index(data):
+    """
+    Return the (data offset, frame offset) entries of the index at the end
+    of the bytes-like `data` and the data size, or None if there's no index.
+    """
+    data = memoryview(data).cast('B')
+    return _parse_index(lambda size: data[-size:], len(data))
+
+
+def read_stream_index(stream, start=0):
+    """
+    `read_index` of the seekable binary `stream` whose compressed stream
+    starts at the `start` offset and lasts until its end.
+    The position of the stream is left unspecified.
+    """
+    end = stream.seek(0, io.SEEK_END)
+
+    def read_tail(size):
+        stream.seek(end - size)
+        return _read_exactly(stream, size)
+
+    return _parse_index(read_tail, end - start)
+
+
+def _parse_index(read_tail, stream_size):
+    """
+    Parse the index read by `read_tail(size)`, which returns the last `size`
+    bytes of the compressed stream of `stream_size` bytes.
+    """
+    if stream_size < HEADER_SIZE + _INDEX_TRAILER.size:
+        return None
+    data_size, blocks_num, magic = _INDEX_TRAILER.unpack(read_tail(_INDEX_TRAILER.size))
+    if magic != INDEX_MAGIC:
+        return None
+    index_size = blocks_num * _INDEX_ENTRY.size + _INDEX_TRAILER.size
+    if index_size > stream_size - HEADER_SIZE:
+        raise ValueError('Invalid index of the compressed stream')
+    entries = list(
+        _INDEX_ENTRY.iter_unpack(read_tail(index_size)[:-_INDEX_TRAILER.size])
+    )
+    # The blocks aren't empty, and their frames precede the index
+    if any(
+        not previous_offset < data_offset < data_size or
+        not HEADER_SIZE <= frame_offset < stream_size - index_size
+        for (data_offset, frame_offset), previous_offset in zip(
+            entries, [-1] + [data_offset for data_offset, _ in entries]
+        )
+    ):
+        raise ValueError('Invalid index of the compressed stream')
+    return entries, data_size
+
+
+def read_fully(stream, size):
+    """
+    Read `size` bytes from the binary `stream`, fewer only at its end.
+    A raw file or a pipe may return fewer bytes from a single read.
+    """
+    data = stream.read(size)
+    if not data or len(data) == size:
+        return data
+    chunks = [data]
+    while size > len(data):
+        size -= len(data)
+        data = stream.read(size)
+        if not data:
+            break
+        chunks.append(data)
+    return b''.join(chunks)
+
+
+def _read_exactly(stream, size):
+    data = read_fully(stream, size)
+    if len(data) != size:
+        raise ValueError('Unexpected end of the compressed stream')
+    return data
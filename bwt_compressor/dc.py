@@ -1,31 +1,136 @@
-from bwt_compressor.common import (
-    ALPHABET_SIZE,
-    TERMINATOR_SYMBOL
-)
-from bwt_compressor.segment_tree import SegmentTree
+import numpy as np
+
+from bwt_compressor.common import ALPHABET_SIZE
+from bwt_compressor.segment_tree import FenwickTree, SegmentTree
 
 
 def dc_encode(text):
-    alphabet_and_text = _get_alphabet() + text
+    """
+    Return the distance coding of any bytes-like `text` as an integer NumPy
+    array: the text length followed by the reduced distances.
+    """
+    alphabet_and_text = np.concatenate([
+        np.frombuffer(_get_alphabet(), dtype=np.uint8),
+        np.frombuffer(text, dtype=np.uint8)
+    ])
+    text_length = len(alphabet_and_text) - ALPHABET_SIZE
+    index_dtype = np.int32 if len(alphabet_and_text) < 2**31 else np.int64
+    next_indices = _compute_next_indices(alphabet_and_text, index_dtype)
+    del alphabet_and_text
+
+    # The reduced distance of a char is one more than the number of
+    # the empty indices before its next occurrence, which are the indices
+    # of the chars that occur after it for the first time since it
+    dc = count_smaller_after(next_indices)
+    has_next = next_indices < text_length
+    dc += 1
+    dc *= has_next
+    # Distances of 1 are implied by the decoder and aren't stored
+    is_redundant_one = next_indices == np.arange(
+        1 - ALPHABET_SIZE, text_length + 1, dtype=index_dtype
+    )
+    is_redundant_one &= has_next
+    del next_indices, has_next
+    return np.concatenate([
+        np.array([text_length], dtype=index_dtype), dc[~is_redundant_one]
+    ])
+
+
+def _get_alphabet():
+    return bytes(range(ALPHABET_SIZE))
+
+
+def _compute_next_indices(text, index_dtype):
+    """
+    Compute the index of the next occurrence of the same char for every
+    index of `text`, which starts with the alphabet. The indices are
+    shifted down by the alphabet size, and the last occurrences of the chars
+    get the values from the text length up, so the result is a permutation.
+    """
+    # Stable sorting of bytes is a linear radix sort
+    order = np.argsort(text, kind='stable').astype(index_dtype)
+    is_last_occurrence = np.ones(len(text), dtype=bool)
+    is_last_occurrence[:-1] = text[order[1:]] != text[order[:-1]]
+
+    next_indices = np.empty(len(text), dtype=index_dtype)
+    next_indices[order[:-1]] = order[1:]
+    next_indices -= ALPHABET_SIZE
+    last_occurrences = order[is_last_occurrence]
+    del order, is_last_occurrence
+    last_occurrences.sort()
+    next_indices[last_occurrences] = np.arange(
+        len(text) - ALPHABET_SIZE, len(text), dtype=index_dtype
+    )
+    return next_indices
+
+
+def count_smaller_after(permutation):
+    """
+    For every index i of a permutation of 0..n-1 count the indices j > i
+    such that permutation[j] < permutation[i].
+
+    The values are partitioned by their bits from the highest one, like in
+    a wavelet tree. Within every group of the values with the same higher
+    bits the values are kept in the order of their indices, so every value
+    with the current bit set is greater than the values with it cleared
+    that follow it in the group.
+    """
+    n = len(permutation)
+    dtype = permutation.dtype
+    counts = np.zeros(n, dtype=dtype)
+    values = permutation.copy()
+    positions = np.arange(n, dtype=dtype)
+    indices = np.arange(n, dtype=dtype)
+    ones_before = np.zeros(n + 1, dtype=dtype)
+    new_values = np.empty_like(values)
+    new_positions = np.empty_like(positions)
+    for bit in reversed(range(max(n - 1, 0).bit_length())):
+        is_one = (values >> bit) & 1
+        # The values of a group are the indices it occupies
+        group_starts = (values >> (bit + 1)) << (bit + 1)
+        np.cumsum(is_one, out=ones_before[1:])
+        ones_before_in_group = ones_before[:-1] - ones_before[group_starts]
+        zeros_after = np.minimum(n, group_starts + (1 << bit))
+        zeros_after -= indices
+        zeros_after += ones_before_in_group
+        zeros_after *= is_one
+        del group_starts
+        counts[positions] += zeros_after
+
+        # Stable partition: the zeros move back past the preceding ones,
+        # the ones move forward past the following zeros
+        new_indices = indices - ones_before_in_group
+        new_indices += (zeros_after + ones_before_in_group) * is_one
+        del ones_before_in_group, zeros_after, is_one
+        new_values[new_indices] = values
+        new_positions[new_indices] = positions
+        del new_indices
+        values, new_values = new_values, values
+        positions, new_positions = new_positions, positions
+    return counts
+
+
+def _dc_encode_python(text):
+    """
+    Reference implementation that reduces the distances one by one
+    with a segment tree.
+    """
+    alphabet_and_text = _get_alphabet() + memoryview(text).cast('B')
     char_distances = _compute_char_distances(alphabet_and_text)
     char_distances_reduced = _reduce_char_distances(alphabet_and_text, char_distances)
     dc = _remove_redundant_ones(char_distances, char_distances_reduced)
     return [len(text)] + dc
 
 
-def _get_alphabet():
-    return ''.join(chr(i) for i in range(ALPHABET_SIZE))
-
-
 def _compute_char_distances(text):
     char_distances = [0] * len(text)
     last_seen_indices = list(range(ALPHABET_SIZE))
     for i in range(ALPHABET_SIZE, len(text)):
         char = text[i]
-        last_seen_index = last_seen_indices[ord(char)]
+        last_seen_index = last_seen_indices[char]
         distance = i - last_seen_index
         char_distances[last_seen_index] = distance
-        last_seen_indices[ord(char)] = i
+        last_seen_indices[char] = i
     return char_distances
 
 
@@ -48,44 +153,74 @@ def _remove_redundant_ones(char_distances, char_distances_reduced):
 
 
 def dc_decode(dc):
+    # Python ints are faster than NumPy scalars in the loop
+    dc = np.asarray(dc).tolist()
     text_length = dc[0]
-    text = list(_get_alphabet()) + [None] * text_length
-    known_chars_st = SegmentTree([1] * ALPHABET_SIZE + [0] * text_length)
+    text = bytearray(_get_alphabet()) + bytearray(text_length)
+    known_chars = bytearray(b'\x01') * ALPHABET_SIZE + bytearray(text_length)
+    # Only the chars after the current index are counted by the tree.
+    # The runs of consecutive chars are always behind it, so they don't
+    # change the order of the empty indices after it and aren't counted.
+    known_chars_ft = FenwickTree(known_chars)
+    # The tree is queried only for distant empty indices, so updates
+    # are applied lazily, and if there are many of them, it's cheaper
+    # to rebuild the tree at once
+    pending_updates = []
+    max_pending_updates = len(text) >> 7
 
     i = 0
+    last_index = len(text) - 1
     for d in dc[1:]:
         # Restore consecutive chars
-        while i < len(text) - 1 and text[i+1] is None:
-            text[i+1] = text[i]
-            i += 1
+        if i < last_index and not known_chars[i + 1]:
+            next_known_index = known_chars.find(1, i + 1)
+            if next_known_index == -1:
+                next_known_index = len(text)
+            text[i+1:next_known_index] = text[i:i+1] * (next_known_index - i - 1)
+            i = next_known_index - 1
 
         if d == 0:
             i += 1
             continue
-        
-        # Find the dth empty index.
-        # Go to the i + d index first, then
-        # calculate how many indices in between aren't empty and
-        # find the known_chars_num'th empty index.
-        # This is an optimization.
-        known_chars_num = known_chars_st.get_sum(i + 1, i + d) + 1
-        dth_empty_index = _find_kth_empty_index(text, i + d, known_chars_num)
+
+        dth_empty_index = _scan_kth_empty_index(known_chars, i + 1, d)
+        if dth_empty_index == -1:
+            if len(pending_updates) > max_pending_updates:
+                known_chars_ft.rebuild(known_chars)
+            else:
+                for idx in pending_updates:
+                    known_chars_ft.update(idx, 1)
+            pending_updates.clear()
+            dth_empty_index = known_chars_ft.find_kth_zero(i + 1, d)
 
         text[dth_empty_index] = text[i]
-        known_chars_st.update(dth_empty_index, 1)
+        known_chars[dth_empty_index] = 1
+        pending_updates.append(dth_empty_index)
 
         i += 1
 
-    return ''.join(text[ALPHABET_SIZE:])
+    return bytes(text[ALPHABET_SIZE:])
 
 
-def _find_kth_empty_index(text, start_post, k):
-    i = 0
-    while True:
-        if text[start_post + i] is None:
-            k -= 1
-        if k == 0:
-            break
-        i += 1
-    return start_post + i
+# Empty indices at most this far are found by counting the known chars
+# directly, which is faster than querying the tree
+_MAX_SCANNED_DISTANCE = 4096
 
+
+def _scan_kth_empty_index(known_chars, start, k):
+    """
+    Find the k-th empty index at or after `start` by counting
+    the known chars in windows of k chars. Return -1 if it's too far.
+    """
+    i = start
+    while True:
+        i = known_chars.find(0, i)
+        if k == 1:
+            return i
+        if i - start > _MAX_SCANNED_DISTANCE:
+            return -1
+        empty_num = k - known_chars.count(1, i, i + k)
+        if empty_num == k:
+            return i + k - 1
+        i += k
+        k -= empty_num
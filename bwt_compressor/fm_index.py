@@ -0,0 +1,187 @@
+"""
+The FM-index of a block, which answers substring queries on the BWT
+without restoring the text.
+
+The rows of the BWT matrix are those of `bwt.apply_bwt`: row 0 is
+the terminator suffix, and the terminator is at the primary index of
+the last column, which the stored BWT leaves out. The number of
+occurrences of every byte in the BWT before every multiple of the sample
+rate is kept in a table, so a rank costs a table lookup and a count in
+at most the sample rate of bytes.
+
+The restart rows of the block are the rows of evenly spaced suffixes
+of the text, so they're the samples of the suffix array that `locate`
+walks to.
+"""
+import numpy as np
+
+from bwt_compressor.bwt import (
+    _compute_next_rows,
+    _get_chars_counters,
+    _get_chars_start_positions,
+    get_index_dtype,
+    get_segment_length
+)
+from bwt_compressor.common import ALPHABET_SIZE
+
+
+# The distance between the samples of the rank table, with which
+# the table takes a byte per byte of the block with 4-byte counts
+RANK_SAMPLE_RATE = 1024
+
+# The number of bytes of the BWT counted at once when the table is built
+_CHUNK_SIZE = 1 << 20
+
+
+class FMIndex:
+    def __init__(self, bwt, restart_rows, sample_rate=RANK_SAMPLE_RATE):
+        self.bwt = np.frombuffer(bwt, dtype=np.uint8)
+        self.length = len(self.bwt)
+        self.restart_rows = restart_rows
+        self.primary_index = restart_rows[0] if restart_rows else 0
+        self.sample_rate = sample_rate
+        # The first row of the suffixes that start with every byte
+        counters = _get_chars_counters(self.bwt)
+        self.first_rows = 1 + _get_chars_start_positions(counters)
+        self.ranks = _build_rank_table(self.bwt, sample_rate)
+        self._next_rows = None
+
+    def rank(self, char, row):
+        """
+        Return the number of the occurrences of `char` in the last column
+        of the BWT matrix before `row`.
+        """
+        # The terminator isn't in the stored BWT
+        position = row - (row > self.primary_index)
+        sample = position // self.sample_rate
+        return int(self.ranks[sample, char]) + int(np.count_nonzero(
+            self.bwt[sample * self.sample_rate:position] == char
+        ))
+
+    def find(self, pattern):
+        """
+        Return the range of the rows of the BWT matrix that start with
+        the bytes-like `pattern` by backward search.
+        """
+        start, end = 0, self.length + 1
+        for char in reversed(bytes(pattern)):
+            start = int(self.first_rows[char]) + self.rank(char, start)
+            end = int(self.first_rows[char]) + self.rank(char, end)
+            if start >= end:
+                return 0, 0
+        return start, end
+
+    def count(self, pattern):
+        start, end = self.find(pattern)
+        return end - start
+
+    def locate(self, pattern):
+        """
+        Return the sorted positions of the occurrences of `pattern`
+        in the text as a NumPy array.
+        """
+        start, end = self.find(pattern)
+        return np.sort(self._locate_rows(np.arange(start, end)))
+
+    def extract_prefix(self, length):
+        """
+        Return the first `length` bytes of the text, following the rows
+        from that of the whole text to the rows of the next suffixes.
+        """
+        text = bytearray()
+        row = self.primary_index
+        for _ in range(min(length, self.length)):
+            char = int(np.searchsorted(self.first_rows, row, side='right')) - 1
+            text.append(char)
+            row = self._select(char, row - int(self.first_rows[char]))
+        return bytes(text)
+
+    def extract_suffix(self, length):
+        """
+        Return the last `length` bytes of the text, following the rows
+        from that of the terminator to the rows of the previous suffixes.
+        """
+        text = bytearray()
+        row = 0
+        for _ in range(min(length, self.length)):
+            char = int(self.bwt[row - (row > self.primary_index)])
+            text.append(char)
+            row = int(self.first_rows[char]) + self.rank(char, row)
+        return bytes(reversed(text))
+
+    def _select(self, char, rank):
+        """
+        Return the row of the last column of the BWT matrix with
+        the occurrence of `char` preceded by `rank` others.
+        """
+        sample = int(np.searchsorted(self.ranks[:, char], rank, side='right')) - 1
+        start = sample * self.sample_rate
+        positions = np.flatnonzero(self.bwt[start:start + self.sample_rate] == char)
+        position = start + int(positions[rank - self.ranks[sample, char]])
+        return position + (position >= self.primary_index)
+
+    def _locate_rows(self, rows):
+        """
+        Find the positions of the suffixes of `rows` by following the rows
+        of the next suffixes to a restart row or the terminator row.
+        All the walks are done simultaneously. The table of the next rows
+        takes 4 bytes per byte of the block, so it's built only when there
+        are rows to locate.
+        """
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self._next_rows is None:
+            self._next_rows = _compute_next_rows(self.bwt, self.primary_index)
+        segment_length = get_segment_length(self.length, len(self.restart_rows))
+        sample_rows = np.array([0] + self.restart_rows, dtype=np.intp)
+        sample_positions = np.array(
+            [self.length] +
+            [i * segment_length for i in range(len(self.restart_rows))],
+            dtype=np.int64
+        )
+        order = np.argsort(sample_rows)
+        sample_rows = sample_rows[order]
+        sample_positions = sample_positions[order]
+        is_sample = np.zeros(self.length + 1, dtype=bool)
+        is_sample[sample_rows] = True
+
+        positions = np.empty(len(rows), dtype=np.int64)
+        walks = np.arange(len(rows))
+        rows = rows.astype(np.intp)
+        steps = 0
+        while len(rows):
+            found = is_sample[rows]
+            positions[walks[found]] = sample_positions[
+                np.searchsorted(sample_rows, rows[found])
+            ] - steps
+            walks = walks[~found]
+            rows = self._next_rows[rows[~found]].astype(np.intp)
+            steps += 1
+        return positions
+
+
+def _build_rank_table(bwt, sample_rate):
+    """
+    Return the table of the numbers of the occurrences of every byte
+    before every multiple of `sample_rate` in the BWT including its end.
+    """
+    samples_num = len(bwt) // sample_rate + 1
+    ranks = np.zeros((samples_num, ALPHABET_SIZE), dtype=get_index_dtype(len(bwt)))
+    # The chunks are of a multiple of the sample rate
+    chunk_size = max(_CHUNK_SIZE // sample_rate, 1) * sample_rate
+    totals = np.zeros(ALPHABET_SIZE, dtype=np.int64)
+    for start in range(0, len(bwt), chunk_size):
+        chunk = bwt[start:start + chunk_size]
+        keys = np.arange(len(chunk)) // sample_rate * ALPHABET_SIZE + chunk
+        counts = np.bincount(
+            keys, minlength=-(-len(chunk) // sample_rate) * ALPHABET_SIZE
+        ).reshape(-1, ALPHABET_SIZE)
+        del keys
+        np.cumsum(counts, axis=0, out=counts)
+        counts += totals
+        totals = counts[-1].copy()
+        # The partial sample at the end has no row
+        first_sample = start // sample_rate + 1
+        counts = counts[:samples_num - first_sample]
+        ranks[first_sample:first_sample + len(counts)] = counts
+    return ranks
@@ -2,6 +2,8 @@ from typing import Optional
 
 import numpy as np
 
+from bwt_compressor.bitio import BitReader, BitWriter
+
 
 NEW = -1
 
@@ -33,26 +35,35 @@ class HuffmanTree:
         self.head = {0: 0}
     
     def add_value(self, value: int) -> list[int]:
+        code, length = self.encode_value(value)
+        return [code >> i & 1 for i in range(length - 1, -1, -1)]
+
+    def encode_value(self, value: int) -> tuple[int, int]:
+        """
+        Return the code of the value and its length in bits
+        and update the tree.
+        """
         node = self.nodes.get(value, self.nodes[NEW])
-        code = self._get_code(node)
+        code, length = self._get_code(node)
 
         if node.value == NEW:
             node = self.add_new_node(value)
-            code.extend(_int_to_bits(value))
+            code = code << 8 | value
+            length += 8
 
         self.increase_weight(node)
 
-        return code
+        return code, length
 
-    def _get_code(self, node: Node) -> list[int]:
-        code = []
+    def _get_code(self, node: Node) -> tuple[int, int]:
+        code = 0
+        length = 0
         while node.parent is not None:
-            if node.parent.left.idx == node.idx:
-                code.append(0)
-            else:
-                code.append(1)
+            if node.parent.left.idx != node.idx:
+                code |= 1 << length
+            length += 1
             node = node.parent
-        return list(reversed(code))
+        return code, length
 
     def add_new_node(self, value: int) -> Node:
         node = self.nodes[NEW]
@@ -115,44 +126,46 @@ class HuffmanTree:
         
         return node, i
 
-
-def _int_to_bits(n: int) -> list[int]:
-    return [n >> i & 1 for i in range(7,-1,-1)]
+    def read_node(self, reader: BitReader) -> Node:
+        node = self.tree[0]
+        while node.left is not None:
+            if reader.read(1) == 0:
+                node = node.left
+            else:
+                node = node.right
+        return node
 
 
 def huffman_encode(data: bytes) -> bytes:
+    data = memoryview(data).cast('B')
     ht = HuffmanTree()
-    codes = [ht.add_value(byte) for byte in data]
-
-    # We guarantee that the codes are sequences of 0s and 1s
-    code = np.concatenate(codes, dtype=np.uint8, casting='unsafe')
-
-    # Prepend code with 0-bits so that its length is a multiple of 8 (byte)
-    alignment_length = (8 - (len(code) % 8)) % 8
-    aligned_code = np.concatenate(
-        [[0] * alignment_length, code],
-        dtype=np.uint8, casting='unsafe'
-    )
+    writer = BitWriter(len(data))
+    for byte in data:
+        writer.write(*ht.encode_value(byte))
+
+    # Prepend code with 0-bits so that its length is a multiple of 8 (byte),
+    # which shifts the code padded at the end to the right
+    alignment_length = (8 - writer.bits_written % 8) % 8
+    code = np.frombuffer(writer.getvalue(), dtype=np.uint8)
+    aligned_code = code >> alignment_length
+    aligned_code[1:] |= code[:-1] << (8 - alignment_length)
     
-    # Pack bits to bytes and prepend alignment_length as the first byte
-    packed_code = np.packbits(aligned_code)
-    return alignment_length.to_bytes(length=1, byteorder='big') + packed_code.tobytes()
+    # Prepend alignment_length as the first byte
+    return alignment_length.to_bytes(length=1, byteorder='big') + aligned_code.tobytes()
 
 
 def huffman_decode(huffman_code: bytes) -> bytes:
-    arr = np.frombuffer(huffman_code[1:], dtype=np.uint8)
-    huffman_code_bits = np.unpackbits(arr)
+    reader = BitReader(memoryview(huffman_code)[1:])
+    code_length = 8 * (len(huffman_code) - 1)
 
     ht = HuffmanTree()
-    data = []
-    consumed = huffman_code[0]
-    while consumed < len(huffman_code_bits):
-        node, i = ht.move_to_node(huffman_code_bits[consumed:])
-        consumed += i
+    data = bytearray()
+    reader.read(huffman_code[0])
+    while reader.bits_read < code_length:
+        node = ht.read_node(reader)
         if node.value == NEW:
-            value = int(np.packbits(huffman_code_bits[consumed:consumed+8])[0])
+            value = reader.read(8)
             node = ht.add_new_node(value)
-            consumed += 8
         else:
             value = node.value
         
@@ -1,3 +1,19 @@
+import numpy as np
+
+from bwt_compressor.bitio import BitReader, BitWriter
+
+
+# The integers below it take one byte, and the integers up to
+# _MAX_TWO_BYTES_INTEGER are 0xFF followed by two bytes
+_ESCAPE = 255
+_MAX_TWO_BYTES_INTEGER = 255 + 256 ** 2 - 2
+
+# The integers below it are buckets of their own, and every larger
+# bit length is split into two buckets by the bit after the leading one
+_DIRECT_BUCKETS_NUM = 16
+_DIRECT_BITS = 4
+
+
 def encode_integers_as_bytes(integers):
     return b''.join(_encode_integer_as_bytes(i) for i in integers)
 
@@ -49,4 +65,117 @@ def _decode_next_integer_from_bytes(bytes_):
     )
     bytes_consumed = i - seen_ffs + bytes_num_expect
     
-    return integer + shift, bytes_consumed
\ No newline at end of file
+    return integer + shift, bytes_consumed
+
+
+def encode_integers_array(integers):
+    """
+    Vectorized `encode_integers_as_bytes` for a NumPy array of integers
+    (or any sequence of them), which handles the integers of up to three
+    bytes in bulk and only encodes the larger ones one by one.
+    """
+    integers = np.asarray(integers, dtype=np.int64)
+    is_short = integers < _ESCAPE
+    if is_short.all():
+        return integers.astype(np.uint8).tobytes()
+
+    is_medium = ~is_short & (integers <= _MAX_TWO_BYTES_INTEGER)
+    long_indices = np.flatnonzero(~is_short & ~is_medium)
+    long_encodings = [
+        _encode_integer_as_bytes(integer)
+        for integer in integers[long_indices].tolist()
+    ]
+    lengths = np.where(is_medium, 3, 1)
+    lengths[long_indices] = [len(encoding) for encoding in long_encodings]
+    starts = np.cumsum(lengths) - lengths
+
+    res = np.empty(int(starts[-1] + lengths[-1]), dtype=np.uint8)
+    res[starts[is_short]] = integers[is_short]
+    medium_starts = starts[is_medium]
+    medium_integers = integers[is_medium] - _ESCAPE
+    res[medium_starts] = _ESCAPE
+    res[medium_starts + 1] = medium_integers >> 8
+    res[medium_starts + 2] = medium_integers & 0xff
+    for start, encoding in zip(starts[long_indices].tolist(), long_encodings):
+        res[start:start + len(encoding)] = np.frombuffer(encoding, dtype=np.uint8)
+    return res.tobytes()
+
+
+def decode_integers_array(bytes_):
+    """
+    Vectorized `decode_integers_from_bytes` returning a NumPy array.
+    Every byte is taken for a one-byte integer first, and then only
+    the integers starting with 0xFF are decoded one by one.
+    """
+    bytes_ = np.frombuffer(bytes_, dtype=np.uint8)
+    integers = bytes_.astype(np.int64)
+    escapes = np.flatnonzero(bytes_ == _ESCAPE).tolist()
+    if not escapes:
+        return integers
+
+    is_start = np.ones(len(bytes_), dtype=bool)
+    next_start = 0
+    for i in escapes:
+        # The escape bytes after the first one and the following bytes
+        # of an integer aren't integers themselves
+        if i < next_start:
+            continue
+        if i + 2 < len(bytes_) and not (bytes_[i+1] == bytes_[i+2] == _ESCAPE):
+            integer = _ESCAPE + (int(bytes_[i+1]) << 8 | int(bytes_[i+2]))
+            bytes_consumed = 3
+        else:
+            integer, bytes_consumed = _decode_next_integer_from_bytes(bytes_[i:])
+        integers[i] = integer
+        is_start[i+1:i+bytes_consumed] = False
+        next_start = i + bytes_consumed
+    return integers[is_start]
+
+
+def encode_integers_as_buckets(integers):
+    """
+    Split the non-negative integers into their buckets, which are
+    exp-Golomb style classes of the integers by their magnitude, and
+    the extra bits that locate an integer in its bucket. Return the bytes
+    of the buckets, which are left to the entropy coder, and the packed
+    extra bits, which are stored as is.
+    """
+    integers = np.asarray(integers, dtype=np.int64)
+    is_direct = integers < _DIRECT_BUCKETS_NUM
+    bit_lengths = _bit_lengths(integers)
+    extra_lengths = np.where(is_direct, 0, bit_lengths - 2)
+    buckets = np.where(
+        is_direct,
+        integers,
+        _DIRECT_BUCKETS_NUM + 2 * (bit_lengths - _DIRECT_BITS - 1) +
+        ((integers >> np.maximum(extra_lengths, 0)) & 1)
+    )
+    del bit_lengths, is_direct
+    extra_bits = integers & ((1 << extra_lengths) - 1)
+
+    writer = BitWriter()
+    writer.write_codes(extra_bits, extra_lengths)
+    return buckets.astype(np.uint8).tobytes(), writer.getvalue()
+
+
+def decode_integers_from_buckets(buckets, extra_bits):
+    """
+    Restore the integers from the bytes of their buckets
+    and the packed extra bits as a NumPy array.
+    """
+    buckets = np.frombuffer(buckets, dtype=np.uint8).astype(np.int64)
+    is_direct = buckets < _DIRECT_BUCKETS_NUM
+    indirect_buckets = buckets - _DIRECT_BUCKETS_NUM
+    extra_lengths = np.where(is_direct, 0, (indirect_buckets >> 1) + _DIRECT_BITS - 1)
+    leading_bits = np.where(is_direct, buckets, 2 | (indirect_buckets & 1))
+    del indirect_buckets, is_direct
+    integers = BitReader(extra_bits).read_codes(extra_lengths).astype(np.int64)
+    integers |= leading_bits << extra_lengths
+    return integers
+
+
+def _bit_lengths(integers):
+    # The float exponent is the bit length unless the conversion
+    # rounds the integer up to the next power of two
+    bit_lengths = np.frexp(integers.astype(np.float64))[1].astype(np.int64)
+    bit_lengths -= (integers > 0) & ((integers >> np.maximum(bit_lengths - 1, 0)) == 0)
+    return bit_lengths
@@ -0,0 +1,102 @@
+"""
+The choice of the block size and the number of workers that keep
+the compression within a memory budget.
+
+The estimates are the peaks of the memory allocated while a block
+is coded, in bytes per byte of the block, measured with `tracemalloc`
+on random data, which is the worst case. The BWT itself takes about
+6 bytes (the suffix array, the BWT and its bytes, see `bwt`), the second
+stages and the entropy coder about 10 times more, since they work with
+several integer arrays of the size of the block while the code of
+the stage is held.
+"""
+import numpy as np
+
+from bwt_compressor.block import AUTO_STAGE, STAGES
+from bwt_compressor.container import MIN_BLOCK_SIZE
+
+
+_ENCODE_MEMORY = {
+    'dc': 71,
+    'mtf': 64,
+}
+_ENCODE_MEMORY[AUTO_STAGE] = max(_ENCODE_MEMORY[stage] for stage in STAGES)
+
+# The memory of a process with the interpreter and NumPy loaded
+PROCESS_MEMORY = 48 * 1024 * 1024
+
+# The smallest block chosen for a budget, since smaller blocks compress
+# much worse and are dominated by the per-block overhead
+MIN_BUDGET_BLOCK_SIZE = 16 * 1024
+
+# Data whose bytes have more entropy per byte than this gains little
+# from the BWT, so the blocks are kept small to save memory for it
+_INCOMPRESSIBLE_ENTROPY = 7.5
+_INCOMPRESSIBLE_BLOCK_SIZE = 128 * 1024
+_SAMPLE_SIZE = 64 * 1024
+
+
+def estimate_memory(block_size, workers, stage):
+    """
+    Estimate the peak memory of the compression by `workers` processes
+    with blocks of `block_size`. With more than one worker the main process
+    also holds two blocks per worker in shared memory.
+    """
+    block_memory = _ENCODE_MEMORY[stage] * block_size
+    if workers == 1:
+        return PROCESS_MEMORY + block_memory
+    return PROCESS_MEMORY + workers * (PROCESS_MEMORY + block_memory + 2 * block_size)
+
+
+def choose_parameters(max_memory, block_size, workers, stage, data=None):
+    """
+    Return the largest block size up to `block_size` and then the largest
+    number of workers up to `workers` whose estimated memory is within
+    `max_memory` bytes. If the `data` is given and a sample of it looks
+    incompressible, the blocks are kept small.
+    """
+    if data is not None and (
+        _estimate_entropy(_get_sample(data)) > _INCOMPRESSIBLE_ENTROPY
+    ):
+        block_size = min(block_size, _INCOMPRESSIBLE_BLOCK_SIZE)
+    min_block_size = max(min(block_size, MIN_BUDGET_BLOCK_SIZE), MIN_BLOCK_SIZE)
+    # More workers are only worth it if each still gets a reasonable block
+    while workers > 1 and estimate_memory(min_block_size, workers, stage) > max_memory:
+        workers -= 1
+    if estimate_memory(min_block_size, workers, stage) > max_memory:
+        raise ValueError(
+            f'Memory budget of {max_memory} bytes is too small, at least '
+            f'{estimate_memory(min_block_size, 1, stage)} bytes are needed'
+        )
+    while estimate_memory(block_size, workers, stage) > max_memory:
+        # The memory is linear in the block size, so the block size that
+        # fits is found by scaling, and the loop only fixes the rounding
+        block_size = max(
+            min_block_size,
+            min(
+                block_size - 1,
+                block_size * (max_memory - estimate_memory(0, workers, stage)) //
+                (estimate_memory(block_size, workers, stage) -
+                 estimate_memory(0, workers, stage))
+            )
+        )
+    return block_size, workers
+
+
+def _get_sample(data):
+    # The middle of the data is more typical than its header
+    data = memoryview(data).cast('B')
+    start = max(0, len(data) // 2 - _SAMPLE_SIZE // 2)
+    return data[start:start + _SAMPLE_SIZE]
+
+
+def _estimate_entropy(sample):
+    """
+    Return the order-0 entropy of the bytes in bits per byte.
+    """
+    sample = np.frombuffer(sample, dtype=np.uint8)
+    if len(sample) == 0:
+        return 0.0
+    counts = np.bincount(sample)
+    counts = counts[counts > 0]
+    return -float(np.sum(counts * np.log2(counts / len(sample)))) / len(sample)
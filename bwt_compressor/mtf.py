@@ -0,0 +1,158 @@
+"""
+Move-to-front transform followed by the zero run-length encoding (RLE0),
+as in bzip2. It's a faster alternative to distance coding that usually
+compresses a bit worse.
+
+The runs of zero ranks are written in bijective base 2 with the digits
+RUNA (1) and RUNB (2), least significant first, and the other ranks
+are shifted up by one to make room for them.
+"""
+import numpy as np
+
+from bwt_compressor.common import ALPHABET_SIZE
+from bwt_compressor.dc import count_smaller_after
+
+
+RUNA = 0
+RUNB = 1
+
+# The ranks of fewer chars are computed char by char, which is faster than
+# the fixed cost of ranking the alphabet along with them
+_SMALL_TEXT_SIZE = 2048
+
+
+def mtf_rle0_encode(text):
+    """
+    Return the MTF + RLE0 code of any bytes-like `text`
+    as an integer NumPy array.
+    """
+    text = np.frombuffer(text, dtype=np.uint8)
+    index_dtype = np.int32 if len(text) + ALPHABET_SIZE < 2**31 else np.int64
+    if len(text) == 0:
+        return np.zeros(0, dtype=index_dtype)
+    # Only the first char of a run of equal chars can have a nonzero rank
+    is_run_start = np.ones(len(text), dtype=bool)
+    is_run_start[1:] = text[1:] != text[:-1]
+    run_starts = np.flatnonzero(is_run_start).astype(index_dtype)
+    if len(run_starts) < _SMALL_TEXT_SIZE:
+        ranks = _compute_mtf_ranks_small(text[run_starts], index_dtype)
+    else:
+        ranks = _compute_mtf_ranks(text[run_starts], index_dtype)
+    zeros_nums = np.diff(run_starts, append=len(text)) - 1
+    return _encode_runs(ranks, zeros_nums)
+
+
+def mtf_rle0_decode(code):
+    code = np.asarray(code, dtype=np.int64)
+    is_rank = code > RUNB
+    # Every run of digits follows a rank or starts the code
+    run_ids = np.cumsum(is_rank)
+    run_ids_of_digits = run_ids[~is_rank]
+    run_starts = np.concatenate([[0], np.flatnonzero(is_rank) + 1])
+    digit_indices = np.flatnonzero(~is_rank) - run_starts[run_ids_of_digits]
+    zeros_nums = np.zeros(len(run_starts), dtype=np.int64)
+    np.add.at(
+        zeros_nums, run_ids_of_digits,
+        (code[~is_rank] + 1) << digit_indices
+    )
+
+    # The leading zeros are the first char of the initial MTF table
+    chars = np.concatenate([[0], _decode_mtf_ranks(code[is_rank] - 1)])
+    zeros_nums[1:] += 1
+    return np.repeat(chars.astype(np.uint8), zeros_nums).tobytes()
+
+
+def _compute_mtf_ranks(text, index_dtype):
+    """
+    Compute the MTF ranks of all the chars of `text` at once.
+
+    The rank of a char is the number of distinct chars since its previous
+    occurrence. Preceding the text by the alphabet in reverse order makes
+    every char occur before and puts the chars in the order of the initial
+    MTF table. Then the distinct chars between the previous occurrence p
+    and i are the chars at j in (p, i) whose own previous occurrence
+    precedes p, which is counted by ranking the previous occurrences.
+    """
+    alphabet_and_text = np.concatenate([
+        np.arange(ALPHABET_SIZE - 1, -1, -1, dtype=np.uint8), text
+    ])
+    order = np.argsort(alphabet_and_text, kind='stable').astype(index_dtype)
+    is_same_char = alphabet_and_text[order[1:]] == alphabet_and_text[order[:-1]]
+    del alphabet_and_text
+    prev_indices = np.empty(len(order), dtype=index_dtype)
+    prev_indices[order[1:]] = order[:-1]
+    prev_indices = prev_indices[ALPHABET_SIZE:]
+
+    # The previous occurrences are all the indices but the last occurrences,
+    # so they are ranked by subtracting the last occurrences before them
+    is_last_occurrence = np.ones(len(order), dtype=bool)
+    is_last_occurrence[order[:-1][is_same_char]] = False
+    del order, is_same_char
+    last_occurrences_before = np.zeros(len(is_last_occurrence), dtype=index_dtype)
+    np.cumsum(is_last_occurrence[:-1], out=last_occurrences_before[1:])
+    last_occurrences_before = last_occurrences_before[prev_indices]
+    del is_last_occurrence
+
+    prev_ranks = np.arange(len(text) + ALPHABET_SIZE, dtype=index_dtype)
+    prev_ranks[ALPHABET_SIZE:] = ALPHABET_SIZE + prev_indices
+    prev_ranks[ALPHABET_SIZE:] -= last_occurrences_before
+    del prev_indices
+
+    # Of the prev_ranks[i] smaller ranks, all but the ones after i are
+    # before i, and p + 1 of them are at or before p
+    ranks = count_smaller_after(prev_ranks)[ALPHABET_SIZE:]
+    ranks += last_occurrences_before
+    return ALPHABET_SIZE - 1 - ranks
+
+
+def _compute_mtf_ranks_small(text, index_dtype):
+    """
+    Compute the MTF ranks of a short `text` char by char.
+    """
+    table = bytearray(range(ALPHABET_SIZE))
+    ranks = []
+    for char in text.tolist():
+        rank = table.index(char)
+        del table[rank]
+        table.insert(0, char)
+        ranks.append(rank)
+    return np.array(ranks, dtype=index_dtype)
+
+
+def _decode_mtf_ranks(ranks):
+    table = bytearray(range(ALPHABET_SIZE))
+    chars = bytearray(len(ranks))
+    for i, rank in enumerate(ranks.tolist()):
+        char = table[rank]
+        del table[rank]
+        table.insert(0, char)
+        chars[i] = char
+    return np.frombuffer(chars, dtype=np.uint8)
+
+
+def _encode_runs(ranks, zeros_nums):
+    """
+    Write every nonzero rank shifted by one followed by the number
+    of zeros after it in bijective base 2.
+    """
+    # The zero rank of the first char belongs to the run of zeros after it
+    has_rank = ranks != 0
+    zeros_nums[0] += not has_rank[0]
+    # The digits of n are the bits of n + 1 without the leading one
+    zeros_nums += 1
+    digits_nums = np.zeros(len(zeros_nums), dtype=zeros_nums.dtype)
+    for bit in range(1, int(zeros_nums.max()).bit_length()):
+        digits_nums += (zeros_nums >> bit) > 0
+
+    lengths = digits_nums + has_rank
+    starts = np.cumsum(lengths) - lengths
+    code = np.empty(int(lengths.sum()), dtype=ranks.dtype)
+    code[starts[has_rank]] = ranks[has_rank] + 1
+
+    runs_of_digits = np.repeat(np.arange(len(ranks)), digits_nums)
+    digit_indices = np.arange(len(runs_of_digits))
+    digit_indices -= np.repeat(np.cumsum(digits_nums) - digits_nums, digits_nums)
+    code[starts[runs_of_digits] + has_rank[runs_of_digits] + digit_indices] = (
+        (zeros_nums[runs_of_digits] >> digit_indices) & 1
+    )
+    return code
@@ -0,0 +1,88 @@
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+
+def resolve_workers(workers):
+    """
+    Return the number of worker processes to use: 0 means one per CPU.
+    """
+    if workers < 0:
+        raise ValueError(f'Number of workers must be non-negative, got {workers}')
+    if workers == 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def map_blocks(func, blocks, workers=1):
+    """
+    Apply `func` to every bytes-like block and yield the results in order.
+
+    With more than one worker the blocks are processed by a process pool.
+    Every block is passed to a worker through shared memory instead of
+    being pickled, and at most two blocks per worker are in flight at a time,
+    so the memory usage stays bounded however many blocks there are.
+
+    A None block is one that needs no processing, like a block found in
+    a cache, and gives a None result in its place.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1:
+        for block in blocks:
+            yield None if block is None else func(block)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        try:
+            for block in blocks:
+                if len(pending) == 2 * workers:
+                    yield _collect(pending.popleft())
+                pending.append(_submit(executor, func, block))
+            while pending:
+                yield _collect(pending.popleft())
+        finally:
+            for pending_block in pending:
+                if pending_block is not None:
+                    future, shm = pending_block
+                    future.cancel()
+                    _release(shm)
+
+
+def _submit(executor, func, block):
+    if block is None:
+        return None
+    block = memoryview(block).cast('B')
+    shm = shared_memory.SharedMemory(create=True, size=max(len(block), 1))
+    try:
+        shm.buf[:len(block)] = block
+        future = executor.submit(_run_on_shared_block, func, shm.name, len(block))
+    except BaseException:
+        _release(shm)
+        raise
+    return future, shm
+
+
+def _collect(pending_block):
+    if pending_block is None:
+        return None
+    future, shm = pending_block
+    try:
+        return future.result()
+    finally:
+        _release(shm)
+
+
+def _release(shm):
+    shm.close()
+    shm.unlink()
+
+
+def _run_on_shared_block(func, name, size):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        block = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+    return func(block)
@@ -0,0 +1,146 @@
+"""
+Adaptive binary range coding of bytes, as in LZMA.
+
+Every byte is coded as 8 binary decisions from the most significant bit
+down a binary tree of 255 adaptive probabilities. The order-1 model keeps
+a separate tree for every previous byte, which codes skewed data
+like the MTF ranks better at the cost of slower adaptation.
+
+The range and the low end of the interval fit in 32 bits, and the bytes
+are shifted out as soon as the range drops below 2^24, so the coder
+never works with big integers. The carry that may propagate into
+the bytes already shifted out is handled by holding back the last byte
+and a run of 0xFF bytes after it.
+
+The code starts with the number of bytes (4 bytes) and the order of
+the model (1 byte) followed by the range coder output.
+"""
+import struct
+
+from bwt_compressor.common import ALPHABET_SIZE
+
+
+ORDERS = [0, 1]
+
+PROBABILITY_BITS = 11
+# The probabilities move towards the coded bit by 1/2^ADAPTATION_SHIFT
+# of the distance
+ADAPTATION_SHIFT = 5
+
+_PROBABILITY_ONE = 1 << PROBABILITY_BITS
+_TOP = 1 << 24
+_MASK32 = (1 << 32) - 1
+
+_HEADER = struct.Struct('>IB')
+
+
+def range_encode(data, order=0):
+    """
+    Code any bytes-like `data` with the model of the given `order`.
+    """
+    if order not in ORDERS:
+        raise ValueError(f'Order must be one of {ORDERS}, got {order}')
+    data = memoryview(data).cast('B')
+    trees = _create_trees(order)
+    context_mask = ALPHABET_SIZE - 1 if order else 0
+
+    out = bytearray()
+    low = 0
+    range_ = _MASK32
+    # The byte held back in case of a carry and the number of the bytes
+    # pending output, which are it and the 0xFF bytes after it
+    cache = 0
+    cache_size = 1
+    prev_byte = 0
+    for byte in data:
+        tree = trees[prev_byte & context_mask]
+        node = 1
+        for shift in range(7, -1, -1):
+            bit = (byte >> shift) & 1
+            probability = tree[node]
+            bound = (range_ >> PROBABILITY_BITS) * probability
+            if bit:
+                low += bound
+                range_ -= bound
+                tree[node] = probability - (probability >> ADAPTATION_SHIFT)
+            else:
+                range_ = bound
+                tree[node] = probability + (
+                    (_PROBABILITY_ONE - probability) >> ADAPTATION_SHIFT
+                )
+            node = (node << 1) | bit
+
+            while range_ < _TOP:
+                range_ <<= 8
+                cache, cache_size = _shift_low(out, low, cache, cache_size)
+                low = (low & 0xFFFFFF) << 8
+        prev_byte = byte
+
+    for _ in range(5):
+        cache, cache_size = _shift_low(out, low, cache, cache_size)
+        low = (low & 0xFFFFFF) << 8
+    return _HEADER.pack(len(data), order) + bytes(out)
+
+
+def range_decode(code):
+    code = memoryview(code).cast('B')
+    data_length, order = _HEADER.unpack_from(code)
+    if order not in ORDERS:
+        raise ValueError(f'Unknown range coder order: {order}')
+    # Enough zero padding for the renormalizations after the last byte
+    stream = bytes(code[_HEADER.size:]) + bytes(4)
+    trees = _create_trees(order)
+    context_mask = ALPHABET_SIZE - 1 if order else 0
+
+    data = bytearray(data_length)
+    range_ = _MASK32
+    # The first byte is always the initial zero cache
+    value = int.from_bytes(stream[1:5], 'big')
+    pos = 5
+    prev_byte = 0
+    for i in range(data_length):
+        tree = trees[prev_byte & context_mask]
+        node = 1
+        while node < ALPHABET_SIZE:
+            probability = tree[node]
+            bound = (range_ >> PROBABILITY_BITS) * probability
+            if value < bound:
+                range_ = bound
+                tree[node] = probability + (
+                    (_PROBABILITY_ONE - probability) >> ADAPTATION_SHIFT
+                )
+                node <<= 1
+            else:
+                value -= bound
+                range_ -= bound
+                tree[node] = probability - (probability >> ADAPTATION_SHIFT)
+                node = (node << 1) | 1
+
+            if range_ < _TOP:
+                range_ <<= 8
+                value = (value << 8) | stream[pos]
+                pos += 1
+        prev_byte = node - ALPHABET_SIZE
+        data[i] = prev_byte
+
+    return bytes(data)
+
+
+def _create_trees(order):
+    return [
+        [_PROBABILITY_ONE // 2] * ALPHABET_SIZE
+        for _ in range(ALPHABET_SIZE ** order)
+    ]
+
+
+def _shift_low(out, low, cache, cache_size):
+    """
+    Output the pending bytes unless a carry may still reach them
+    and return the new cache and its size.
+    """
+    if low < 0xFF000000 or low > _MASK32:
+        carry = low >> 32
+        out.append((cache + carry) & 0xFF)
+        out.extend(bytes([(0xFF + carry) & 0xFF]) * (cache_size - 1))
+        return (low >> 24) & 0xFF, 1
+    return cache, cache_size + 1
@@ -0,0 +1,206 @@
+"""
+Substring search in the compressed data without decompressing it.
+
+Every block is decoded only as far as its BWT, and the occurrences in it
+are counted by backward search in its FM-index (see `fm_index`). The
+occurrences that span the ends of the blocks are found in the first and
+the last bytes of the blocks, which are extracted from the indices too.
+Only `search`, which returns the matching lines, restores the blocks
+with the matches.
+"""
+import bisect
+import collections
+import functools
+
+from bwt_compressor.block import decode_block, decode_block_bwt
+from bwt_compressor.compressor import decompress, find_blocks
+from bwt_compressor.container import is_legacy
+from bwt_compressor.fm_index import FMIndex
+from bwt_compressor.parallel import map_blocks
+
+
+# The number of the restored blocks that `search` keeps for the lines
+# that span the ends of the blocks
+_CACHED_BLOCKS = 4
+
+_BlockMatches = collections.namedtuple(
+    '_BlockMatches', ['count', 'positions', 'head', 'tail']
+)
+
+
+def count(compressed_data, pattern, workers=1):
+    """
+    Return the number of the occurrences of the bytes-like `pattern`
+    in the data, including the overlapping ones.
+    """
+    pattern = _check_pattern(pattern)
+    if is_legacy(compressed_data):
+        return len(_find_all(decompress(compressed_data), pattern))
+    data_offsets, matches = _search_blocks(compressed_data, pattern, False, workers)
+    return sum(block.count for block in matches) + len(
+        _find_spanning(data_offsets, matches, pattern)
+    )
+
+
+def locate(compressed_data, pattern, workers=1):
+    """
+    Return the sorted offsets of the occurrences of `pattern` in the data.
+    """
+    pattern = _check_pattern(pattern)
+    if is_legacy(compressed_data):
+        return _find_all(decompress(compressed_data), pattern)
+    data_offsets, matches = _search_blocks(compressed_data, pattern, True, workers)
+    positions = _find_spanning(data_offsets, matches, pattern)
+    for data_offset, block in zip(data_offsets, matches):
+        positions.update((data_offset + block.positions).tolist())
+    return sorted(positions)
+
+
+def search(compressed_data, pattern, workers=1):
+    """
+    Yield the offset and the bytes without the line break of every line
+    of the data with an occurrence of `pattern`, like grep. Only the blocks
+    of these lines are decompressed.
+    """
+    positions = locate(compressed_data, pattern, workers)
+    if not positions:
+        return
+    if is_legacy(compressed_data):
+        reader = _BlockReader([0], [decompress(compressed_data)], bytes)
+    else:
+        reader = _BlockReader(*find_blocks(compressed_data), decode_block)
+    line_end = -1
+    for position in positions:
+        if position <= line_end:
+            continue
+        line_start = reader.rfind_line_break(position) + 1
+        line_end = reader.find_line_break(position + len(pattern) - 1)
+        yield line_start, reader.read(line_start, line_end)
+
+
+def _check_pattern(pattern):
+    if isinstance(pattern, str):
+        pattern = pattern.encode('utf-8')
+    pattern = bytes(pattern)
+    if not pattern:
+        raise ValueError('Empty search pattern')
+    return pattern
+
+
+def _find_all(text, pattern):
+    positions = []
+    position = text.find(pattern)
+    while position >= 0:
+        positions.append(position)
+        position = text.find(pattern, position + 1)
+    return positions
+
+
+def _search_blocks(compressed_data, pattern, with_positions, workers):
+    data_offsets, payloads = find_blocks(compressed_data)
+    search_block = functools.partial(
+        _search_block, pattern=pattern, with_positions=with_positions
+    )
+    return data_offsets, list(map_blocks(search_block, payloads, workers))
+
+
+def _search_block(payload, pattern, with_positions):
+    """
+    Return the occurrences of `pattern` in the block and its first and last
+    bytes, with which the occurrences that span its ends are found.
+    """
+    index = FMIndex(*decode_block_bwt(payload))
+    edge = len(pattern) - 1
+    return _BlockMatches(
+        index.count(pattern),
+        index.locate(pattern) if with_positions else None,
+        index.extract_prefix(edge),
+        index.extract_suffix(edge)
+    )
+
+
+def _find_spanning(data_offsets, matches, pattern):
+    """
+    Return the set of the offsets of the occurrences of `pattern` that span
+    the ends of the blocks. A short block is spanned as a whole, so
+    the bytes around an end are gathered from as many blocks as needed.
+    """
+    edge = len(pattern) - 1
+    positions = set()
+    for i in range(1, len(matches)):
+        left = b''
+        j = i
+        while len(left) < edge and j > 0:
+            j -= 1
+            left = matches[j].tail + left
+        right = b''
+        j = i
+        while len(right) < edge and j < len(matches):
+            right += matches[j].head
+            j += 1
+        left, right = left[-edge:], right[:edge]
+        window = left + right
+        for start in _find_all(window, pattern):
+            # The occurrences within a block are found by its index
+            if start < len(left) < start + len(pattern):
+                positions.add(data_offsets[i] - len(left) + start)
+    return positions
+
+
+class _BlockReader:
+    """
+    Reads the bytes of the data at any offsets decompressing the blocks
+    on demand and keeping the last ones used.
+    """
+    def __init__(self, data_offsets, payloads, decode):
+        self.data_offsets = data_offsets
+        self.payloads = payloads
+        self.decode = decode
+        self.blocks = collections.OrderedDict()
+
+    def get_block(self, i):
+        if i in self.blocks:
+            self.blocks.move_to_end(i)
+        else:
+            self.blocks[i] = self.decode(self.payloads[i])
+            if len(self.blocks) > _CACHED_BLOCKS:
+                self.blocks.popitem(last=False)
+        return self.blocks[i]
+
+    def find_block(self, position):
+        return max(bisect.bisect_right(self.data_offsets, position) - 1, 0)
+
+    def rfind_line_break(self, position):
+        """
+        Return the offset of the last line break before `position` or -1.
+        """
+        for i in range(self.find_block(position), -1, -1):
+            offset = self.data_offsets[i]
+            line_break = self.get_block(i).rfind(b'\n', 0, position - offset)
+            if line_break >= 0:
+                return offset + line_break
+        return -1
+
+    def find_line_break(self, position):
+        """
+        Return the offset of the first line break from `position` on or
+        the size of the data.
+        """
+        offset = 0
+        for i in range(self.find_block(position), len(self.payloads)):
+            offset = self.data_offsets[i]
+            block = self.get_block(i)
+            line_break = block.find(b'\n', max(position - offset, 0))
+            if line_break >= 0:
+                return offset + line_break
+            offset += len(block)
+        return offset
+
+    def read(self, start, end):
+        chunks = []
+        for i in range(self.find_block(start), len(self.payloads)):
+            offset = self.data_offsets[i]
+            if offset >= end:
+                break
+            chunks.append(self.get_block(i)[max(start - offset, 0):end - offset])
+        return b''.join(chunks)
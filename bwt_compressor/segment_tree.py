@@ -1,3 +1,7 @@
+from array import array
+
+import numpy as np
+
 
 class SegmentTreeRecursive:
     """
@@ -90,3 +94,77 @@ class SegmentTree:
             r //= 2
         
         return res
+
+
+class FenwickTree:
+    """
+    Array-backed Fenwick tree (binary indexed tree) as described in
+    https://en.wikipedia.org/wiki/Fenwick_tree
+
+    Besides range sums it finds the k-th zero leaf at or after a position
+    in O(logn) by descending the tree, provided the leafs are 0s and 1s.
+    """
+    def __init__(self, leafs):
+        self.leafs_num = len(leafs)
+        # The tree is 1-indexed, the node i covers leafs (i - lowbit(i), i]
+        self.tree = array('q', [0])
+        self.tree.extend(leafs)
+        for i in range(1, self.leafs_num + 1):
+            parent = i + (i & -i)
+            if parent <= self.leafs_num:
+                self.tree[parent] += self.tree[i]
+        self.top_step = 1 << (self.leafs_num.bit_length() - 1) if leafs else 0
+
+    def rebuild(self, leafs):
+        """
+        Recompute all the nodes from the new leafs at once with NumPy,
+        which is faster than many separate updates.
+        """
+        assert len(leafs) == self.leafs_num
+        prefix_sums = np.zeros(self.leafs_num + 1, dtype=np.int64)
+        np.cumsum(np.frombuffer(leafs, dtype=np.uint8), out=prefix_sums[1:])
+        tree_indices = np.arange(1, self.leafs_num + 1)
+        tree = np.frombuffer(self.tree, dtype=np.int64)
+        tree[1:] = (
+            prefix_sums[1:] - prefix_sums[tree_indices - (tree_indices & -tree_indices)]
+        )
+
+    def update(self, idx, diff):
+        tree = self.tree
+        tree_idx = idx + 1
+        while tree_idx <= self.leafs_num:
+            tree[tree_idx] += diff
+            tree_idx += tree_idx & -tree_idx
+
+    def get_prefix_sum(self, r):
+        tree = self.tree
+        res = 0
+        while r > 0:
+            res += tree[r]
+            r &= r - 1
+        return res
+
+    def get_sum(self, l, r):
+        return self.get_prefix_sum(r) - self.get_prefix_sum(l)
+
+    def find_kth_zero(self, start, k):
+        """
+        Return the index of the k-th (1-based) zero leaf at or after `start`.
+        """
+        tree = self.tree
+        leafs_num = self.leafs_num
+        # Find the leaf that has exactly `zeros_left` zeros before it,
+        # skipping over the nodes that have fewer zeros than needed
+        zeros_left = start - self.get_prefix_sum(start) + k - 1
+        tree_idx = 0
+        step = self.top_step
+        while step:
+            next_idx = tree_idx + step
+            if next_idx <= leafs_num:
+                zeros = step - tree[next_idx]
+                if zeros <= zeros_left:
+                    tree_idx = next_idx
+                    zeros_left -= zeros
+            step >>= 1
+        assert tree_idx < leafs_num
+        return tree_idx
@@ -0,0 +1,133 @@
+"""
+Optional instrumentation of the compression and decompression.
+
+The functions that accept `stats` report every stage they run into it:
+the wall time, the bytes in and out, the number of the integer symbols
+and, if `tracemalloc` is tracing, the peak of the memory allocated.
+When `stats` is None, nothing is measured, so the instrumentation costs
+a comparison per stage of a block.
+"""
+import collections
+import time
+import tracemalloc
+
+import numpy as np
+
+
+class Stats:
+    """
+    The registry of the counters of every stage and of the whole run.
+    The stats of the blocks processed by other processes are merged into it.
+    """
+    def __init__(self):
+        self.seconds = 0.0
+        self.blocks = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # The number of the blocks of every stage and entropy coder
+        self.codings = collections.Counter()
+        self.stages = {}
+        # The block size and the number of workers chosen for the run
+        self.parameters = {}
+        # The hits, the misses and the evictions of the block cache
+        self.cache = collections.Counter()
+
+    def add_stage(
+        self, name, seconds, bytes_in, bytes_out, symbols=0, peak_alloc=0, calls=1
+    ):
+        stage = self.stages.setdefault(name, {
+            'calls': 0, 'seconds': 0.0, 'bytes_in': 0, 'bytes_out': 0,
+            'symbols': 0, 'peak_alloc': 0,
+        })
+        stage['calls'] += calls
+        stage['seconds'] += seconds
+        stage['bytes_in'] += bytes_in
+        stage['bytes_out'] += bytes_out
+        stage['symbols'] += symbols
+        stage['peak_alloc'] = max(stage['peak_alloc'], peak_alloc)
+
+    def add_block(self, bytes_in, bytes_out, coding=None):
+        self.blocks += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        if coding is not None:
+            self.codings['/'.join(coding)] += 1
+
+    def merge(self, other):
+        """
+        Add the counters of `other` except the wall time, which is measured
+        by the caller, since the blocks may be processed in parallel.
+        """
+        self.blocks += other.blocks
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        self.codings.update(other.codings)
+        self.cache.update(other.cache)
+        for name, stage in other.stages.items():
+            self.add_stage(name, **stage)
+
+    def to_dict(self):
+        return {
+            'seconds': self.seconds,
+            'blocks': self.blocks,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'codings': dict(self.codings),
+            'parameters': dict(self.parameters),
+            'cache': dict(self.cache),
+            'stages': {
+                name: {
+                    **stage, 'mb_per_s': _mb_per_s(stage['bytes_in'], stage['seconds'])
+                }
+                for name, stage in self.stages.items()
+            },
+        }
+
+
+def call_with_stats(func, block):
+    """
+    Call `func` with the block and new stats and return the result
+    and the stats, which is how the stats leave the worker processes.
+    """
+    stats = Stats()
+    return func(block, stats=stats), stats
+
+
+def measure(stats, name, func, *args):
+    """
+    Call `func` with `args` and, unless `stats` is None, report it
+    as the `name` stage. The sizes are those of the first argument
+    and of the result or its first item if it's a tuple.
+    """
+    if stats is None:
+        return func(*args)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    peak_alloc = tracemalloc.get_traced_memory()[1] if tracing else 0
+
+    data_in = args[0]
+    data_out = result[0] if isinstance(result, tuple) else result
+    symbols = next(
+        (len(data) for data in [data_out, data_in] if isinstance(data, np.ndarray)), 0
+    )
+    stats.add_stage(
+        name, seconds, _get_size(data_in), _get_size(data_out), symbols, peak_alloc
+    )
+    return result
+
+
+def _get_size(data):
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    try:
+        return memoryview(data).nbytes
+    except TypeError:
+        return 0
+
+
+def _mb_per_s(bytes_num, seconds):
+    return bytes_num / 10**6 / seconds if seconds > 0 else None
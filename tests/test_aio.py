@@ -0,0 +1,224 @@
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from bwt_compressor import aio
+from bwt_compressor.block import _encode_body
+from bwt_compressor.bwt import apply_bwt
+from bwt_compressor.compressor import compress
+from bwt_compressor.stats import Stats
+
+
+def _random_bytes(l):
+    return bytes(random.randrange(256) for _ in range(l))
+
+
+async def _iterate_chunks(data, chunk_size):
+    for i in range(0, len(data), chunk_size):
+        # The empty chunks mustn't be taken for the end of the data
+        yield b''
+        yield data[i:i + chunk_size]
+
+
+async def _join(chunks):
+    return b''.join([chunk async for chunk in chunks])
+
+
+def _make_stream_reader(data):
+    stream = asyncio.StreamReader()
+    stream.feed_data(data)
+    stream.feed_eof()
+    return stream
+
+
+@pytest.mark.parametrize(
+    'executor_class', [None, ThreadPoolExecutor, ProcessPoolExecutor]
+)
+def test_compress_decompress(executor_class):
+    random.seed(20)
+    executor = executor_class and executor_class(2)
+
+    async def check(text):
+        compressed_text = await aio.compress(text, block_size=100, executor=executor)
+        assert compressed_text == compress(text, block_size=100)
+        assert await aio.decompress(compressed_text, executor=executor) == text
+
+    try:
+        for l in [0, 1, 99, 100, 101, 1000]:
+            asyncio.run(check(_random_bytes(l)))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def test_decompress_legacy():
+    text = b'abracadabra'
+    # The legacy format keeps the terminator in the BWT
+    bwt, (primary_index,) = apply_bwt(text)
+    compressed_text = _encode_body(
+        bwt[:primary_index] + b'\x00' + bwt[primary_index:], 'dc', 'bytes',
+        'adaptive-huffman'
+    )
+    assert asyncio.run(aio.decompress(compressed_text)) == text
+    assert asyncio.run(_join(
+        aio.iter_decompress(_iterate_chunks(compressed_text, 3))
+    )) == text
+
+
+def test_iter_compress_decompress():
+    random.seed(21)
+    for l in [0, 1, 999, 1000, 1001, 5000]:
+        text = _random_bytes(l)
+        compressed_text = compress(text, block_size=1000)
+        for chunk_size in [1, 7, 4096]:
+            assert asyncio.run(_join(aio.iter_compress(
+                _iterate_chunks(text, chunk_size), block_size=1000
+            ))) == compressed_text
+            assert asyncio.run(_join(aio.iter_decompress(
+                _iterate_chunks(compressed_text, chunk_size)
+            ))) == text
+
+
+def test_iter_compress_decompress_stream_reader():
+    text = b'abracadabra' * 1000
+
+    async def check():
+        compressed_text = await _join(
+            aio.iter_compress(_make_stream_reader(text), block_size=1000)
+        )
+        assert compressed_text == compress(text, block_size=1000)
+        assert await _join(
+            aio.iter_decompress(_make_stream_reader(compressed_text))
+        ) == text
+
+    asyncio.run(check())
+
+
+def test_iter_decompress_truncated():
+    compressed_text = compress(b'abracadabra' * 100, block_size=100)
+    for end in [5, 20, len(compressed_text) - 1]:
+        with pytest.raises(ValueError):
+            asyncio.run(_join(aio.iter_decompress(
+                _iterate_chunks(compressed_text[:end], 10)
+            )))
+
+
+def test_compress_decompress_stream():
+    class Writer:
+        def __init__(self):
+            self.chunks = []
+            self.drains = 0
+
+        def write(self, data):
+            self.chunks.append(data)
+
+        async def drain(self):
+            self.drains += 1
+
+    text = b'abracadabra' * 1000
+
+    async def check():
+        compressed = Writer()
+        await aio.compress_stream(
+            _iterate_chunks(text, 100), compressed, block_size=1000
+        )
+        assert compressed.drains == len(compressed.chunks)
+        compressed_text = b''.join(compressed.chunks)
+        assert compressed_text == compress(text, block_size=1000)
+        decompressed = Writer()
+        await aio.decompress_stream(_iterate_chunks(compressed_text, 100), decompressed)
+        assert b''.join(decompressed.chunks) == text
+
+    asyncio.run(check())
+
+
+@pytest.mark.parametrize('max_pending', [1, 3])
+def test_backpressure(max_pending):
+    text = b'abracadabra' * 1000
+    blocks_read = 0
+
+    async def iterate_blocks():
+        nonlocal blocks_read
+        for i in range(0, len(text), 100):
+            blocks_read += 1
+            yield text[i:i + 100]
+
+    async def check():
+        chunks = aio.iter_compress(
+            iterate_blocks(), block_size=100, max_pending=max_pending
+        )
+        # The header
+        await chunks.__anext__()
+        blocks_written = 0
+        async for _ in chunks:
+            blocks_written += 1
+            assert blocks_read <= blocks_written + max_pending
+        # With the end marker
+        assert blocks_written == len(text) // 100 + 1
+
+    asyncio.run(check())
+    with pytest.raises(ValueError):
+        asyncio.run(aio.compress(text, max_pending=0))
+
+
+def test_event_loop_is_not_blocked():
+    with open('resources/martin_eden.txt', 'rb') as f:
+        text = f.read()
+    block_size = 100 * 1024
+    # A blocked event loop would wait about this long for every block
+    start = time.perf_counter()
+    compress(text[:block_size], block_size=block_size)
+    block_seconds = time.perf_counter() - start
+
+    async def tick(delays, done):
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            delays.append(time.perf_counter() - start - 0.01)
+
+    async def measure_delays(coro):
+        delays = []
+        done = asyncio.Event()
+        ticker = asyncio.create_task(tick(delays, done))
+        result = await coro
+        done.set()
+        await ticker
+        return delays, result
+
+    async def check():
+        baseline_delays, _ = await measure_delays(asyncio.sleep(0.3))
+        delays, compressed_text = await measure_delays(
+            aio.compress(text, block_size=block_size)
+        )
+        decompress_delays, _ = await measure_delays(aio.decompress(compressed_text))
+        delays += decompress_delays
+        # The other tasks run while the blocks are coded by the executor,
+        # so the typical delay is the one of an idle loop, not of a block
+        assert len(delays) > 10
+        assert statistics.median(delays) < (
+            2 * statistics.median(baseline_delays) + block_seconds / 10
+        )
+
+    asyncio.run(check())
+
+
+def test_default_executor():
+    executor = aio.get_default_executor()
+    assert isinstance(executor, ProcessPoolExecutor)
+    assert aio.get_default_executor() is executor
+
+
+def test_stats():
+    text = b'abracadabra' * 1000
+    stats = Stats()
+    compressed_text = asyncio.run(aio.compress(text, block_size=4000, stats=stats))
+    assert stats.blocks == 3
+    assert stats.bytes_in == len(text)
+    assert stats.seconds > 0
+    stats = Stats()
+    asyncio.run(aio.decompress(compressed_text, stats=stats))
+    assert stats.bytes_out == len(text)
@@ -0,0 +1,103 @@
+import random
+
+import numpy as np
+import pytest
+
+from bwt_compressor.bitio import BitReader, BitWriter, _pack_codes
+
+
+def _random_codes(n, max_length=64):
+    lengths = [random.randint(1, max_length) for _ in range(n)]
+    codes = [random.getrandbits(length) for length in lengths]
+    return codes, lengths
+
+
+def _to_bits(codes, lengths):
+    return ''.join(f'{code:0{length}b}' for code, length in zip(codes, lengths))
+
+
+def _pad(bits):
+    return bits + '0' * (-len(bits) % 8)
+
+
+def test_pack_codes():
+    codes = np.array([0b1, 0b01, 0b1111111], dtype=np.uint64)
+    lengths = np.array([1, 2, 64], dtype=np.int64)
+    # 67 bits padded with zeros to 9 bytes
+    expected = int('101' + '0' * 57 + '1111111' + '00000', 2).to_bytes(9, 'big')
+    assert _pack_codes(codes, lengths) == (expected, 67)
+
+
+def test_bit_writer_write():
+    random.seed(20)
+    codes, lengths = _random_codes(1000)
+    writer = BitWriter(10)
+    for code, length in zip(codes, lengths):
+        writer.write(code, length)
+    bits = _to_bits(codes, lengths)
+    assert writer.bits_written == len(bits)
+    assert writer.getvalue() == int(_pad(bits), 2).to_bytes(-(-len(bits) // 8), 'big')
+
+
+@pytest.mark.parametrize('codes_num', [0, 1, 100, 70000])
+def test_bit_writer_write_codes(codes_num):
+    random.seed(21)
+    codes, lengths = _random_codes(codes_num)
+    writer = BitWriter()
+    writer.write(0b101, 3)
+    writer.write_codes(np.array(codes, dtype=np.uint64), np.array(lengths))
+    writer.write(1, 1)
+
+    expected_writer = BitWriter()
+    for code, length in zip([0b101] + codes + [1], [3] + lengths + [1]):
+        expected_writer.write(code, length)
+    assert writer.getvalue() == expected_writer.getvalue()
+
+
+def test_bit_reader_read():
+    random.seed(22)
+    codes, lengths = _random_codes(1000, max_length=32)
+    writer = BitWriter()
+    for code, length in zip(codes, lengths):
+        writer.write(code, length)
+    data = writer.getvalue()
+
+    reader = BitReader(data)
+    for code, length in zip(codes, lengths):
+        assert reader.peek(length) == code
+        assert reader.read(length) == code
+    assert reader.bits_read == sum(lengths)
+    # The bits past the end are zeros
+    assert reader.read(32) == 0
+
+
+def test_bit_reader_iter_windows():
+    reader = BitReader(bytes([0b10110011, 0b11110000]))
+    reader.read(1)
+    windows = reader.iter_windows(4)
+    assert next(windows) == 0b0110
+    assert windows.send(3) == 0b0011
+    assert windows.send(4) == 0b1111
+    assert windows.send(2) == 0b1100
+    windows.close()
+    assert reader.bits_read == 10
+    assert reader.read(6) == 0b110000
+
+
+@pytest.mark.parametrize('codes_num', [0, 1, 100, 5000])
+def test_bit_reader_read_codes(codes_num):
+    random.seed(23)
+    codes, lengths = _random_codes(codes_num, max_length=63)
+    # Some codes are empty
+    lengths = [length if length > 5 else 0 for length in lengths]
+    codes = [code >> (63 - length) if length else 0 for code, length in zip(codes, lengths)]
+    writer = BitWriter()
+    writer.write(0b101, 3)
+    writer.write_codes(np.array(codes, dtype=np.uint64), np.array(lengths))
+    writer.write(0b11, 2)
+
+    reader = BitReader(writer.getvalue())
+    assert reader.read(3) == 0b101
+    assert reader.read_codes(np.array(lengths, dtype=np.int64)).tolist() == codes
+    assert reader.bits_read == 3 + sum(lengths)
+    assert reader.read(2) == 0b11
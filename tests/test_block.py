@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from bwt_compressor.block import (
+    _choose_stage,
+    _decode_header,
+    _encode_header,
+    decode_block,
+    decode_blocks,
+    encode_block,
+    encode_blocks,
+    get_block_coding
+)
+from bwt_compressor.stats import Stats
+
+
+@pytest.mark.parametrize(
+    ['stage', 'integer_coding', 'entropy_coder'],
+    [('dc', 'buckets', 'huffman'), ('mtf', 'bytes', 'adaptive-huffman')]
+)
+@pytest.mark.parametrize(
+    'restart_rows', [[], [5], [127], [128], [300000], [1, 2, 300000]]
+)
+def test_encode_decode_header(stage, integer_coding, entropy_coder, restart_rows):
+    header = _encode_header(stage, integer_coding, entropy_coder, restart_rows)
+    assert (
+        _decode_header(header + b'body') ==
+        (stage, integer_coding, entropy_coder, restart_rows, len(header))
+    )
+
+
+@pytest.mark.parametrize(
+    ['primary_index', 'expected_size'], [(0, 2), (127, 2), (128, 3), (300000, 4)]
+)
+def test_encode_header_compact(primary_index, expected_size):
+    assert len(_encode_header('mtf', 'bytes', 'huffman', [primary_index])) == (
+        expected_size
+    )
+
+
+@pytest.mark.parametrize(
+    'coding', [
+        b'\xff\x00\x00', b'\x00\xff\x00', b'\x00\x00\xff', b'\xf0', b'\x87'
+    ]
+)
+def test_decode_header_unknown_coding(coding):
+    with pytest.raises(ValueError):
+        _decode_header(coding + bytes(4))
+
+
+@pytest.mark.parametrize(
+    'entropy_coder', ['adaptive-huffman', 'huffman', 'range', 'range-order1']
+)
+@pytest.mark.parametrize('stage', ['dc', 'mtf'])
+@pytest.mark.parametrize('restart_points', [1, 3, 64])
+def test_encode_decode_block(stage, entropy_coder, restart_points):
+    random.seed(24)
+    for l in [0, 1, 2, 10, 500]:
+        text = bytes(random.randrange(256) for _ in range(l))
+        payload = encode_block(text, restart_points, stage, entropy_coder)
+        assert get_block_coding(payload) == (stage, entropy_coder)
+        assert decode_block(payload) == text
+
+
+@pytest.mark.parametrize('stage', ['auto', 'dc', 'mtf'])
+def test_encode_blocks(stage):
+    random.seed(25)
+    blocks = [
+        bytes(random.randrange(4) for _ in range(l)) for l in [0, 5, 100, 2000]
+    ]
+    stats = Stats()
+    payloads = encode_blocks(blocks, 2, stage, 'huffman', stats)
+    assert payloads == [encode_block(block, 2, stage, 'huffman') for block in blocks]
+    assert stats.stages['bwt']['calls'] == len(blocks)
+
+
+@pytest.mark.parametrize(
+    ['l', 'expected_rows_num'], [(154, 1), (8191, 1), (8192, 2), (300000, 64)]
+)
+def test_encode_block_restart_rows_num(l, expected_rows_num):
+    text = b'abcd' * (l // 4) + b'a' * (l % 4)
+    for payload in [encode_block(text), encode_blocks([text])[0]]:
+        assert len(_decode_header(payload)[3]) == expected_rows_num
+        assert decode_block(payload) == text
+
+
+def test_decode_blocks():
+    random.seed(28)
+    texts = [b'', b'a', b'banana', b'abcd' * 3000]
+    texts += [bytes(random.choice(b'ab') for _ in range(l)) for l in [10, 5000]]
+    payloads = encode_blocks(texts, restart_points=3)
+    stats = Stats()
+    assert decode_blocks(payloads, stats) == texts
+    assert stats.blocks == len(texts)
+    assert stats.stages['inverse_bwt']['calls'] == len(texts)
+    assert decode_blocks([]) == []
+
+
+def test_encode_block_auto_stage():
+    text = b'abracadabra' * 100
+    payload = encode_block(text, stage='auto')
+    assert get_block_coding(payload)[0] in ['dc', 'mtf']
+    assert decode_block(payload) == text
+
+
+def test_choose_stage():
+    # A run of equal chars is coded by MTF + RLE0 in a few digits,
+    # while distance coding spends a zero on every char of it
+    assert _choose_stage(b'a' * 10000) == 'mtf'
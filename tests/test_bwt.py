@@ -1,62 +1,105 @@
 import random
 import string
 
+import numpy as np
 import pytest
 
+import bwt_compressor.bwt
 from bwt_compressor.bwt import (
+    _apply_bwt_python,
     _build_suffix_array,
     _compute_sorting_permutation,
     _compute_sorting_permutation_inverse,
     apply_bwt,
-    restore_text_from_bwt
+    apply_bwt_many,
+    get_index_dtype,
+    get_segment_length,
+    restore_text_from_bwt,
+    restore_texts_from_bwts
 )
 
 @pytest.mark.parametrize(
-    ['text', 'expected_bwt'],
+    ['text', 'expected_bwt', 'expected_primary_index'],
     [
-        ('', '\x00'),
-        ('a', 'a\x00'),
-        ('aaaaaa', 'aaaaaa\x00'),
-        ('banana', 'annb\x00aa'),
+        (b'', b'', None),
+        (b'a', b'a', 1),
+        (b'aaaaaa', b'aaaaaa', 6),
+        (b'banana', b'annbaa', 4),
+        (b'\x00a\x00', b'\x00a\x00', 2),
     ]
 )
-def test_apply_bwt(text, expected_bwt):
-    assert apply_bwt(text) == expected_bwt
+def test_apply_bwt(text, expected_bwt, expected_primary_index):
+    bwt, restart_rows = apply_bwt(text)
+    assert bwt == expected_bwt
+    assert restart_rows == ([expected_primary_index] if text else [])
+
+
+def test_apply_bwt_matches_python_implementation(max_len=300):
+    random.seed(18)
+    for l in range(0, max_len, 7):
+        alphabet = random.choice([b'ab', b'\x00\x01\xff', bytes(range(256))])
+        text = bytes(random.choice(alphabet) for _ in range(l))
+        assert apply_bwt(text) == _apply_bwt_python(text)
+
+
+@pytest.mark.parametrize(
+    'make_buffer',
+    [bytes, bytearray, memoryview, lambda b: np.frombuffer(b, dtype=np.uint8)]
+)
+def test_apply_restore_bwt_buffers(make_buffer):
+    text = b'mississippi\x00river'
+    bwt, restart_rows = apply_bwt(make_buffer(text), restart_points=3)
+    assert restore_text_from_bwt(make_buffer(bwt), restart_rows) == text
 
 
 @pytest.mark.parametrize(
     ['text', 'expected_suffix_array'],
     [
-        ('', []),
-        ('a', [0]),
-        ('aaaaaa', [5,4,3,2,1,0]),
-        ('banana', [3,2,5,1,4,0]),
+        (b'', []),
+        (b'a', [0]),
+        (b'aaaaaa', [5,4,3,2,1,0]),
+        (b'banana', [3,2,5,1,4,0]),
     ]
 )
 def test_build_suffix_array(text, expected_suffix_array):
-    assert _build_suffix_array(text) == expected_suffix_array
+    assert _build_suffix_array(text).tolist() == expected_suffix_array
 
 
 def test_apply_restore_bwt(max_len=100):
     random.seed(17)
     for l in range(max_len):
-        text = ''.join(random.choice(string.ascii_letters) for _ in range(l))
-        bwt = apply_bwt(text)
-        text_from_bwt = restore_text_from_bwt(bwt)
+        text = bytes(random.randrange(256) for _ in range(l))
+        bwt, restart_rows = apply_bwt(text)
+        text_from_bwt = restore_text_from_bwt(bwt, restart_rows)
         assert text_from_bwt == text
 
 
+@pytest.mark.parametrize('restart_points', [1, 2, 7, 16, 50, 1000])
+def test_apply_restore_bwt_with_restart_rows(restart_points, max_len=100):
+    random.seed(19)
+    for l in range(max_len):
+        text = bytes(random.choice(b'ab\x00') for _ in range(l))
+        bwt, restart_rows = apply_bwt(text, restart_points)
+        assert (bwt, restart_rows[:1]) == apply_bwt(text)
+        if l > 0:
+            assert (
+                len(restart_rows) ==
+                get_segment_length(l, get_segment_length(l, restart_points))
+            )
+        assert restore_text_from_bwt(bwt, restart_rows) == text
+
+
 @pytest.mark.parametrize(
     ['text', 'expected_sorting_permutation_inverse'],
     [
-        ('', []),
-        ('a', [0]),
-        ('ababc', [0, 2, 1, 3, 4]),
+        (b'', []),
+        (b'a', [0]),
+        (b'ababc', [0, 2, 1, 3, 4]),
     ]
 )
 def test_compute_sorting_permutation_inverse(text, expected_sorting_permutation_inverse):
     assert (
-        _compute_sorting_permutation(text) ==
+        _compute_sorting_permutation(text).tolist() ==
         expected_sorting_permutation_inverse
     )
 
@@ -64,24 +107,85 @@ def test_compute_sorting_permutation_inverse(text, expected_sorting_permutation_
 def test_compute_sorting_permutation_inverse_random(max_len=20):
     random.seed(17)
     for l in range(max_len):
-        text = ''.join(random.choice(string.ascii_letters) for _ in range(l))
+        text = ''.join(random.choice(string.ascii_letters) for _ in range(l)).encode()
         sorting_permutation_inverse = _compute_sorting_permutation_inverse(text)
         permuted_sorted_text = [None] * len(text)
         for c, pos in zip(sorted(text), sorting_permutation_inverse):
             permuted_sorted_text[pos] = c
-        assert ''.join(permuted_sorted_text) == text
+        assert bytes(permuted_sorted_text) == text
 
 
 @pytest.mark.parametrize(
     ['text', 'expected_sorting_permutation'],
     [
-        ('', []),
-        ('a', [0]),
-        ('ababc', [0, 2, 1, 3, 4]),
+        (b'', []),
+        (b'a', [0]),
+        (b'ababc', [0, 2, 1, 3, 4]),
     ]
 )
 def test_compute_sorting_permutation(text, expected_sorting_permutation):
     assert (
-        _compute_sorting_permutation(text) ==
+        _compute_sorting_permutation(text).tolist() ==
         expected_sorting_permutation
-    )
\ No newline at end of file
+    )
+
+
+def test_get_index_dtype():
+    assert get_index_dtype(2**31 - 1) == np.int32
+    assert get_index_dtype(2**31) == np.int64
+
+
+@pytest.mark.parametrize('restart_points', [1, 5, 64])
+def test_apply_restore_bwt_chunked(monkeypatch, restart_points):
+    random.seed(25)
+    text = bytes(random.choice(b'abc') for _ in range(1000))
+    expected_bwt = _apply_bwt_python(text)[0]
+    monkeypatch.setattr(bwt_compressor.bwt, '_CHUNK_SIZE', 7)
+    bwt, restart_rows = apply_bwt(text, restart_points)
+    assert bwt == expected_bwt
+    assert restore_text_from_bwt(bwt, restart_rows) == text
+
+    sorting_permutation_inverse = _compute_sorting_permutation_inverse(text)
+    assert sorting_permutation_inverse.dtype == np.int32
+    assert (
+        sorting_permutation_inverse.tolist() ==
+        sorted(range(len(text)), key=lambda i: text[i])
+    )
+
+
+@pytest.mark.parametrize('restart_points', [1, 3])
+def test_apply_bwt_many(restart_points):
+    random.seed(26)
+    texts = [b'', b'a', b'banana', b'', b'\x00\x00\xff']
+    for l in [10, 1023, 1024, 3000]:
+        texts.append(bytes(random.choice(b'ab\x00\xff') for _ in range(l)))
+    random.shuffle(texts)
+    assert apply_bwt_many(texts, restart_points) == [
+        apply_bwt(text, restart_points) for text in texts
+    ]
+    assert apply_bwt_many([]) == []
+
+
+def test_apply_bwt_min_segment_length():
+    text = b'abracadabra' * 10
+    for restart_points, expected_rows_num in [(1, 1), (5, 5), (100, 11)]:
+        _, restart_rows = apply_bwt(text, restart_points, min_segment_length=10)
+        assert len(restart_rows) == expected_rows_num
+        assert apply_bwt_many([text], restart_points, 10) == [
+            (apply_bwt(text, expected_rows_num)[0], restart_rows)
+        ]
+    assert len(apply_bwt(text, 5, min_segment_length=1000)[1]) == 1
+
+
+@pytest.mark.parametrize('restart_points', [1, 3])
+def test_restore_texts_from_bwts(restart_points):
+    random.seed(29)
+    texts = [b'', b'a', b'banana', b'', b'\x00\x00\xff']
+    for l in [10, 1000, 8191, 8192, 20000]:
+        texts.append(bytes(random.choice(b'ab\x00\xff') for _ in range(l)))
+    random.shuffle(texts)
+    bwts = [apply_bwt(text, restart_points) for text in texts]
+    assert restore_texts_from_bwts(
+        [bwt for bwt, _ in bwts], [restart_rows for _, restart_rows in bwts]
+    ) == texts
+    assert restore_texts_from_bwts([], []) == []
@@ -0,0 +1,170 @@
+import io
+import random
+
+import pytest
+
+from bwt_compressor import bwtfile
+from bwt_compressor.block import _encode_body
+from bwt_compressor.bwt import apply_bwt
+from bwt_compressor.bwtfile import BWTFile
+from bwt_compressor.compressor import compress
+
+
+def _random_bytes(l):
+    return bytes(random.randrange(4) for _ in range(l))
+
+
+def _write_in_pieces(f, text):
+    pos = 0
+    while pos < len(text):
+        size = random.randrange(1, 3000)
+        assert f.write(text[pos:pos + size]) == len(text[pos:pos + size])
+        pos += size
+
+
+class _NonSeekable(io.RawIOBase):
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.stream.readinto(b)
+
+
+@pytest.mark.parametrize('index', [False, True])
+def test_write(index):
+    random.seed(40)
+    for l in [0, 1, 999, 1000, 1001, 10500]:
+        text = _random_bytes(l)
+        compressed = io.BytesIO()
+        with BWTFile(compressed, 'wb', block_size=1000, index=index) as f:
+            _write_in_pieces(f, text)
+            assert f.tell() == l
+        assert compressed.getvalue() == compress(text, block_size=1000, index=index)
+
+
+@pytest.mark.parametrize('index', [False, True])
+@pytest.mark.parametrize('read_ahead', [False, True])
+def test_read_seek(index, read_ahead):
+    random.seed(41)
+    text = _random_bytes(10500)
+    compressed_text = compress(text, block_size=1000, index=index)
+    with BWTFile(io.BytesIO(compressed_text), read_ahead=read_ahead) as f:
+        assert f.seekable()
+        assert f.read() == text
+        assert f.read() == b''
+        for _ in range(200):
+            position = random.randrange(12000)
+            size = random.randrange(-1, 3000)
+            assert f.seek(position) == min(position, len(text))
+            assert f.read(size) == text[position:][:size if size >= 0 else None]
+            end = len(text) if size < 0 else position + size
+            assert f.tell() == min(end, len(text))
+        assert f.seek(-5, io.SEEK_END) == len(text) - 5
+        assert f.seek(-10, io.SEEK_CUR) == len(text) - 15
+        assert f.read(3) == text[-15:-12]
+        with pytest.raises(ValueError):
+            f.seek(-1)
+
+
+@pytest.mark.parametrize('index', [False, True])
+def test_seek_decodes_one_block(monkeypatch, index):
+    text = b'abracadabra' * 1000
+    compressed_text = compress(text, block_size=1000, index=index)
+    decoded = []
+    decode_block = bwtfile.decode_block
+    monkeypatch.setattr(
+        bwtfile, 'decode_block',
+        lambda payload: decoded.append(payload) or decode_block(payload)
+    )
+    with BWTFile(io.BytesIO(compressed_text), read_ahead=False) as f:
+        f.seek(5500)
+        assert f.read(10) == text[5500:5510]
+        f.seek(1500)
+        assert f.read(10) == text[1500:1510]
+    assert len(decoded) == 2
+
+
+def test_read_methods():
+    text = b''.join(b'line %d\n' % i for i in range(1000)) + b'end'
+    f = BWTFile(io.BytesIO(compress(text, block_size=1000)))
+    assert f.peek()[:6] == b'line 0'
+    assert f.read1(3) == b'lin'
+    buffer = bytearray(5)
+    assert f.readinto(buffer) == 5
+    assert buffer == b'e 0\nl'
+    assert f.readline() == b'ine 1\n'
+    assert f.readline(3) == b'lin'
+    assert list(f) == [b'e 2\n'] + text.splitlines(keepends=True)[3:]
+    f.close()
+    assert f.closed
+    with pytest.raises(ValueError):
+        f.read()
+
+
+def test_non_seekable():
+    text = b'abracadabra' * 1000
+    f = BWTFile(io.BufferedReader(_NonSeekable(compress(text, block_size=1000))))
+    assert not f.seekable()
+    assert f.read(10) == text[:10]
+    # Seeking forward skips the data
+    assert f.seek(5000) == 5000
+    assert f.read(10) == text[5000:5010]
+    with pytest.raises(io.UnsupportedOperation):
+        f.seek(0)
+
+
+def test_legacy():
+    text = b'abracadabra'
+    # The legacy format keeps the terminator in the BWT
+    bwt, (primary_index,) = apply_bwt(text)
+    compressed_text = _encode_body(
+        bwt[:primary_index] + b'\x00' + bwt[primary_index:], 'dc', 'bytes',
+        'adaptive-huffman'
+    )
+    with BWTFile(io.BytesIO(compressed_text)) as f:
+        assert f.read(4) == text[:4]
+        assert f.seek(-3, io.SEEK_END) == len(text) - 3
+        assert f.read() == text[-3:]
+
+
+def test_open_path(tmp_path):
+    text = 'строка\n' * 1000
+    path = tmp_path / 'text.bwt'
+    with bwtfile.open(path, 'wt', encoding='utf-8', block_size=1000, index=True) as f:
+        f.write(text)
+    with bwtfile.open(path, 'rt', encoding='utf-8') as f:
+        assert f.readlines() == text.splitlines(keepends=True)
+    with bwtfile.open(str(path), 'rb') as f:
+        assert f.read() == text.encode()
+    with pytest.raises(FileExistsError):
+        bwtfile.open(path, 'xb')
+    with bwtfile.open(path, 'wt') as f:
+        f.write('line\n')
+    with bwtfile.open(path, 'rt') as f:
+        assert f.read() == 'line\n'
+
+
+def test_invalid_usage():
+    with pytest.raises(ValueError):
+        BWTFile(io.BytesIO(), 'ab')
+    with pytest.raises(ValueError):
+        bwtfile.open(io.BytesIO(), 'at')
+    with pytest.raises(ValueError):
+        bwtfile.open(io.BytesIO(), 'rbt')
+    with pytest.raises(ValueError):
+        bwtfile.open(io.BytesIO(), 'rb', encoding='utf-8')
+    with pytest.raises(TypeError):
+        BWTFile(1)
+    with pytest.raises(ValueError):
+        BWTFile(io.BytesIO(compress(b'abc')[:5]))
+    with BWTFile(io.BytesIO(), 'wb') as f:
+        with pytest.raises(io.UnsupportedOperation):
+            f.read()
+        with pytest.raises(io.UnsupportedOperation):
+            f.seek(0)
+    with BWTFile(io.BytesIO(compress(b'abc'))) as f:
+        with pytest.raises(io.UnsupportedOperation):
+            f.write(b'abc')
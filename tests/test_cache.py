@@ -0,0 +1,134 @@
+import random
+
+import pytest
+
+from bwt_compressor import compressor
+from bwt_compressor.block import BLOCK_FORMAT_VERSION
+from bwt_compressor.cache import BlockCache, make_key
+from bwt_compressor.compressor import compress, decompress, decompress_range
+from bwt_compressor.stats import Stats
+
+
+def test_lru():
+    cache = BlockCache(max_bytes=10)
+    cache.put('a', b'1234')
+    cache.put('b', b'5678')
+    assert cache.get('a') == b'1234'
+    # 'b' is the least recently used one
+    cache.put('c', b'90')
+    cache.put('d', b'ab')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1234'
+    assert cache.get('d') == b'ab'
+    # Too large for the cache
+    cache.put('e', b'x' * 11)
+    assert cache.get('e') is None
+    assert cache.to_dict() == {
+        'hits': 3, 'misses': 2, 'evictions': 1, 'entries': 3, 'bytes': 8
+    }
+    with pytest.raises(ValueError):
+        BlockCache(max_bytes=-1)
+
+
+def test_directory(tmp_path):
+    cache = BlockCache(max_bytes=4, directory=tmp_path)
+    cache.put(make_key('kind', b'a'), b'1234')
+    cache.put(make_key('kind', b'b'), b'5678')
+    assert cache.evictions == 1
+    assert cache.get(make_key('kind', b'a')) == b'1234'
+    cache = BlockCache(directory=tmp_path)
+    assert cache.get(make_key('kind', b'b')) == b'5678'
+    assert cache.get(make_key('other', b'b')) is None
+
+
+@pytest.mark.parametrize('entry', [b'', b'short', b'x' * 20])
+def test_directory_invalid_entry(tmp_path, entry):
+    key = make_key('kind', b'a')
+    BlockCache(directory=tmp_path).put(key, b'1234')
+    (path,) = [path for path in tmp_path.rglob('*') if path.is_file()]
+    path.write_bytes(entry)
+    cache = BlockCache(directory=tmp_path)
+    assert cache.get(key) is None
+    assert not path.exists()
+    cache.put(key, b'1234')
+    assert BlockCache(directory=tmp_path).get(key) == b'1234'
+
+
+def test_directory_format_version(tmp_path, monkeypatch):
+    text = b'abracadabra' * 300
+    cache = BlockCache(directory=tmp_path)
+    compressed_text = compress(text, block_size=1000, cache=cache)
+    assert decompress(compressed_text, cache=cache) == text
+    cache = BlockCache(directory=tmp_path)
+    compress(text, block_size=1000, cache=cache)
+    decompress(compressed_text, cache=cache)
+    assert cache.misses == 0
+
+    # The entries of the blocks coded in the previous format aren't reused
+    monkeypatch.setattr(compressor, 'BLOCK_FORMAT_VERSION', BLOCK_FORMAT_VERSION + 1)
+    cache = BlockCache(directory=tmp_path)
+    assert compress(text, block_size=1000, cache=cache) == compressed_text
+    assert decompress(compressed_text, cache=cache) == text
+    assert cache.hits == 0
+
+
+def test_make_key():
+    assert make_key('kind', b'abc') == make_key('kind', memoryview(b'abc'))
+    assert make_key('kind', b'abc') != make_key('kind', b'abd')
+    assert make_key('kind', b'abc') != make_key('kind2', b'abc')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_compress_decompress(workers):
+    random.seed(60)
+    blocks = [bytes(random.randrange(4) for _ in range(1000)) for _ in range(3)]
+    text = b''.join(random.choice(blocks) for _ in range(10)) + b'end'
+    cache = BlockCache()
+    for _ in range(2):
+        compressed_text = compress(text, block_size=1000, workers=workers, cache=cache)
+        assert compressed_text == compress(text, block_size=1000)
+        assert decompress(compressed_text, workers=workers, cache=cache) == text
+        if workers == 1:
+            # 3 distinct blocks and the last one, compressed and decompressed
+            assert cache.misses == 8
+    # The blocks in flight at once are looked up before any of them is done
+    assert cache.misses >= 8
+    assert cache.hits + cache.misses == 4 * 11
+    # Other parameters are other keys
+    misses = cache.misses
+    compressed_text = compress(text, block_size=1000, stage='dc', cache=cache)
+    assert decompress(compressed_text) == text
+    assert cache.misses == misses + 4
+
+
+def test_hits_skip_coding(monkeypatch):
+    text = b'abracadabra' * 1000
+    cache = BlockCache()
+    compressed_text = compress(text, block_size=1000, cache=cache)
+    assert decompress(compressed_text, cache=cache) == text
+
+    def fail(*args, **kwargs):
+        raise AssertionError('The block is coded again')
+
+    monkeypatch.setattr(compressor, 'encode_block', fail)
+    monkeypatch.setattr(compressor, 'decode_block', fail)
+    assert compress(text, block_size=1000, cache=cache) == compressed_text
+    assert decompress(compressed_text, cache=cache) == text
+    assert decompress_range(compressed_text, 2500, 10, cache=cache) == text[2500:2510]
+
+
+def test_stats():
+    text = b'abcdefghij' * 1000
+    cache = BlockCache(max_bytes=2000)
+    stats = Stats()
+    compress(text, block_size=1000, cache=cache, stats=stats)
+    assert stats.cache == {'misses': 1, 'hits': 9}
+    assert stats.blocks == 10
+    assert stats.bytes_in == len(text)
+    random.seed(61)
+    text = bytes(random.randrange(256) for _ in range(5000))
+    stats = Stats()
+    compressed_text = compress(text, block_size=1000, cache=cache, stats=stats)
+    assert stats.cache['evictions'] > 0
+    assert stats.to_dict()['cache'] == dict(stats.cache)
+    assert decompress(compressed_text, cache=cache) == text
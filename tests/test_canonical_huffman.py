@@ -0,0 +1,106 @@
+import random
+
+import numpy as np
+import pytest
+
+from bwt_compressor.bitio import BitReader, BitWriter
+from bwt_compressor.canonical_huffman import (
+    MAX_CODE_LENGTH,
+    _build_decoding_tables,
+    _read_lengths,
+    _write_lengths,
+    _compute_canonical_codes,
+    _compute_code_lengths,
+    canonical_huffman_decode,
+    canonical_huffman_encode
+)
+
+
+@pytest.mark.parametrize(
+    ['counts', 'expected_lengths'],
+    [
+        ([0, 0], [0, 0]),
+        ([0, 5], [0, 1]),
+        ([1, 1, 2], [2, 2, 1]),
+        ([1, 2, 4, 8], [3, 3, 2, 1]),
+    ]
+)
+def test_compute_code_lengths(counts, expected_lengths):
+    assert _compute_code_lengths(counts).tolist() == expected_lengths
+
+
+def test_compute_code_lengths_limited():
+    # Fibonacci counts make the deepest unlimited code
+    counts = [1, 1]
+    while len(counts) < 30:
+        counts.append(counts[-1] + counts[-2])
+    lengths = _compute_code_lengths(counts)
+    assert lengths.max() == MAX_CODE_LENGTH
+    assert sum(2.0 ** -l for l in lengths.tolist()) <= 1
+
+
+def test_compute_canonical_codes():
+    lengths = np.array([2, 1, 3, 3, 0], dtype=np.uint8)
+    assert _compute_canonical_codes(lengths).tolist() == [0b10, 0b0, 0b110, 0b111, 0]
+
+
+@pytest.mark.parametrize('lengths', [[1, 1, 1], [2, 2, 2, 2, 3], [1] + [15] * (2**14 + 1)])
+def test_build_decoding_tables_invalid_lengths(lengths):
+    with pytest.raises(ValueError):
+        _build_decoding_tables(lengths)
+
+
+@pytest.mark.parametrize('tables_num', [None, 1, 2, 6])
+def test_canonical_huffman_encode_decode(tables_num, max_len=300, step=7):
+    random.seed(20)
+    for l in range(0, max_len, step):
+        for alphabet in [b'a', b'ab', bytes(range(256))]:
+            data = bytes(random.choice(alphabet) for _ in range(l))
+            code = canonical_huffman_encode(data, tables_num)
+            assert canonical_huffman_decode(code) == data
+
+
+def test_canonical_huffman_encode_decode_skewed():
+    random.seed(21)
+    data = bytes(min(int(random.expovariate(0.05)), 255) for _ in range(20000))
+    code = canonical_huffman_encode(data)
+    assert len(code) < len(data)
+    assert canonical_huffman_decode(code) == data
+
+
+@pytest.mark.parametrize('tables_num', [1, 3])
+def test_write_read_lengths(tables_num):
+    random.seed(22)
+    for symbols_num in [0, 1, 2, 17, 255, 256]:
+        symbols = random.sample(range(256), symbols_num)
+        lengths = np.zeros((tables_num, 256), dtype=np.uint8)
+        for table_lengths in lengths:
+            table_lengths[symbols] = [
+                random.choice([1, MAX_CODE_LENGTH, random.randint(1, MAX_CODE_LENGTH)])
+                for _ in symbols
+            ]
+        writer = BitWriter()
+        _write_lengths(writer, lengths)
+        writer.write(0b101, 3)
+        reader = BitReader(writer.getvalue())
+        assert _read_lengths(reader, tables_num).tolist() == lengths.tolist()
+        assert reader.read(3) == 0b101
+
+
+def test_canonical_huffman_encode_small():
+    # The lengths of a few symbols take a few bytes, not a byte per 2 symbols
+    data = b'abracadabra' * 10
+    code = canonical_huffman_encode(data)
+    assert len(code) < 50
+    assert canonical_huffman_decode(code) == data
+
+
+@pytest.mark.parametrize('code', [b'', b'\x00\x00', b'\xe0\x00'])
+def test_canonical_huffman_decode_invalid_tables_num(code):
+    with pytest.raises(ValueError):
+        canonical_huffman_decode(code)
+
+
+def test_canonical_huffman_encode_tables_num():
+    with pytest.raises(ValueError):
+        canonical_huffman_encode(b'data', 7)
@@ -1,22 +1,333 @@
+import io
 import itertools
 import random
-import string
 
+import numpy as np
 import pytest
 
 
+from bwt_compressor.block import _encode_body
+from bwt_compressor.bwt import apply_bwt
 from bwt_compressor.compressor import (
     compress,
-    decompress
+    compress_file,
+    compress_many,
+    compress_stream,
+    decompress,
+    decompress_file,
+    decompress_file_range,
+    decompress_many,
+    decompress_range,
+    decompress_stream,
+    decompress_text,
+    iter_compress,
+    iter_decompress,
+    list_blocks
 )
+from bwt_compressor.container import END_MARKER, read_index
+from bwt_compressor.stats import Stats
+
+
+def _random_bytes(l):
+    return bytes(random.randrange(256) for _ in range(l))
+
+
+def _encode_legacy(text):
+    # The legacy format keeps the terminator in the BWT. It's built with
+    # the current code for the edge cases, while the stream written by
+    # the original tool is resources/martin_eden.bwt
+    bwt, (primary_index,) = apply_bwt(text)
+    return _encode_body(bwt[:primary_index] + b'\x00' + bwt[primary_index:], 'dc', 'bytes', 'adaptive-huffman')
 
 
 def test_compress_decompress():
     random.seed(20)
     for l in itertools.chain(range(100), range(1000, 1010)):
-        text = ''.join(random.choice(string.ascii_letters) for _ in range(l))
+        text = _random_bytes(l)
         compressed_text = compress(text)
         decompressed_text = decompress(compressed_text)
         assert decompressed_text == text
 
 
+@pytest.mark.parametrize(
+    'make_buffer',
+    [bytearray, memoryview, lambda b: np.frombuffer(b, dtype=np.uint8)]
+)
+def test_compress_buffers(make_buffer):
+    data = b'\x00binary\x00data\xff' * 10
+    assert compress(make_buffer(data), block_size=50) == compress(data, block_size=50)
+
+
+@pytest.mark.parametrize('stage', ['dc', 'mtf', 'auto'])
+def test_compress_decompress_stages(stage):
+    random.seed(24)
+    text = _random_bytes(500) + b'a' * 500 + b'ab' * 250
+    compressed_text = compress(text, block_size=500, stage=stage)
+    assert decompress(compressed_text) == text
+
+
+@pytest.mark.parametrize(
+    'entropy_coder', ['adaptive-huffman', 'huffman', 'range', 'range-order1']
+)
+def test_compress_decompress_entropy_coders(entropy_coder):
+    random.seed(25)
+    text = _random_bytes(500) + b'a' * 500
+    compressed_text = compress(text, block_size=500, entropy_coder=entropy_coder)
+    assert decompress(compressed_text) == text
+
+
+@pytest.mark.parametrize(
+    'options', [{'stage': 'lzw'}, {'entropy_coder': 'arithmetic'}]
+)
+def test_compress_unknown_coding(options):
+    with pytest.raises(ValueError):
+        compress(b'text', **options)
+
+
+def test_list_blocks():
+    text = b'abcdefghij' * 3
+    compressed_text = compress(text, block_size=10, stage='dc')
+    blocks = list(list_blocks(io.BytesIO(compressed_text)))
+    assert [coding for _, *coding in blocks] == [['dc', 'huffman']] * 3
+    assert sum(size for size, *_ in blocks) < len(compressed_text)
+
+    legacy = _encode_legacy(text)
+    assert (
+        list(list_blocks(io.BytesIO(legacy))) ==
+        [(len(legacy), 'dc', 'adaptive-huffman')]
+    )
+
+
+def test_compress_decompress_str():
+    text = 'Unicode text: é中'
+    assert decompress_text(compress(text)) == text
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 100])
+def test_compress_decompress_blocks(block_size):
+    random.seed(21)
+    for l in [0, 1, block_size - 1, block_size, block_size + 1, 3 * block_size + 5]:
+        text = _random_bytes(l)
+        compressed_text = compress(text, block_size=block_size)
+        assert decompress(compressed_text) == text
+
+
+def test_decompress_legacy():
+    text = b'legacy single block'
+    assert decompress(_encode_legacy(text)) == text
+
+
+def test_decompress_legacy_artifact():
+    with open('resources/martin_eden.bwt', 'rb') as f:
+        compressed_text = f.read()
+    with open('resources/martin_eden.txt', 'rb') as f:
+        text = f.read()
+    assert decompress(compressed_text) == text
+
+
+def test_compress_decompress_stream():
+    random.seed(22)
+    text = _random_bytes(1000)
+    compressed = io.BytesIO()
+    compress_stream(io.BytesIO(text), compressed, block_size=300)
+    assert compressed.getvalue() == compress(text, block_size=300)
+
+    compressed.seek(0)
+    decompressed = io.BytesIO()
+    decompress_stream(compressed, decompressed)
+    assert decompressed.getvalue() == text
+
+
+class _ShortReader(io.RawIOBase):
+    """
+    A raw source that returns at most `max_read` bytes from every read.
+    """
+    def __init__(self, data, max_read):
+        self.stream = io.BytesIO(data)
+        self.max_read = max_read
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.stream.readinto(memoryview(b)[:self.max_read])
+
+
+def test_compress_decompress_short_reads(tmp_path):
+    random.seed(28)
+    text = _random_bytes(10500)
+    compressed = io.BytesIO()
+    compress_stream(_ShortReader(text, 700), compressed, block_size=1000)
+    compressed_text = compressed.getvalue()
+    assert compressed_text == compress(text, block_size=1000)
+    for _ in range(50):
+        start, length = random.randrange(11000), random.randrange(3000)
+        assert decompress_range(compressed_text, start, length) == (
+            text[start:start + length]
+        )
+    decompressed = io.BytesIO()
+    decompress_stream(_ShortReader(compressed_text, 700), decompressed)
+    assert decompressed.getvalue() == text
+
+    (tmp_path / 'text.bwt').write_bytes(compressed_text)
+    decompress_file(tmp_path / 'text.bwt', tmp_path / 'text')
+    assert (tmp_path / 'text').read_bytes() == text
+
+
+def test_decompress_stream_legacy():
+    text = b'legacy single block'
+    decompressed = io.BytesIO()
+    decompress_stream(io.BytesIO(_encode_legacy(text)), decompressed)
+    assert decompressed.getvalue() == text
+
+
+def test_compress_decompress_parallel():
+    random.seed(23)
+    text = _random_bytes(1000)
+    compressed_text = compress(text, block_size=100, workers=2)
+    assert compressed_text == compress(text, block_size=100)
+    assert decompress(compressed_text, workers=2) == text
+
+
+def test_iter_compress_emits_blocks_early():
+    class Source:
+        def __init__(self):
+            self.reads = 0
+
+        def read(self, size):
+            self.reads += 1
+            return b'a' * size
+
+    src = Source()
+    chunks = iter_compress(src, block_size=10)
+    header = next(chunks)
+    first_frame = next(chunks)
+    assert src.reads == 1
+    assert decompress(header + first_frame + END_MARKER) == b'a' * 10
+
+
+def test_iter_decompress_yields_blocks():
+    text = b'abcdefghij' * 3
+    blocks = list(iter_decompress(io.BytesIO(compress(text, block_size=10))))
+    assert blocks == [b'abcdefghij'] * 3
+
+
+@pytest.mark.parametrize('l', [0, 1, 1000, 2500])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_compress_decompress_file(tmp_path, l, workers):
+    random.seed(30)
+    text = _random_bytes(l)
+    (tmp_path / 'text').write_bytes(text)
+    compress_file(
+        tmp_path / 'text', tmp_path / 'text.bwt', block_size=1000, workers=workers
+    )
+    compressed_text = (tmp_path / 'text.bwt').read_bytes()
+    assert compressed_text == compress(text, block_size=1000)
+
+    # The preallocated output is truncated to the data
+    (tmp_path / 'decompressed').write_bytes(b'x' * 5000)
+    decompress_file(tmp_path / 'text.bwt', tmp_path / 'decompressed', workers)
+    assert (tmp_path / 'decompressed').read_bytes() == text
+
+
+def test_decompress_file_legacy(tmp_path):
+    text = b'abracadabra'
+    (tmp_path / 'text.bwt').write_bytes(_encode_legacy(text))
+    decompress_file(tmp_path / 'text.bwt', tmp_path / 'text')
+    assert (tmp_path / 'text').read_bytes() == text
+
+
+@pytest.mark.parametrize('index', [False, True])
+def test_decompress_range(index):
+    random.seed(31)
+    text = _random_bytes(2500)
+    compressed_text = compress(text, block_size=1000, index=index)
+    assert (read_index(compressed_text) is not None) == index
+    assert decompress(compressed_text) == text
+    for start in [0, 1, 999, 1000, 1001, 2499, 2500, 3000]:
+        for length in [0, 1, 999, 1000, 2000, 5000]:
+            assert decompress_range(compressed_text, start, length) == (
+                text[start:start + length]
+            )
+
+
+@pytest.mark.parametrize('index', [False, True])
+def test_decompress_range_decodes_overlapping_blocks(index):
+    text = b'abracadabra' * 1000
+    compressed_text = compress(text, block_size=1000, index=index)
+    for start, length, blocks in [(0, 1000, 1), (999, 2, 2), (5500, 100, 1)]:
+        stats = Stats()
+        assert decompress_range(compressed_text, start, length, stats=stats) == (
+            text[start:start + length]
+        )
+        assert stats.blocks == blocks
+
+
+def test_decompress_range_invalid():
+    with pytest.raises(ValueError):
+        decompress_range(compress(b'abc'), -1, 1)
+    with pytest.raises(ValueError):
+        decompress_range(compress(b'abc'), 0, -1)
+
+
+def test_decompress_range_legacy():
+    text = b'abracadabra'
+    assert decompress_range(_encode_legacy(text), 3, 4) == text[3:7]
+
+
+def test_compress_index_stream(tmp_path):
+    text = b'abracadabra' * 1000
+    compressed_text = compress(text, block_size=1000, index=True)
+    dst = io.BytesIO()
+    compress_stream(io.BytesIO(text), dst, block_size=1000, index=True)
+    assert dst.getvalue() == compressed_text
+    assert list(iter_decompress(io.BytesIO(compressed_text)))[-1] == text[-1000:]
+
+    (tmp_path / 'text').write_bytes(text)
+    compress_file(tmp_path / 'text', tmp_path / 'text.bwt', block_size=1000, index=True)
+    assert (tmp_path / 'text.bwt').read_bytes() == compressed_text
+    assert decompress_file_range(tmp_path / 'text.bwt', 4321, 1234) == (
+        text[4321:4321 + 1234]
+    )
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_compress_decompress_many(workers):
+    random.seed(27)
+    messages = [_random_bytes(random.choice([0, 1, 50, 2500])) for _ in range(30)]
+    compressed_messages = list(compress_many(
+        messages, block_size=1000, workers=workers, restart_points=2, batch_size=7
+    ))
+    assert compressed_messages == [
+        compress(message, block_size=1000, restart_points=2) for message in messages
+    ]
+    stats = Stats()
+    assert list(decompress_many(
+        compressed_messages, workers=workers, stats=stats, batch_size=7
+    )) == messages
+    assert stats.bytes_out == sum(len(message) for message in messages)
+
+
+def test_decompress_many_legacy():
+    messages = [b'abracadabra', b'banana']
+    compressed_messages = [_encode_legacy(messages[0]), compress(messages[1])]
+    assert list(decompress_many(compressed_messages)) == messages
+
+
+def test_compress_many_stats():
+    stats = Stats()
+    list(compress_many([b'abc', b'a' * 2500, b''], block_size=1000, stats=stats))
+    assert stats.blocks == 4
+    assert stats.bytes_in == 2503
+
+
+def test_compress_many_str():
+    compressed_messages = list(compress_many(['строка', 'abc']))
+    assert list(decompress_many(compressed_messages)) == [
+        'строка'.encode(), b'abc'
+    ]
+
+
+def test_compress_many_invalid_batch_size():
+    with pytest.raises(ValueError):
+        list(compress_many([b'abc'], batch_size=0))
@@ -0,0 +1,86 @@
+import io
+
+import pytest
+
+from bwt_compressor.container import (
+    END_MARKER,
+    HEADER_SIZE,
+    MAX_BLOCK_SIZE,
+    frame_at,
+    frame_block,
+    is_legacy,
+    read_frames,
+    read_header,
+    read_index,
+    split_frames,
+    write_header,
+    write_index
+)
+
+
+def test_write_read_header():
+    header = write_header(1000)
+    assert not is_legacy(header)
+    assert read_header(io.BytesIO(header)) == 1000
+
+
+@pytest.mark.parametrize('block_size', [0, MAX_BLOCK_SIZE + 1])
+def test_write_header_invalid_block_size(block_size):
+    with pytest.raises(ValueError):
+        write_header(block_size)
+
+
+def test_read_header_bad_magic():
+    with pytest.raises(ValueError):
+        read_header(io.BytesIO(b'\x03abcdefgh'))
+
+
+def test_read_frames():
+    payloads = [b'a', b'bc', b'\x00' * 300]
+    stream = io.BytesIO(b''.join(frame_block(p) for p in payloads) + END_MARKER)
+    assert list(read_frames(stream)) == payloads
+
+
+def test_read_frames_truncated():
+    stream = io.BytesIO(frame_block(b'abc')[:-1])
+    with pytest.raises(ValueError):
+        list(read_frames(stream))
+
+
+def test_split_frames():
+    payloads = [b'a', b'bc', b'\x00' * 300]
+    data = write_header(1000) + b''.join(frame_block(p) for p in payloads) + END_MARKER
+    block_size, views = split_frames(data)
+    assert block_size == 1000
+    assert [bytes(view) for view in views] == payloads
+
+
+@pytest.mark.parametrize('end', [-1, -5, 3])
+def test_split_frames_truncated(end):
+    data = write_header(1000) + frame_block(b'abc') + END_MARKER
+    with pytest.raises(ValueError):
+        split_frames(data[:end])
+
+
+def test_write_read_index():
+    payloads = [b'a', b'bc', b'\x00' * 300]
+    data = write_header(1000) + b''.join(frame_block(p) for p in payloads) + END_MARKER
+    assert read_index(data) is None
+    frame_offsets = [HEADER_SIZE, HEADER_SIZE + 5, HEADER_SIZE + 11]
+    entries = list(zip([0, 1000, 2000], frame_offsets))
+    data += write_index(entries, 2500)
+    assert read_index(data) == (entries, 2500)
+    assert [bytes(frame_at(data, offset)) for offset in frame_offsets] == payloads
+    # The readers of the frames stop at the end marker
+    assert split_frames(data)[1] == payloads
+    assert list(read_frames(io.BytesIO(data[HEADER_SIZE:]))) == payloads
+
+
+def test_read_index_invalid():
+    data = write_header(1000) + frame_block(b'abc') + END_MARKER
+    with pytest.raises(ValueError):
+        read_index(data + write_index([(0, HEADER_SIZE)] * 10, 10))
+    with pytest.raises(ValueError):
+        read_index(data + write_index([(1000, HEADER_SIZE), (0, 20)], 2000))
+    with pytest.raises(ValueError):
+        frame_at(data, len(data) - len(END_MARKER))
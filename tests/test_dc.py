@@ -1,6 +1,6 @@
 import random
-import string
 
+import numpy as np
 import pytest
 
 
@@ -8,10 +8,13 @@ from bwt_compressor.common import (
     ALPHABET_SIZE
 )
 
+from bwt_compressor import dc
 from bwt_compressor.dc import (
     _compute_char_distances,
+    _dc_encode_python,
     _get_alphabet,
     _reduce_char_distances,
+    count_smaller_after,
     dc_decode,
     dc_encode
 )
@@ -20,18 +23,18 @@ from bwt_compressor.dc import (
 @pytest.mark.parametrize(
     ['text', 'expected_char_distances'],
     [
-        ('', []),
-        ('aa', [1,0]),
-        ('AZ\x00', [0,0,0]),
-        ('abbbdacced', [5,1,1,0,5,0,1,0,0,0]),
+        (b'', []),
+        (b'aa', [1,0]),
+        (b'AZ\x00', [0,0,0]),
+        (b'abbbdacced', [5,1,1,0,5,0,1,0,0,0]),
     ]
 )
 def test_compute_char_distances(text, expected_char_distances):
     text = _get_alphabet() + text
     alphabet_char_distances = [0] * ALPHABET_SIZE
     for i, c in enumerate(text[ALPHABET_SIZE:]):
-        if alphabet_char_distances[ord(c)] == 0:
-            alphabet_char_distances[ord(c)] = ALPHABET_SIZE - ord(c) + i
+        if alphabet_char_distances[c] == 0:
+            alphabet_char_distances[c] = ALPHABET_SIZE - c + i
     assert (
         _compute_char_distances(text) ==
         alphabet_char_distances + expected_char_distances
@@ -41,9 +44,9 @@ def test_compute_char_distances(text, expected_char_distances):
 @pytest.mark.parametrize(
     ['text', 'expected_reduced_char_distances'],
     [
-        ('', []),
-        ('ab', [0,0]),
-        ('abaab', [1,2,1,0,0]),
+        (b'', []),
+        (b'ab', [0,0]),
+        (b'abaab', [1,2,1,0,0]),
     ]
 )
 def test_reduce_char_distances(text, expected_reduced_char_distances):
@@ -56,7 +59,7 @@ def test_reduce_char_distances(text, expected_reduced_char_distances):
 
 
 def test_reduce_char_distances_with_alphabet():
-    text = 'AZ\x00'
+    text = b'AZ\x00'
     alphabet = _get_alphabet()
     alphabet_char_distances = [0] * len(alphabet)
     alphabet_char_distances[0] = len(alphabet) + len(text) - 1
@@ -73,28 +76,48 @@ def test_reduce_char_distances_with_alphabet():
 
 
 def test_dc_encode():
-    text = 'AZ\x00'
+    text = b'AZ\x00'
     alphabet_expected_dc = [0] * ALPHABET_SIZE
     alphabet_expected_dc[0] = len(text)
     alphabet_expected_dc[ord('A')] = 1
     alphabet_expected_dc[ord('Z')] = 1
-    assert dc_encode(text) == [len(text)] + alphabet_expected_dc + [0, 0, 0]
+    assert dc_encode(text).tolist() == [len(text)] + alphabet_expected_dc + [0, 0, 0]
+
+
+def test_count_smaller_after(max_len=100):
+    random.seed(22)
+    for l in range(max_len):
+        permutation = list(range(l))
+        random.shuffle(permutation)
+        expected_counts = [
+            sum(v < permutation[i] for v in permutation[i+1:])
+            for i in range(l)
+        ]
+        assert count_smaller_after(np.array(permutation)).tolist() == expected_counts
+
+
+def test_dc_encode_matches_python_implementation(max_len=300):
+    random.seed(23)
+    for l in range(max_len):
+        for alphabet in [b'ab', bytes(range(256))]:
+            text = bytes(random.choice(alphabet) for _ in range(l))
+            assert dc_encode(text).tolist() == _dc_encode_python(text)
 
 
 def test_dc_decode_empty():
     dc = [0] * (ALPHABET_SIZE + 1)
-    assert dc_decode(dc) == ''
+    assert dc_decode(dc) == b''
 
 
 def test_dc_decode_single_letter():
     alphabet_dc = [0] * ALPHABET_SIZE
     alphabet_dc[ord('a')] = 1
     dc = [1] + alphabet_dc + [0]
-    assert dc_decode(dc) == 'a'
+    assert dc_decode(dc) == b'a'
 
 
 def test_dc_decode_consecutive():
-    text = 'aaaaa'
+    text = b'aaaaa'
     alphabet_dc = [0] * ALPHABET_SIZE
     alphabet_dc[ord('a')] = 1
     dc = [len(text)] + alphabet_dc + [0]
@@ -102,7 +125,7 @@ def test_dc_decode_consecutive():
 
 
 def test_dc_decode_nullbyte():
-    text = 'AZ\x00'
+    text = b'AZ\x00'
     alphabet_dc = [0] * ALPHABET_SIZE
     alphabet_dc[0] = len(text)
     alphabet_dc[ord('A')] = 1
@@ -114,7 +137,15 @@ def test_dc_decode_nullbyte():
 def test_dc_encode_decode(max_len=100):
     random.seed(20)
     for l in range(max_len):
-        text = ''.join(random.choice(string.ascii_letters) for _ in range(l))
+        text = bytes(random.randrange(256) for _ in range(l))
         dc = dc_encode(text)
         text_from_dc = dc_decode(dc)
-        assert text_from_dc == text
\ No newline at end of file
+        assert text_from_dc == text
+
+@pytest.mark.parametrize('max_scanned_distance', [0, 4096])
+def test_dc_encode_decode_long(monkeypatch, max_scanned_distance):
+    monkeypatch.setattr(dc, '_MAX_SCANNED_DISTANCE', max_scanned_distance)
+    random.seed(21)
+    for alphabet in [b'ab', b'abcdefgh', bytes(range(256))]:
+        text = bytes(random.choice(alphabet) for _ in range(5000))
+        assert dc_decode(dc_encode(text)) == text
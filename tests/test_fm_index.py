@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from bwt_compressor.bwt import apply_bwt
+from bwt_compressor.fm_index import FMIndex
+
+
+def _find_all(text, pattern):
+    return [i for i in range(len(text)) if text.startswith(pattern, i)]
+
+
+@pytest.mark.parametrize('sample_rate', [1, 3, 1024])
+def test_count_locate(sample_rate):
+    random.seed(50)
+    for _ in range(100):
+        text = bytes(random.choice(b'abc') for _ in range(random.randrange(1, 500)))
+        index = FMIndex(
+            *apply_bwt(text, restart_points=random.randrange(1, 10)), sample_rate
+        )
+        for _ in range(5):
+            start = random.randrange(len(text))
+            pattern = text[start:start + random.randrange(1, 6)]
+            positions = _find_all(text, pattern)
+            assert index.count(pattern) == len(positions)
+            assert index.locate(pattern).tolist() == positions
+        assert index.count(b'd') == 0
+        assert index.locate(b'abcd').tolist() == []
+
+
+def test_locate_not_found():
+    index = FMIndex(*apply_bwt(b'abracadabra', restart_points=3))
+    assert index.locate(b'abd').tolist() == []
+    # The table of the next rows isn't built without any occurrences
+    assert index._next_rows is None
+    assert index.locate(b'abra').tolist() == [0, 7]
+
+
+def test_extract():
+    random.seed(51)
+    for _ in range(100):
+        text = bytes(random.randrange(256) for _ in range(random.randrange(1, 300)))
+        index = FMIndex(*apply_bwt(text), sample_rate=16)
+        for length in [0, 1, 5, len(text), len(text) + 1]:
+            assert index.extract_prefix(length) == text[:length]
+            assert index.extract_suffix(length) == text[max(len(text) - length, 0):]
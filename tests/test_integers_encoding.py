@@ -4,7 +4,11 @@ import pytest
 
 from bwt_compressor.integers_encoding import (
     _decode_next_integer_from_bytes,
+    decode_integers_array,
+    decode_integers_from_buckets,
     decode_integers_from_bytes,
+    encode_integers_array,
+    encode_integers_as_buckets,
     encode_integers_as_bytes,
     _encode_integer_as_bytes,
 )
@@ -51,3 +55,59 @@ def test_encode_decode_integers_bytes(max_len=100, max_int=10000000):
         bytes_ = encode_integers_as_bytes(integers)
         integers_decoded = decode_integers_from_bytes(bytes_)
         assert integers_decoded == integers
+
+
+def _random_integers(l):
+    # Mostly one-byte integers with a few of every longer encoding
+    return [
+        random.randrange(random.choice([255, 255, 255, 256, 70000, 2 ** 40]))
+        for _ in range(l)
+    ]
+
+
+def test_encode_integers_array_matches_scalar(max_len=200):
+    random.seed(21)
+    for l in range(max_len):
+        integers = _random_integers(l)
+        assert encode_integers_array(integers) == encode_integers_as_bytes(integers)
+
+
+def test_decode_integers_array_matches_scalar(max_len=200):
+    random.seed(22)
+    for l in range(max_len):
+        bytes_ = encode_integers_as_bytes(_random_integers(l))
+        assert (
+            decode_integers_array(bytes_).tolist() ==
+            decode_integers_from_bytes(bytes_)
+        )
+
+
+@pytest.mark.parametrize(
+    'integers',
+    [[], [254], [255], [255 + 256 ** 2 - 2], [255 + 256 ** 2 - 1], [0xff00 + 255, 255]]
+)
+def test_encode_decode_integers_array_boundaries(integers):
+    bytes_ = encode_integers_array(integers)
+    assert bytes_ == encode_integers_as_bytes(integers)
+    assert decode_integers_array(bytes_).tolist() == integers
+
+
+@pytest.mark.parametrize(
+    ['integer', 'expected_bucket', 'expected_extra_bits_num'],
+    [(0, 0, 0), (15, 15, 0), (16, 16, 3), (23, 16, 3), (24, 17, 3), (32, 18, 4)]
+)
+def test_encode_integers_as_buckets(integer, expected_bucket, expected_extra_bits_num):
+    buckets, extra_bits = encode_integers_as_buckets([integer] * 8)
+    assert buckets == bytes([expected_bucket] * 8)
+    assert len(extra_bits) == expected_extra_bits_num
+
+
+def test_encode_decode_integers_buckets(max_len=200):
+    random.seed(23)
+    for l in range(max_len):
+        integers = [
+            random.getrandbits(random.choice([3, 4, 5, 20, 40, 63]))
+            for _ in range(l)
+        ]
+        buckets, extra_bits = encode_integers_as_buckets(integers)
+        assert decode_integers_from_buckets(buckets, extra_bits).tolist() == integers
@@ -0,0 +1,85 @@
+import random
+import subprocess
+import sys
+
+import pytest
+
+from bwt_compressor.compressor import compress, decompress
+from bwt_compressor.container import DEFAULT_BLOCK_SIZE
+from bwt_compressor.memory import (
+    MIN_BUDGET_BLOCK_SIZE,
+    PROCESS_MEMORY,
+    choose_parameters,
+    estimate_memory
+)
+from bwt_compressor.stats import Stats
+
+
+_MB = 1024 ** 2
+
+# Compress the file of argv[1] within argv[2] bytes and print the peak RSS
+_CHILD_SCRIPT = '''
+import resource, sys
+from bwt_compressor.compressor import compress_file
+compress_file(sys.argv[1], sys.argv[1] + '.bwt', max_memory=int(sys.argv[2]))
+peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(peak_rss if sys.platform == 'darwin' else peak_rss * 1024)
+'''
+
+
+@pytest.mark.parametrize('stage', ['mtf', 'dc', 'auto'])
+@pytest.mark.parametrize('workers', [1, 4])
+def test_choose_parameters(stage, workers):
+    for max_memory in [60 * _MB, 100 * _MB, 300 * _MB, 1000 * _MB, 10 ** 5 * _MB]:
+        block_size, chosen_workers = choose_parameters(
+            max_memory, DEFAULT_BLOCK_SIZE, workers, stage
+        )
+        assert MIN_BUDGET_BLOCK_SIZE <= block_size <= DEFAULT_BLOCK_SIZE
+        assert 1 <= chosen_workers <= workers
+        assert estimate_memory(block_size, chosen_workers, stage) <= max_memory
+        # A larger block or one more worker wouldn't fit
+        if block_size < DEFAULT_BLOCK_SIZE:
+            assert estimate_memory(block_size + 1, chosen_workers, stage) > max_memory
+        elif chosen_workers < workers:
+            assert estimate_memory(
+                MIN_BUDGET_BLOCK_SIZE, chosen_workers + 1, stage
+            ) > max_memory
+
+
+def test_choose_parameters_incompressible():
+    random.seed(19)
+    data = bytes(random.randrange(256) for _ in range(10 ** 5))
+    text = b'abracadabra' * 10 ** 4
+    block_size, _ = choose_parameters(10 ** 5 * _MB, DEFAULT_BLOCK_SIZE, 1, 'mtf', data)
+    assert block_size < DEFAULT_BLOCK_SIZE
+    block_size, _ = choose_parameters(10 ** 5 * _MB, DEFAULT_BLOCK_SIZE, 1, 'mtf', text)
+    assert block_size == DEFAULT_BLOCK_SIZE
+
+
+def test_choose_parameters_too_small():
+    with pytest.raises(ValueError):
+        choose_parameters(PROCESS_MEMORY, DEFAULT_BLOCK_SIZE, 1, 'mtf')
+
+
+def test_compress_max_memory():
+    text = b'abracadabra' * 10 ** 5
+    stats = Stats()
+    compressed_text = compress(text, max_memory=70 * _MB, stats=stats)
+    assert decompress(compressed_text) == text
+    block_size = stats.parameters['block_size']
+    assert block_size < DEFAULT_BLOCK_SIZE
+    assert stats.blocks == -(-len(text) // block_size)
+    assert stats.parameters['max_memory'] == 70 * _MB
+    assert stats.parameters['estimated_memory'] <= 70 * _MB
+
+
+def test_peak_rss_within_max_memory(tmp_path):
+    with open('resources/martin_eden.txt', 'rb') as f:
+        text = f.read()
+    (tmp_path / 'text').write_bytes((text * 6)[:4 * _MB])
+    max_memory = 100 * _MB
+    result = subprocess.run(
+        [sys.executable, '-c', _CHILD_SCRIPT, str(tmp_path / 'text'), str(max_memory)],
+        capture_output=True, check=True
+    )
+    assert int(result.stdout) <= max_memory
@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+import pytest
+
+from bwt_compressor.mtf import (
+    RUNA,
+    RUNB,
+    _compute_mtf_ranks,
+    _compute_mtf_ranks_small,
+    mtf_rle0_decode,
+    mtf_rle0_encode
+)
+
+
+def _mtf_python(text):
+    table = list(range(256))
+    ranks = []
+    for char in text:
+        rank = table.index(char)
+        ranks.append(rank)
+        table.insert(0, table.pop(rank))
+    return ranks
+
+
+@pytest.mark.parametrize(
+    ['text', 'expected_code'],
+    [
+        (b'', []),
+        (b'\x00', [RUNA]),
+        (b'\x00\x00', [RUNB]),
+        (b'\x00\x00\x00', [RUNA, RUNA]),
+        (b'\x02', [3]),
+        (b'\x02\x02\x02\x02', [3, RUNA, RUNA]),
+        (b'\x01\x02\x01\x02', [2, 3, 2, 2]),
+    ]
+)
+def test_mtf_rle0_encode(text, expected_code):
+    assert mtf_rle0_encode(text).tolist() == expected_code
+
+
+def test_compute_mtf_ranks(max_len=200):
+    random.seed(20)
+    for l in range(max_len):
+        for alphabet in [b'ab', b'abcdefgh', bytes(range(256))]:
+            text = bytes(random.choice(alphabet) for _ in range(l))
+            text_array = np.frombuffer(text, dtype=np.uint8)
+            ranks = _compute_mtf_ranks(text_array, np.int32)
+            assert ranks.tolist() == _mtf_python(text)
+            ranks = _compute_mtf_ranks_small(text_array, np.int32)
+            assert ranks.tolist() == _mtf_python(text)
+
+
+def test_mtf_rle0_encode_decode(max_len=200):
+    random.seed(21)
+    for l in range(max_len):
+        for alphabet in [b'\x00', b'\x00a', b'ab', bytes(range(256))]:
+            text = bytes(random.choice(alphabet) for _ in range(l))
+            assert mtf_rle0_decode(mtf_rle0_encode(text)) == text
+
+
+def test_mtf_rle0_encode_decode_long():
+    # More run starts than are ranked char by char
+    random.seed(22)
+    text = bytes(random.choice(b'abcd') for _ in range(10000))
+    assert mtf_rle0_decode(mtf_rle0_encode(text)) == text
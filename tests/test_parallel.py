@@ -0,0 +1,34 @@
+import os
+import zlib
+
+import pytest
+
+from bwt_compressor.parallel import map_blocks, resolve_workers
+
+
+@pytest.mark.parametrize('workers', [1, 2, 3])
+def test_map_blocks_keeps_order(workers):
+    blocks = [bytes([i]) * (i + 1) for i in range(20)]
+    assert (
+        list(map_blocks(zlib.crc32, blocks, workers)) ==
+        [zlib.crc32(block) for block in blocks]
+    )
+
+
+def test_map_blocks_empty():
+    assert list(map_blocks(zlib.crc32, [], workers=2)) == []
+
+
+def test_resolve_workers():
+    assert resolve_workers(3) == 3
+    assert resolve_workers(0) == (os.cpu_count() or 1)
+    with pytest.raises(ValueError):
+        resolve_workers(-1)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_map_blocks_skips_none(workers):
+    blocks = [b'a', None, b'b', None]
+    assert list(map_blocks(zlib.crc32, blocks, workers)) == [
+        zlib.crc32(b'a'), None, zlib.crc32(b'b'), None
+    ]
@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+from bwt_compressor.range_coder import range_decode, range_encode
+
+
+@pytest.mark.parametrize('order', [0, 1])
+def test_range_encode_decode(order, max_len=300, step=7):
+    random.seed(20)
+    for l in range(0, max_len, step):
+        for alphabet in [b'a', b'ab', bytes(range(256))]:
+            data = bytes(random.choice(alphabet) for _ in range(l))
+            assert range_decode(range_encode(data, order)) == data
+
+
+@pytest.mark.parametrize('order', [0, 1])
+def test_range_encode_decode_skewed(order):
+    random.seed(21)
+    data = bytes(min(int(random.expovariate(0.2)), 255) for _ in range(20000))
+    code = range_encode(data, order)
+    assert len(code) < len(data) * 3 // 4
+    assert range_decode(code) == data
+
+
+def test_range_encode_decode_carry():
+    # Long runs of a likely symbol push the low end of the interval up
+    # to the 0xFF... region where the carries happen
+    random.seed(22)
+    data = bytes(random.choice([0] * 30 + [255]) for _ in range(50000))
+    assert range_decode(range_encode(data)) == data
+
+
+def test_range_encode_unknown_order():
+    with pytest.raises(ValueError):
+        range_encode(b'data', 2)
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from bwt_compressor import search
+from bwt_compressor.block import _encode_body
+from bwt_compressor.bwt import apply_bwt
+from bwt_compressor.compressor import compress
+
+
+def _find_all(text, pattern):
+    return [i for i in range(len(text)) if text.startswith(pattern, i)]
+
+
+def _find_lines(text, pattern):
+    lines = []
+    offset = 0
+    for line in text.split(b'\n'):
+        if pattern in line:
+            lines.append((offset, line))
+        offset += len(line) + 1
+    return lines
+
+
+@pytest.mark.parametrize('index', [False, True])
+def test_count_locate(index):
+    random.seed(52)
+    for _ in range(20):
+        text = bytes(random.choice(b'ab\n') for _ in range(random.randrange(300)))
+        compressed_text = compress(
+            text, block_size=random.choice([3, 20, 1000]), index=index
+        )
+        for _ in range(3):
+            pattern = bytes(
+                random.choice(b'ab\n') for _ in range(random.randrange(1, 6))
+            )
+            positions = _find_all(text, pattern)
+            assert search.count(compressed_text, pattern) == len(positions)
+            assert search.locate(compressed_text, pattern) == positions
+
+
+def test_search():
+    random.seed(53)
+    for _ in range(20):
+        text = bytes(random.choice(b'ab\n') for _ in range(random.randrange(300)))
+        compressed_text = compress(text, block_size=random.choice([3, 20, 1000]))
+        for _ in range(3):
+            pattern = bytes(random.choice(b'ab') for _ in range(random.randrange(1, 4)))
+            assert list(search.search(compressed_text, pattern)) == (
+                _find_lines(text, pattern)
+            )
+
+
+def test_search_decompresses_matching_blocks(monkeypatch):
+    text = b''.join(b'line %d\n' % i for i in range(1000))
+    compressed_text = compress(text, block_size=1000, index=True)
+    decoded = []
+    decode_block = search.decode_block
+    monkeypatch.setattr(
+        search, 'decode_block',
+        lambda payload: decoded.append(payload) or decode_block(payload)
+    )
+    assert list(search.search(compressed_text, 'line 500\n')) == [
+        (text.index(b'line 500\n'), b'line 500')
+    ]
+    assert len(decoded) == 1
+    assert search.count(compressed_text, 'line') == 1000
+    assert len(decoded) == 1
+
+
+def test_parallel():
+    text = b'abracadabra' * 1000
+    compressed_text = compress(text, block_size=1000)
+    assert search.locate(compressed_text, b'cadabra', workers=2) == (
+        _find_all(text, b'cadabra')
+    )
+
+
+def test_legacy():
+    text = b'abracadabra\nabra'
+    # The legacy format keeps the terminator in the BWT
+    bwt, (primary_index,) = apply_bwt(text)
+    compressed_text = _encode_body(
+        bwt[:primary_index] + b'\x00' + bwt[primary_index:], 'dc', 'bytes',
+        'adaptive-huffman'
+    )
+    assert search.count(compressed_text, b'abra') == 3
+    assert search.locate(compressed_text, b'abra') == [0, 7, 12]
+    assert list(search.search(compressed_text, b'cad')) == [(0, b'abracadabra')]
+
+
+def test_empty_pattern():
+    with pytest.raises(ValueError):
+        search.count(compress(b'abc'), b'')
@@ -1,6 +1,8 @@
+import random
+
 import pytest
 
-from bwt_compressor.segment_tree import SegmentTree
+from bwt_compressor.segment_tree import FenwickTree, SegmentTree
 
 
 def test_get_sum():
@@ -22,3 +24,33 @@ def test_update():
     assert segment_tree.get_sum(1, 2) == leafs[1] + diff
     assert segment_tree.get_sum(0, n) == sum(leafs) + diff
     assert segment_tree.get_sum(2, n) == sum(leafs[2:])
+
+
+def test_fenwick_tree_get_sum_update():
+    leafs = [1,3,5,7,9,11]
+    n = len(leafs)
+    fenwick_tree = FenwickTree(leafs)
+    assert fenwick_tree.get_sum(0, n) == sum(leafs)
+    assert fenwick_tree.get_sum(1, n-1) == sum(leafs[1:-1])
+    fenwick_tree.update(1, 2)
+    assert fenwick_tree.get_sum(1, 2) == leafs[1] + 2
+    assert fenwick_tree.get_sum(2, n) == sum(leafs[2:])
+
+
+def test_fenwick_tree_find_kth_zero():
+    random.seed(7)
+    for n in range(1, 40):
+        leafs = [random.randint(0, 1) for _ in range(n)]
+        fenwick_tree = FenwickTree(leafs)
+        for start in range(n):
+            zero_indices = [i for i in range(start, n) if leafs[i] == 0]
+            for k, zero_index in enumerate(zero_indices, 1):
+                assert fenwick_tree.find_kth_zero(start, k) == zero_index
+
+
+def test_fenwick_tree_rebuild():
+    random.seed(8)
+    leafs = bytearray(random.randint(0, 1) for _ in range(100))
+    fenwick_tree = FenwickTree(bytearray(100))
+    fenwick_tree.rebuild(leafs)
+    assert fenwick_tree.tree == FenwickTree(leafs).tree
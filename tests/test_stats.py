@@ -0,0 +1,82 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from bwt_compressor.compressor import compress, decompress
+from bwt_compressor.stats import Stats, measure
+
+
+def test_measure_without_stats():
+    assert measure(None, 'stage', bytes.upper, b'abc') == b'ABC'
+
+
+def test_measure():
+    stats = Stats()
+    assert measure(stats, 'stage', np.frombuffer, b'abcd', np.uint16).tolist() == [
+        0x6261, 0x6463
+    ]
+    measure(stats, 'stage', bytes.upper, b'ab')
+    stage = stats.stages['stage']
+    assert stage['calls'] == 2
+    assert stage['bytes_in'] == stage['bytes_out'] == 6
+    assert stage['symbols'] == 2
+    assert stage['peak_alloc'] == 0
+
+
+def test_measure_peak_alloc():
+    stats = Stats()
+    tracemalloc.start()
+    try:
+        measure(stats, 'stage', bytes, 10**6)
+    finally:
+        tracemalloc.stop()
+    assert stats.stages['stage']['peak_alloc'] >= 10**6
+
+
+def test_merge():
+    stats = Stats()
+    for _ in range(2):
+        block_stats = Stats()
+        block_stats.add_block(10, 5, ('mtf', 'huffman'))
+        block_stats.add_stage('bwt', 1.0, 10, 10, peak_alloc=7)
+        block_stats.cache['hits'] += 1
+        stats.merge(block_stats)
+    assert stats.to_dict() == {
+        'seconds': 0.0, 'blocks': 2, 'bytes_in': 20, 'bytes_out': 10,
+        'codings': {'mtf/huffman': 2},
+        'parameters': {},
+        'cache': {'hits': 2},
+        'stages': {
+            'bwt': {
+                'calls': 2, 'seconds': 2.0, 'bytes_in': 20, 'bytes_out': 20,
+                'symbols': 0, 'peak_alloc': 7, 'mb_per_s': 20 / 10**6 / 2.0
+            }
+        },
+    }
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_compress_decompress_stats(workers):
+    text = b'abracadabra' * 1000
+    compress_stats = Stats()
+    compressed_text = compress(
+        text, block_size=4000, workers=workers, stage='dc', stats=compress_stats
+    )
+    assert compress_stats.blocks == 3
+    assert compress_stats.bytes_in == len(text)
+    assert compress_stats.codings == {'dc/huffman': 3}
+    assert set(compress_stats.stages) == {
+        'bwt', 'dc_encode', 'integers_encode', 'huffman_encode'
+    }
+    assert compress_stats.stages['bwt']['bytes_in'] == len(text)
+    assert compress_stats.seconds > 0
+    assert compress_stats.parameters['block_size'] == 4000
+    assert compress_stats.parameters['workers'] == workers
+
+    decompress_stats = Stats()
+    assert decompress(compressed_text, workers, stats=decompress_stats) == text
+    assert decompress_stats.bytes_out == len(text)
+    assert set(decompress_stats.stages) == {
+        'huffman_decode', 'integers_decode', 'dc_decode', 'inverse_bwt'
+    }